@@ -5,18 +5,35 @@
     XmindCopilot
 """
 __version__ = "0.1.0"
+import zipfile
 from .core.loader import WorkbookLoader
 from .core.saver import WorkbookSaver
+from .core.stream import iter_topics, TopicRecord
+from .core.backend import set_backend as set_xml_backend, get_backend as get_xml_backend
+from .corpus import map_corpus, CorpusResult
 
 
-def load(path, get_refs=True):
-    """ Load XMind workbook from given path. If file no exist on given path then created new one. """
-    loader = WorkbookLoader(path)
-    return loader.get_workbook(get_refs)
+def load(path, get_refs=True, read_only=False, lazy_sheets=False):
+    """ Load XMind workbook from given path. If file no exist on given path then created new one.
 
+    :param get_refs: DEPRECATED references(attachments, etc.) are read lazily from the file on demand.
+    :param read_only: wrap existing nodes without touching them(no id/timestamp rewrite),
+                      which speeds up traversal and search on large workbooks.
+    :param lazy_sheets: build DOM of each sheet on first access, and save sheets never accessed
+                        as they are. Speeds up touching a few sheets of a workbook with many sheets.
+    """
+    loader = WorkbookLoader(path, lazy_sheets)
+    return loader.get_workbook(get_refs, read_only)
 
-def save(workbook, path=None, only_content=False, except_attachments=False, except_revisions=False):
-    """ Save workbook to given path. If path not given, then will save to path that set to workbook. """
+
+def save(workbook, path=None, only_content=False, except_attachments=False, except_revisions=False,
+         compression=zipfile.ZIP_DEFLATED, compresslevel=None):
+    """ Save workbook to given path. If path not given, then will save to path that set to workbook.
+
+    :param compression: compression method of written parts, e.g. `zipfile.ZIP_STORED` for fast autosave.
+    :param compresslevel: compression level, e.g. 9 for smallest archive. None for default.
+    """
     saver = WorkbookSaver(workbook)
     saver.save(path=path, only_content=only_content,
-               except_attachments=except_attachments, except_revisions=except_revisions)
+               except_attachments=except_attachments, except_revisions=except_revisions,
+               compression=compression, compresslevel=compresslevel)
@@ -6,6 +6,7 @@ XmindCopilot.core
 """
 from xml.dom import minidom as DOM
 from .. import utils
+from .backend import get_backend
 
 
 def create_document():
@@ -33,6 +34,7 @@ class Node(object):
     """
     All of components of XMind workbook subclass Node
     """
+    __slots__ = ("_node",)
 
     def __init__(self, node):
         # FIXME: WE HAVE TO CHECK IF node INHERITS dom.Node class
@@ -75,10 +77,21 @@ class Node(object):
         if index >= 0:
             return qualifiedName[:index + 1]
 
+    def _setModified(self):
+        """Mark owner document as modified, see `Document.isModified`"""
+        try:
+            doc = self.getOwnerDocument()
+        except AttributeError:
+            # Orphan DOM element constructed without document
+            return
+        if doc is not None:
+            doc._xmind_modified = True
+
     def appendChild(self, node):
         """
         Append passed node to the end of child node list of this node
         """
+        self._setModified()
         node.setOwnerDocument(self.getOwnerDocument())
 
         node_impel = node.getImplementation()
@@ -89,6 +102,7 @@ class Node(object):
         """
         Insert new node before ref_node. Please notice that ref_node must be a child of this node.
         """
+        self._setModified()
         new_node.setOwnerDocument(self.getOwnerDocument())
 
         new_node_imple = new_node.getImplementation()
@@ -140,6 +154,7 @@ class Node(object):
 
     # Remove child node
     def removeChild(self, child_node):
+        self._setModified()
         child_node = child_node.getImplementation()
         self._node.removeChild(child_node)
 
@@ -158,7 +173,7 @@ class Document(Node):
         # self.arg = arg
 
     def _documentConstructor(self):
-        return DOM.Document()
+        return get_backend().createDocument()
 
     @property
     def documentElement(self):
@@ -170,17 +185,30 @@ class Document(Node):
     def getOwnerDocument(self):
         return self._node
 
+    def isModified(self):
+        """
+        Whether the document has been modified since it was loaded or saved. Modifications
+        through wrappers are tracked, call `setModified` after manipulating the DOM directly.
+        Documents not loaded from file are always modified.
+        """
+        return getattr(self._node, "_xmind_modified", True)
+
+    def setModified(self, modified=True):
+        self._node._xmind_modified = modified
+
     def createElement(self, tag_name):
         return self._node.createElement(tag_name)
 
     def setVersion(self, version):
         element = self.documentElement
         if element and not element.hasAttribute("version"):
+            self._setModified()
             element.setAttribute("version", version)
 
     def replaceVersion(self, version):
         element = self.documentElement
         if element:
+            self._setModified()
             element.setAttribute("version", version)
 
     def getElementById(self, id):
@@ -188,6 +216,7 @@ class Document(Node):
 
 
 class Element(Node):
+    __slots__ = ()
     TAG_NAME = ""
 
     def __init__(self, node=None):
@@ -196,10 +225,7 @@ class Element(Node):
         self._node = node or self._elementConstructor(self.TAG_NAME)
 
     def _elementConstructor(self, tag_name, namespaceURI=None, prefix=None, localName=None):
-        return DOM.Element(tag_name,
-                           namespaceURI,
-                           self.getPrefix(tag_name),
-                           self.getLocalName(tag_name))
+        return get_backend().createElement(tag_name)
 
         # _localName = self.getLocalName(tag_name)
         # element = DOM.Element(tag_name, namespaceURI, prefix, _localName)
@@ -228,6 +254,7 @@ class Element(Node):
         Please notice that namespace must be a namespace name and
         namespace value. Attr composed by namespceURI, localName and value.
         """
+        self._setModified()
         namespace_name, namespace_value = namespace
         if not self._node.hasAttribute(namespace_name):
             self._node.setAttribute(namespace_name, namespace_value)
@@ -256,8 +283,10 @@ class Element(Node):
         None and attribute with specified ``attr_name`` is exist, attribute will be removed.
         """
         if attr_value is not None:
+            self._setModified()
             self._node.setAttribute(attr_name, str(attr_value))
         elif self._node.hasAttribute(attr_name):
+            self._setModified()
             self._node.removeAttribute(attr_name)
 
     def createElement(self, tag_name):
@@ -271,6 +300,7 @@ class Element(Node):
 
     def addIdAttribute(self, attr_name):
         if not self._node.hasAttribute(attr_name):
+            self._setModified()
             id = utils.generate_id()
             self._node.setAttribute(attr_name, id)
 
@@ -301,12 +331,12 @@ class Element(Node):
         return text
 
     def setTextContent(self, data):
+        self._setModified()
         for node in self._node.childNodes:
             if node.nodeType == DOM.Node.TEXT_NODE:
                 self._node.removeChild(node)
 
-        text = DOM.Text()
-        text.data = data
+        text = get_backend().createTextNode(data)
 
         self._node.appendChild(text)
 
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    XmindCopilot.core.builder
+
+    Build large subtrees of topics in one linear pass. DOM nodes are created
+    directly without wrappers, detached from the workbook, so that attaching the
+    subtree costs a single append.
+
+    such as:
+        root_topic.addSubTopicTree(["A", "\tA.1", "\tA.2", "B"])
+        root_topic.addSubTopicTree({"A": {"A.1": None, "A.2": None}, "B": None})
+        root_topic.addSubTopicTree([(None, "A"), ("A", "A.1"), ("A", "A.2"), (None, "B")])
+"""
+import gc
+
+from . import const
+from .backend import get_backend
+from .. import utils
+
+
+def iter_indented_list(content_list):
+    """
+    Convert indented list to (parent position, title) items, see `SubtreeBuilder.build`.
+    Sub topics are prefixed by more '\t' than their parent topic.
+    """
+    # (indent, position) of open topics, from outermost to innermost
+    stack = []
+    for position, item in enumerate(content_list):
+        indent = len(item) - len(item.lstrip("\t"))
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+        yield (stack[-1][1] if stack else -1), item.strip("\t")
+        stack.append((indent, position))
+
+
+def iter_nested(tree):
+    """
+    Convert nested dicts to (parent position, title) items, see `SubtreeBuilder.build`.
+
+    :param tree: {title: sub tree}, where sub tree is nested dicts, list of titles(or nested
+                 dicts) or None
+    """
+    position = 0
+    # (sub tree, parent position)
+    stack = [(tree, -1)]
+    while stack:
+        tree, parent = stack.pop()
+        if isinstance(tree, dict):
+            items = list(tree.items())
+        else:
+            # List of titles or nested dicts
+            items = []
+            for item in tree:
+                if isinstance(item, dict):
+                    items.extend(item.items())
+                else:
+                    items.append((item, None))
+        pending = []
+        for title, sub_tree in items:
+            yield parent, title
+            if sub_tree:
+                pending.append((sub_tree, position))
+            position += 1
+        stack.extend(reversed(pending))
+
+
+def iter_pairs(pairs):
+    """
+    Convert (parent, title) pairs to (parent position, title) items, see `SubtreeBuilder.build`.
+
+    :param pairs: parent is None for top level topic, position of the parent pair in pairs,
+                  or title of the parent(the latest topic with the title before this pair)
+    """
+    positions = {}
+    for position, (parent, title) in enumerate(pairs):
+        if parent is None:
+            parent = -1
+        elif not isinstance(parent, int):
+            try:
+                parent = positions[parent]
+            except KeyError:
+                raise ValueError("Parent topic not found: %s" % parent)
+        elif not 0 <= parent < position:
+            raise ValueError("Parent position must refer to a previous pair: %s" % parent)
+        positions[title] = position
+        yield parent, title
+
+
+def iter_items(tree):
+    """Convert indented list, nested dicts or (parent, title) pairs to (parent position, title) items"""
+    if isinstance(tree, dict):
+        return iter_nested(tree)
+    tree = list(tree)
+    if tree and isinstance(tree[0], tuple):
+        return iter_pairs(tree)
+    if any(isinstance(item, dict) for item in tree):
+        return iter_nested(tree)
+    return iter_indented_list(tree)
+
+
+class SubtreeBuilder(object):
+    def __init__(self, document=None, topics_type=const.TOPIC_ATTACHED, svg_width=500):
+        """
+        :param document: DOM document node owning created nodes, None for orphan nodes.
+                         Nodes are created by current XML backend, which must be the one
+                         the document is created by.
+        :param topics_type: type of <topics> created for sub topics
+        :param svg_width: svg:width of titles, None for not set
+        """
+        self._backend = get_backend()
+        self._document = document
+        self._topics_type = topics_type
+        self._title_attrs = {} if svg_width is None else {const.ATTR_TITLE_SVGWIDTH: str(svg_width)}
+
+    def createTopicsNode(self):
+        """Create <children><topics/></children> and return (children node, topics node)"""
+        buildElement = self._backend.buildElement
+        children = buildElement(const.TAG_CHILDREN, {}, self._document)
+        topics = buildElement(const.TAG_TOPICS, {const.ATTR_TYPE: self._topics_type}, self._document)
+        children.appendChild(topics)
+        return children, topics
+
+    def build(self, items):
+        """
+        Build detached topic nodes.
+
+        :param items: (parent position, title) in order, where parent position is the position
+                      of parent item in items, and -1 for top level topic. Parent must come
+                      before its sub topics.
+        :return: list of top level topic nodes
+        """
+        document = self._document
+        buildElement = self._backend.buildElement
+        createTextNode = document.createTextNode if document is not None else self._backend.createTextNode
+        generate_id = utils.generate_id
+        title_attrs = self._title_attrs
+        timestamp = str(int(utils.get_current_time()))
+        # topic node and its <topics> node(created on demand) of each item
+        nodes = []
+        topics_nodes = []
+        top_nodes = []
+        # Lots of linked nodes are created, cyclic gc passes during building are useless
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for parent, title in items:
+                node = buildElement(const.TAG_TOPIC, {const.ATTR_ID: generate_id(), const.ATTR_TIMESTAMP: timestamp},
+                                    document)
+                title_node = buildElement(const.TAG_TITLE, title_attrs, document)
+                title_node.appendChild(createTextNode(title))
+                node.appendChild(title_node)
+                nodes.append(node)
+                topics_nodes.append(None)
+
+                if parent < 0:
+                    top_nodes.append(node)
+                    continue
+                topics = topics_nodes[parent]
+                if topics is None:
+                    children, topics = self.createTopicsNode()
+                    nodes[parent].appendChild(children)
+                    topics_nodes[parent] = topics
+                topics.appendChild(node)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return top_nodes
+
+    def iterBuild(self, items):
+        """
+        Build detached topic nodes like `build`, but yield each top level topic node once its
+        subtree is complete. Only the nodes from the current top level topic down to the
+        latest topic are kept, so items can be consumed as a stream.
+
+        :param items: (parent position, title) in pre-order, i.e. the parent is the latest topic
+                      or one of its ancestors
+        """
+        document = self._document
+        buildElement = self._backend.buildElement
+        createTextNode = document.createTextNode if document is not None else self._backend.createTextNode
+        generate_id = utils.generate_id
+        title_attrs = self._title_attrs
+        timestamp = str(int(utils.get_current_time()))
+        # [position, topic node, its <topics> node] from the top level topic to the latest topic
+        path = []
+        # Collection is paused while a top level topic is built, as `build` does, but not while
+        # the consumer runs, so garbage of handled topics is collected as the stream goes on
+        paused = gc.isenabled()
+        if paused:
+            gc.disable()
+        try:
+            for position, (parent, title) in enumerate(items):
+                node = buildElement(const.TAG_TOPIC, {const.ATTR_ID: generate_id(), const.ATTR_TIMESTAMP: timestamp},
+                                    document)
+                title_node = buildElement(const.TAG_TITLE, title_attrs, document)
+                title_node.appendChild(createTextNode(title))
+                node.appendChild(title_node)
+
+                if parent < 0:
+                    if path:
+                        if paused:
+                            gc.enable()
+                            paused = False
+                        yield path[0][1]
+                        paused = gc.isenabled()
+                        if paused:
+                            gc.disable()
+                    path = [[position, node, None]]
+                    continue
+                while path and path[-1][0] != parent:
+                    path.pop()
+                if not path:
+                    raise ValueError("Parent must be the latest topic or one of its ancestors: %s" % parent)
+                entry = path[-1]
+                if entry[2] is None:
+                    children, entry[2] = self.createTopicsNode()
+                    entry[1].appendChild(children)
+                entry[2].appendChild(node)
+                path.append([position, node, None])
+            if paused:
+                gc.enable()
+                paused = False
+            if path:
+                yield path[0][1]
+        finally:
+            if paused:
+                gc.enable()
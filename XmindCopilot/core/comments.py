@@ -31,6 +31,8 @@ class CommentsBookDocument(Document):
         """
         super(CommentsBookDocument, self).__init__(node)
         self._path = path
+        # object-id -> [CommentElement], built lazily by `_getCommentIndex`
+        self._comment_index = None
 
         _commentsbook_element = self.getFirstChildNodeByTagName(const.TAG_COMMENTSBOOK)
         self._commentsbook_element = CommentsBookElement(_commentsbook_element, self)
@@ -47,25 +49,50 @@ class CommentsBookDocument(Document):
         return self._commentsbook_element.getComments()
 
     def addComment(self, content, topic_id, author=None):
-        return self._commentsbook_element.addComment(content, topic_id, author)
+        comment = self._commentsbook_element.addComment(content, topic_id, author)
+        if self._comment_index is not None:
+            self._comment_index.setdefault(comment.getObjectId(), []).append(comment)
+        return comment
+
+    def _getCommentIndex(self):
+        """Get object-id -> [CommentElement] index, build it in one pass on first call"""
+        if self._comment_index is None:
+            index = {}
+            for comment in self.getComments():
+                index.setdefault(comment.getObjectId(), []).append(comment)
+            self._comment_index = index
+        return self._comment_index
+
+    def getCommentsFor(self, topic_ids):
+        """
+        Get comments of several topics at once.
+
+        :param topic_ids: iterable of topic id
+        :return: dict of topic id -> list of `CommentElement`, topics without comment are left out
+        """
+        index = self._getCommentIndex()
+        data = {}
+        for topic_id in topic_ids:
+            comments = index.get(topic_id)
+            if comments:
+                data[topic_id] = list(comments)
+        return data
 
     def getComment(self, topic_id):
-        mapping = self.getData()
-        if topic_id in mapping.keys():
-            return mapping[topic_id]
-        else:
+        comments = self._getCommentIndex().get(topic_id)
+        if not comments:
             return None
+        return self._joinContent(comments)
+
+    def _joinContent(self, comments):
+        if len(comments) == 1:
+            return comments[0].getContent()
+        return '\n'.join(comment.getContent() for comment in comments)
 
     def getData(self):
         data = {}
-        for comment in self.getComments():
-            object_id = comment.getObjectId()
-            content = comment.getContent()
-            if object_id in data.keys():
-                exist_content = data[object_id]
-                data[object_id] = exist_content + '\n' + content
-            else:
-                data[object_id] = content
+        for object_id, comments in self._getCommentIndex().items():
+            data[object_id] = self._joinContent(comments)
         return data
 
 
@@ -79,6 +106,7 @@ class CommentsBookElement(Element):
         </comment>
     </comments>
     """
+    __slots__ = ("_owner_commentsbook",)
     TAG_NAME = const.TAG_COMMENTSBOOK
 
     def __init__(self, node=None, ownerCommentsBook=None):
@@ -116,6 +144,7 @@ class CommentElement(Element):
         <content>批注demo</content>
     </comment>
     """
+    __slots__ = ("_owner_commentsbook", "_content_element")
     TAG_NAME = const.TAG_COMMENT
 
     def __init__(self, content=None, node=None, ownerCommentsBook=None):
@@ -170,6 +199,7 @@ class ContentElement(Element):
         <content>批注demo</content>
     </comment>
     """
+    __slots__ = ("_owner_commentsbook",)
     TAG_NAME = const.TAG_CONTENT
 
     def __init__(self, content=None, node=None, ownerCommentsBook=None):
@@ -15,16 +15,30 @@ from PIL.Image import Image
 from typing import Optional, Union
 
 class ImageElement(WorkbookMixinElement):
+    __slots__ = ()
     TAG_NAME = const.TAG_IMAGE
 
     def __init__(self, node=None, ownerWorkbook=None):
         super(ImageElement, self).__init__(node, ownerWorkbook)
 
-    def _getImgAbsPath(self):
+    def _getImgRefName(self):
+        """Get reference name(attachments/<img_name>) of the image, None for web image"""
         src = self.getAttribute(const.ATTR_IMG_SRC)
-        refdir = self.getOwnerWorkbook().reference_dir
-        if src and refdir:
-            return os.path.join(refdir, src.split(":")[1])
+        if src and src.startswith("xap:"):
+            return src.split(":")[1]
+
+    def _getImgAbsPath(self):
+        name = self._getImgRefName()
+        references = self.getOwnerWorkbook().references
+        if name and name in references:
+            return references.getPath(name)
+
+    def getImageData(self):
+        """Get image file content in bytes, None if not found"""
+        name = self._getImgRefName()
+        references = self.getOwnerWorkbook().references
+        if name and name in references:
+            return references.read(name)
 
     def _getImgAttribute(self):
         """
@@ -62,8 +76,9 @@ class ImageElement(WorkbookMixinElement):
         """
         
         # Delete origin image file
-        if self._getImgAbsPath() and os.path.isfile(self._getImgAbsPath()):
-            os.remove(self._getImgAbsPath())
+        references = self.getOwnerWorkbook().references
+        if self._getImgRefName() in references:
+            references.remove(self._getImgRefName())
 
         # Handle Web img
         if type(img) is str and re.match("^http[s]{0,1}://.*$", img):
@@ -71,14 +86,13 @@ class ImageElement(WorkbookMixinElement):
             return
         
         # Set image file
-        attach_dir = self.getOwnerWorkbook().get_attachments_path()
         if type(img) == str:
             ext_name = os.path.splitext(img)[1]
         else:
             ext_name = ".png"
         media_type = "image/"+ext_name[1:]
         img_name = utils.generate_id()+ext_name
-        save_path = os.path.join(attach_dir, img_name)
+        save_path = references.getWritePath(const.ATTACHMENTS_DIR + img_name)
         # Copy image file
         if type(img) == str:
             shutil.copy(img, save_path)
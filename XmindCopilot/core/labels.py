@@ -10,6 +10,7 @@ from .mixin import TopicMixinElement
 
 
 class LabelsElement(TopicMixinElement):
+    __slots__ = ()
     TAG_NAME = const.TAG_LABELS
 
     def __init__(self, node=None, ownerTopic=None):
@@ -17,6 +18,7 @@ class LabelsElement(TopicMixinElement):
 
 
 class LabelElement(TopicMixinElement):
+    __slots__ = ()
     TAG_NAME = const.TAG_LABEL
 
     def __init__(self, content=None, node=None, ownerTopic=None):
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    XmindCopilot.core.lazy
+
+    Lazy per-sheet parsing of content.xml. The byte ranges of top level <sheet>
+    elements are indexed first and only a skeleton(root element and empty sheets)
+    is parsed. The DOM of a sheet is built on first access of its child nodes, and
+    sheets never accessed are written back verbatim on save.
+
+    such as:
+        workbook = XmindCopilot.load(path, lazy_sheets=True)
+        sheet = workbook.getSheets()[2]  # only this sheet is parsed
+        sheet.getRootTopic()
+"""
+import re
+from xml.dom import minidom
+
+from . import const
+from . import litedom
+
+_SHEET_START = re.compile(
+    br"""<sheet(?:\s+[^\s=/>]+\s*=\s*(?:"[^"]*"|'[^']*'))*\s*(/?)>""")
+_SHEET_END = re.compile(br"</sheet\s*>")
+_ENCODING = re.compile(br"""^\s*<\?xml[^>]*encoding\s*=\s*["']([^"']+)["']""")
+# Constructs that may hide or fake sheet tags, such files are parsed eagerly
+_UNSUPPORTED = (b"<!--", b"<![CDATA[", b"<!DOCTYPE", b"<!ENTITY")
+
+
+class LazyChildren(object):
+    """Mixin of lazy element, children are loaded by `_lazy_loader` on first access of childNodes"""
+    __slots__ = ()
+
+    @property
+    def childNodes(self):
+        loader = self._lazy_loader
+        if loader is not None:
+            self._lazy_loader = None
+            loader(self)
+        return self._lazy_children
+
+    @childNodes.setter
+    def childNodes(self, value):
+        self._lazy_children = value
+
+
+class LazyMinidomElement(LazyChildren, minidom.Element):
+    pass
+
+
+class LazyLiteElement(LazyChildren, litedom.Element):
+    __slots__ = ("_lazy_loader", "_lazy_children")
+
+
+def create_lazy_element(node, loader):
+    """
+    Create lazy copy(without children) of element node, of the same DOM implementation.
+
+    :param node: element node to copy tag and attributes from
+    :param loader: callable(lazy node) to load children into the lazy node
+    """
+    if isinstance(node, litedom.Element):
+        lazy = LazyLiteElement(node.tagName, node.ownerDocument)
+        lazy._attrs = dict(node._attrs)
+    else:
+        lazy = LazyMinidomElement(node.tagName, node.namespaceURI, node.prefix, node.localName)
+        lazy.ownerDocument = node.ownerDocument
+        for attr in node.attributes.values():
+            lazy.setAttributeNS(attr.namespaceURI, attr.name, attr.value)
+    lazy._lazy_loader = loader
+    return lazy
+
+
+def is_pending(node):
+    """Whether children of the node have not been loaded yet"""
+    return getattr(node, "_lazy_loader", None) is not None
+
+
+class SheetIndex(object):
+    """Byte ranges of the top level <sheet> elements in content.xml"""
+
+    def __init__(self, data, ranges):
+        """
+        :param data: content.xml bytes
+        :param ranges: [(start, content start, content end, end), ...] of each sheet.
+                       Content range is empty for self-closing sheet.
+        """
+        self.data = data
+        self.ranges = ranges
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def getContent(self, index):
+        """Get bytes between start tag and end tag of sheet"""
+        _, content_start, content_end, _ = self.ranges[index]
+        return self.data[content_start:content_end]
+
+    def getSkeleton(self):
+        """Get content.xml bytes with every sheet emptied"""
+        parts = []
+        position = 0
+        for start, content_start, content_end, end in self.ranges:
+            parts.append(self.data[position:content_start])
+            if content_start != end:
+                parts.append(b"</sheet>")
+            position = end
+        parts.append(self.data[position:])
+        return b"".join(parts)
+
+    def getFragment(self, index, root_tag):
+        """Get the sheet as a standalone document, wrapped in the root start tag for namespaces"""
+        start, _, _, end = self.ranges[index]
+        return b"".join((self.data[:self.ranges[0][0]], self.data[start:end],
+                         b"</", root_tag.encode("utf-8"), b">"))
+
+
+def index_sheets(data):
+    """
+    Index top level <sheet> elements of content.xml without parsing it.
+
+    :param data: content.xml bytes
+    :return: `SheetIndex`, None if the content can not be indexed safely
+    """
+    if data.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return None
+    match = _ENCODING.match(data)
+    if match and match.group(1).lower() not in (b"utf-8", b"utf8"):
+        return None
+    if any(token in data for token in _UNSUPPORTED):
+        return None
+
+    ranges = []
+    position = 0
+    while True:
+        match = _SHEET_START.search(data, position)
+        if not match:
+            break
+        if match.group(1):
+            ranges.append((match.start(), match.end(), match.end(), match.end()))
+            position = match.end()
+            continue
+        end = _SHEET_END.search(data, match.end())
+        if not end:
+            return None
+        ranges.append((match.start(), match.end(), end.start(), end.end()))
+        position = end.end()
+    return SheetIndex(data, ranges) if ranges else None
+
+
+class _SheetLoader(object):
+    __slots__ = ("index", "position", "backend")
+
+    def __init__(self, index, position, backend):
+        self.index = index
+        self.position = position
+        self.backend = backend
+
+    def getContent(self):
+        return self.index.getContent(self.position)
+
+    def __call__(self, node):
+        owner = node.ownerDocument
+        document = self.backend.parse(self.index.getFragment(self.position, owner.documentElement.tagName))
+        sheet = document.documentElement.lastChild
+        children = sheet.childNodes
+        stack = list(children)
+        for child in children:
+            child.parentNode = node
+        node.childNodes = children
+        # Nodes are adopted as they are, fix their owner document
+        while stack:
+            child = stack.pop()
+            child.ownerDocument = owner
+            stack.extend(child.childNodes)
+
+
+def parse(data, backend):
+    """
+    Parse content.xml with sheets loaded lazily. Fall back to parse eagerly if the
+    sheets can not be indexed.
+
+    :param data: content.xml bytes
+    :param backend: `XmlBackend` to parse with
+    :return: document node
+    """
+    index = index_sheets(data)
+    if index is None:
+        return backend.parse(data)
+
+    document = backend.parse(index.getSkeleton())
+    root = document.documentElement
+    sheets = [node for node in root.childNodes
+              if node.nodeType == node.ELEMENT_NODE and node.tagName == const.TAG_SHEET]
+    if len(sheets) != len(index):
+        # Sheet tags found by index are not exactly the top level sheets
+        return backend.parse(data)
+
+    for position, sheet in enumerate(sheets):
+        if index.ranges[position][1] == index.ranges[position][3]:
+            # Self-closing sheet has nothing to load
+            continue
+        root.replaceChild(create_lazy_element(sheet, _SheetLoader(index, position, backend)), sheet)
+    return document
+
+
+def _write_start_tag(writer, node):
+    writer.write("<" + node.tagName)
+    for name, value in node.attributes.items():
+        writer.write(' %s="%s"' % (name, litedom._escape(value)))
+
+
+def writexml(document, writer):
+    """
+    Write document with sheets loaded lazily, the same as `writexml` of the document
+    except that content of sheets never loaded is written verbatim.
+
+    :return: False if there is no pending sheet, nothing is written then.
+    """
+    root = document.documentElement
+    if root is None or not any(is_pending(node) for node in root.childNodes):
+        return False
+
+    writer.write('<?xml version="1.0" encoding="utf-8"?>')
+    _write_start_tag(writer, root)
+    writer.write(">")
+    for node in root.childNodes:
+        if is_pending(node):
+            # Attributes(e.g. timestamp) may be changed without loading the children
+            _write_start_tag(writer, node)
+            writer.write(">")
+            writer.write(node._lazy_loader.getContent().decode("utf-8"))
+            writer.write("</%s>" % node.tagName)
+        else:
+            node.writexml(writer, "", "", "")
+    writer.write("</%s>" % root.tagName)
+    return True
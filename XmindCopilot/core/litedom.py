@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    XmindCopilot.core.litedom
+
+    Compact DOM implementing the subset of `xml.dom.minidom` used by the core
+    element classes. Attributes are plain dicts and nodes use __slots__, which makes
+    it several times lighter than minidom. Trees are built from ElementTree or lxml
+    parse results, see `XmindCopilot.core.backend`.
+"""
+import gc
+import io
+from xml.dom import NotFoundErr
+
+XML_NAMESPACE = "http://www.w3.org/XML/1998/namespace"
+XMLNS_NAMESPACE = "http://www.w3.org/2000/xmlns/"
+
+
+def _escape(data):
+    # Same escaping as minidom, so both backends write identical XML
+    return data.replace("&", "&amp;").replace("<", "&lt;"). \
+        replace("\"", "&quot;").replace(">", "&gt;")
+
+
+class Node(object):
+    __slots__ = ("parentNode", "ownerDocument", "__weakref__")
+
+    ELEMENT_NODE = 1
+    TEXT_NODE = 3
+    DOCUMENT_NODE = 9
+
+    childNodes = ()
+
+    def hasChildNodes(self):
+        return bool(self.childNodes)
+
+    @property
+    def firstChild(self):
+        return self.childNodes[0] if self.childNodes else None
+
+    @property
+    def lastChild(self):
+        return self.childNodes[-1] if self.childNodes else None
+
+    def _serialize(self, parts, indent, addindent, newl):
+        """Append XML of this node to parts, without recursion"""
+        stack = [(self, indent, False)]
+        while stack:
+            node, indent, closing = stack.pop()
+            if node.nodeType == Node.TEXT_NODE:
+                parts.append(_escape("%s%s%s" % (indent, node.data, newl)))
+                continue
+            if node.nodeType == Node.DOCUMENT_NODE:
+                stack.extend((child, indent, False) for child in reversed(node.childNodes))
+                continue
+            if closing:
+                if not (len(node.childNodes) == 1 and node.childNodes[0].nodeType == Node.TEXT_NODE):
+                    parts.append(indent)
+                parts.append("</%s>%s" % (node.tagName, newl))
+                continue
+            parts.append(indent + "<" + node.tagName)
+            for name, value in node._attrs.items():
+                parts.append(' %s="%s"' % (name, _escape(value)))
+            children = node.childNodes
+            if not children:
+                parts.append("/>%s" % newl)
+            elif len(children) == 1 and children[0].nodeType == Node.TEXT_NODE:
+                parts.append(">")
+                parts.append(_escape(children[0].data))
+                parts.append("</%s>%s" % (node.tagName, newl))
+            else:
+                parts.append(">" + newl)
+                stack.append((node, indent, True))
+                stack.extend((child, indent + addindent, False) for child in reversed(children))
+
+    def writexml(self, writer, indent="", addindent="", newl=""):
+        parts = []
+        self._serialize(parts, indent, addindent, newl)
+        writer.write("".join(parts))
+
+    def toxml(self, encoding=None):
+        writer = io.StringIO()
+        if self.nodeType == Node.DOCUMENT_NODE:
+            self.writexml(writer, encoding=encoding)
+        else:
+            self.writexml(writer)
+        xml = writer.getvalue()
+        return xml.encode(encoding) if encoding else xml
+
+
+class _ParentNode(Node):
+    __slots__ = ("childNodes",)
+
+    def appendChild(self, node):
+        if node.parentNode is not None:
+            node.parentNode.removeChild(node)
+        self.childNodes.append(node)
+        node.parentNode = self
+        return node
+
+    def insertBefore(self, new_node, ref_node):
+        if ref_node is None:
+            return self.appendChild(new_node)
+        if new_node.parentNode is not None:
+            new_node.parentNode.removeChild(new_node)
+        self.childNodes.insert(self._indexOf(ref_node), new_node)
+        new_node.parentNode = self
+        return new_node
+
+    def removeChild(self, old_node):
+        del self.childNodes[self._indexOf(old_node)]
+        old_node.parentNode = None
+        return old_node
+
+    def replaceChild(self, new_node, old_node):
+        if new_node.parentNode is not None:
+            new_node.parentNode.removeChild(new_node)
+        self.childNodes[self._indexOf(old_node)] = new_node
+        new_node.parentNode = self
+        old_node.parentNode = None
+        return old_node
+
+    def _indexOf(self, node):
+        for i, child in enumerate(self.childNodes):
+            if child is node:
+                return i
+        raise NotFoundErr()
+
+    def iterElements(self):
+        """Iterate descendant elements in document order"""
+        stack = list(reversed(self.childNodes))
+        while stack:
+            node = stack.pop()
+            if node.nodeType == Node.ELEMENT_NODE:
+                yield node
+                stack.extend(reversed(node.childNodes))
+
+
+class Text(Node):
+    __slots__ = ("data",)
+    nodeType = Node.TEXT_NODE
+
+    def __init__(self, data="", ownerDocument=None):
+        self.parentNode = None
+        self.ownerDocument = ownerDocument
+        self.data = data
+
+    @property
+    def nodeValue(self):
+        return self.data
+
+
+class Element(_ParentNode):
+    __slots__ = ("tagName", "_attrs")
+    nodeType = Node.ELEMENT_NODE
+
+    def __init__(self, tagName, ownerDocument=None):
+        self.parentNode = None
+        self.ownerDocument = ownerDocument
+        self.tagName = tagName
+        self.childNodes = []
+        self._attrs = {}
+
+    @property
+    def nodeName(self):
+        return self.tagName
+
+    @property
+    def prefix(self):
+        index = self.tagName.find(":")
+        return self.tagName[:index] if index >= 0 else None
+
+    @property
+    def localName(self):
+        return self.tagName[self.tagName.find(":") + 1:]
+
+    @property
+    def attributes(self):
+        # {qualified name: value}, items() is compatible with minidom
+        return self._attrs
+
+    def getAttribute(self, name):
+        return self._attrs.get(name, "")
+
+    def setAttribute(self, name, value):
+        self._attrs[name] = value
+
+    def removeAttribute(self, name):
+        try:
+            del self._attrs[name]
+        except KeyError:
+            raise NotFoundErr()
+
+    def hasAttribute(self, name):
+        return name in self._attrs
+
+    def lookupNamespaceURI(self, prefix):
+        if prefix == "xmlns":
+            return XMLNS_NAMESPACE
+        if prefix == "xml":
+            return XML_NAMESPACE
+        name = "xmlns:" + prefix if prefix else "xmlns"
+        node = self
+        while node is not None and node.nodeType == Node.ELEMENT_NODE:
+            if name in node._attrs:
+                return node._attrs[name] or None
+            node = node.parentNode
+
+    def hasAttributeNS(self, namespaceURI, localName):
+        for name in self._attrs:
+            index = name.find(":")
+            # Attributes without prefix have no namespace
+            if index >= 0 and name[index + 1:] == localName and \
+                    self.lookupNamespaceURI(name[:index]) == namespaceURI:
+                return True
+            if index < 0 and name == localName and namespaceURI is None:
+                return True
+        return False
+
+    def setAttributeNS(self, namespaceURI, qualifiedName, value):
+        self._attrs[qualifiedName] = value
+
+    def setIdAttribute(self, name):
+        # Ids are looked up by `Document.getElementById` with "id" attribute
+        pass
+
+
+class Document(_ParentNode):
+    __slots__ = ("_xmind_modified",)
+    nodeType = Node.DOCUMENT_NODE
+
+    def __init__(self):
+        self.parentNode = None
+        self.ownerDocument = None
+        self.childNodes = []
+
+    @property
+    def documentElement(self):
+        for node in self.childNodes:
+            if node.nodeType == Node.ELEMENT_NODE:
+                return node
+
+    def createElement(self, tagName):
+        return Element(tagName, self)
+
+    def createTextNode(self, data):
+        return Text(data, self)
+
+    def getElementById(self, id):
+        for node in self.iterElements():
+            if node._attrs.get("id") == id:
+                return node
+
+    def writexml(self, writer, indent="", addindent="", newl="", encoding=None, standalone=None):
+        declarations = []
+        if encoding:
+            declarations.append('encoding="%s"' % encoding)
+        if standalone is not None:
+            declarations.append('standalone="%s"' % ("yes" if standalone else "no"))
+        parts = ['<?xml version="1.0" %s?>%s' % (" ".join(declarations), newl)]
+        self._serialize(parts, indent, addindent, newl)
+        writer.write("".join(parts))
+
+
+def build(root, declarations):
+    """
+    Build `Document` from ElementTree(or lxml) element tree
+
+    :param root: root element, tags and attribute names in "{uri}local" form
+    :param declarations: {element: [(prefix, uri), ...]} namespace declarations of elements,
+                         used to restore prefixes and xmlns attributes
+    """
+    document = Document()
+    # Lots of linked nodes are created, cyclic gc passes during building are useless
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        # (element, parent node, names) where names maps "{uri}local" to qualified name in scope
+        stack = [(root, document, _Names({XML_NAMESPACE: "xml"}))]
+        while stack:
+            et_node, parent, names = stack.pop()
+            tag = et_node.tag
+            if not isinstance(tag, str):
+                # Comment or processing instruction
+                if et_node.tail:
+                    _append(parent, Text(et_node.tail, document))
+                continue
+            node = Element(None, document)
+            attrs = node._attrs
+            decls = declarations.get(et_node)
+            if decls:
+                prefixes = dict(names.prefixes)
+                for prefix, uri in decls:
+                    prefixes[uri] = prefix
+                    attrs["xmlns:" + prefix if prefix else "xmlns"] = uri
+                names = _Names(prefixes)
+            node.tagName = names[tag]
+            for name, value in et_node.attrib.items():
+                attrs[names[name]] = value
+            _append(parent, node)
+            if parent is not document and et_node.tail:
+                _append(parent, Text(et_node.tail, document))
+            if et_node.text:
+                _append(node, Text(et_node.text, document))
+            for child in reversed(et_node):
+                stack.append((child, node, names))
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return document
+
+
+def _append(parent, node):
+    parent.childNodes.append(node)
+    node.parentNode = parent
+
+
+class _Names(dict):
+    """Cache of "{uri}local" -> qualified name, for a set of namespace prefixes in scope"""
+
+    def __init__(self, prefixes):
+        super(_Names, self).__init__()
+        self.prefixes = prefixes
+
+    def __missing__(self, name):
+        qualified = name
+        if name[0] == "{":
+            uri, local = name[1:].split("}", 1)
+            prefix = self.prefixes.get(uri)
+            qualified = "%s:%s" % (prefix, local) if prefix else local
+        self[name] = qualified
+        return qualified
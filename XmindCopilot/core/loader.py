@@ -9,15 +9,19 @@ from .styles import StylesBookDocument
 from .manifest import ManifestBookDocument
 from . import const
 from .workbook import WorkbookDocument
+from .reference import ReferenceStore
+from .backend import get_backend
+from . import lazy
 from .. import utils
 import os
 
 
 class WorkbookLoader(object):
-    def __init__(self, path):
+    def __init__(self, path, lazy_sheets=False):
         """ Load XMind workbook from given path
 
         :param path: path to XMind file. If not an existing file, will not raise an exception.
+        :param lazy_sheets: if True, DOM of each sheet is built on first access, see `XmindCopilot.core.lazy`.
 
         """
         super(WorkbookLoader, self).__init__()
@@ -35,28 +39,37 @@ class WorkbookLoader(object):
         self._comments_stream = None
         self._manifest_stream = None
 
+        backend = get_backend()
         try:
             with utils.extract(self._input_source) as input_stream:
                 for stream in input_stream.namelist():
                     if stream == const.CONTENT_XML:
-                        self._content_stream = utils.parse_dom_string(
-                            input_stream.read(stream))
+                        if lazy_sheets:
+                            self._content_stream = lazy.parse(
+                                input_stream.read(stream), backend)
+                        else:
+                            self._content_stream = backend.parse(
+                                input_stream.read(stream))
                     elif stream == const.STYLES_XML:
-                        self._styles_stream = utils.parse_dom_string(
+                        self._styles_stream = backend.parse(
                             input_stream.read(stream))
                     elif stream == const.COMMENTS_XML:
-                        self._comments_stream = utils.parse_dom_string(
+                        self._comments_stream = backend.parse(
                             input_stream.read(stream))
                     elif stream == const.MANIFEST_XML:
-                        self._manifest_stream = utils.parse_dom_string(
+                        self._manifest_stream = backend.parse(
                             input_stream.read(stream))
 
         except BaseException:
             # FIXME: illegal char in xmind & illegal file name should be distinguished
             pass
 
-    def get_workbook(self, get_refs=True):
+    def get_workbook(self, get_refs=True, read_only=False):
         """ Parse XMind file to `WorkbookDocument` object and return
+
+        :param get_refs: DEPRECATED references(attachments, etc.) are always served lazily
+                         from the xmind file, nothing is extracted on load.
+        :param read_only: if True, wrapping existing topics/sheets will not modify the DOM.
         """
         path = self._input_source
         content = self._content_stream
@@ -66,12 +79,16 @@ class WorkbookLoader(object):
         stylesbook = StylesBookDocument(node=styles, path=path)
         commentsbook = CommentsBookDocument(node=comments, path=path)
         manifestbook = ManifestBookDocument(node=manifest, path=path)
-        reference_dir = None
-        if get_refs:
-            reference_dir = self.get_reference()
+        references = ReferenceStore(path)
         workbook = WorkbookDocument(node=content, path=path,
                                     stylesbook=stylesbook, commentsbook=commentsbook,
-                                    manifestbook=manifestbook, reference_dir=reference_dir)
+                                    manifestbook=manifestbook, references=references,
+                                    read_only=read_only)
+        # Documents parsed from file are unmodified until changed, so that they can be copied as they are on save
+        for document, node in ((workbook, content), (stylesbook, styles),
+                               (commentsbook, comments), (manifestbook, manifest)):
+            if node is not None:
+                document.setModified(False)
 
         return workbook
 
@@ -100,7 +117,8 @@ class WorkbookLoader(object):
 
     def get_reference(self, except_revisions=False):
         """
-        Get all references(image, etc.) in xmind zip file.
+        Extract all references(image, etc.) in xmind zip file into a temp directory.
+        `get_workbook` serves references lazily with `ReferenceStore` instead.
 
         :param except_revisions: whether or not to save `Revisions` content in order ot save space.
         :return: the temp reference directory path
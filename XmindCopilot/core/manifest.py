@@ -58,6 +58,7 @@ class ManifestBookDocument(Document):
 
 class ManifestBookElement(Element):
     """`ManifestBookElement` as the one and only root element of the manifest book document"""
+    __slots__ = ("_owner_manifestbook",)
     TAG_NAME = const.TAG_MANIFESTBOOK
 
     def __init__(self, node=None, ownerManifestBook=None):
@@ -90,6 +91,7 @@ class ManifestBookElement(Element):
 
 class ManifestElement(Element):
     """`ManifestElement` as element of the manifest book document"""
+    __slots__ = ("_owner_manifestbook",)
     TAG_NAME = const.TAG_FILE_ENTRY
 
     def __init__(self, node=None, ownerManifestBook=None):
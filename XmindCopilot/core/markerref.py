@@ -138,6 +138,7 @@ MarkerId.weekSat = 'week-sat'
 
 
 class MarkerRefsElement(WorkbookMixinElement):
+    __slots__ = ()
     TAG_NAME = const.TAG_MARKERREFS
 
     def __init__(self, node=None, ownerWorkbook=None):
@@ -145,6 +146,7 @@ class MarkerRefsElement(WorkbookMixinElement):
 
 
 class MarkerRefElement(WorkbookMixinElement):
+    __slots__ = ()
     TAG_NAME = const.TAG_MARKERREF
 
     def __init__(self, node=None, ownerWorkbook=None):
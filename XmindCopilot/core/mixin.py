@@ -12,6 +12,7 @@ from .. import utils
 class WorkbookMixinElement(Element):
     """`WorkbookMixinElement` as element of the document correspond XMind element.
     """
+    __slots__ = ("_owner_workbook",)
 
     def __init__(self, node=None, ownerWorkbook=None):
         super(WorkbookMixinElement, self).__init__(node)
@@ -29,6 +30,38 @@ class WorkbookMixinElement(Element):
         if not self._owner_workbook:
             self._owner_workbook = workbook
 
+    def _wrap(self, cls, node, **kwargs):
+        """
+        Get the wrapper of passed DOM node from the wrapper cache of owner workbook,
+        so the same node always returns the same wrapper.
+
+        :param cls: wrapper class, constructed by ``cls(node=node, **kwargs)`` on cache miss
+        :param kwargs: constructor arguments, ``ownerWorkbook`` of this element by default
+        """
+        owner_workbook = self.getOwnerWorkbook()
+        if not kwargs:
+            kwargs = {"ownerWorkbook": owner_workbook}
+        if owner_workbook is None:
+            return cls(node=node, **kwargs)
+        return owner_workbook.getWrapper(cls, node, **kwargs)
+
+    def _invalidate(self, node):
+        """Drop cached wrappers of removed DOM node and its descendants"""
+        owner_workbook = self.getOwnerWorkbook()
+        if owner_workbook is not None:
+            owner_workbook.invalidateWrapper(node)
+
+    def isReadOnly(self):
+        return bool(self._owner_workbook and self._owner_workbook.isReadOnly())
+
+    def _initIdAndTimestamp(self, node):
+        """
+        Add id and refresh timestamp for new element. Existing node of read-only workbook is left untouched.
+        """
+        if node is None or not self.isReadOnly():
+            self.addIdAttribute(const.ATTR_ID)
+            self.setAttribute(const.ATTR_TIMESTAMP, int(utils.get_current_time()))
+
     def getModifiedTime(self):
         timestamp = self.getAttribute(const.ATTR_TIMESTAMP)
         if timestamp:
@@ -45,6 +78,7 @@ class WorkbookMixinElement(Element):
 
 
 class TopicMixinElement(Element):
+    __slots__ = ("_owner_topic",)
     def __init__(self, node=None, ownerTopic=None):
         super(TopicMixinElement, self).__init__(node)
         self._owner_topic = ownerTopic
@@ -64,3 +98,10 @@ class TopicMixinElement(Element):
 
         return self._owner_topic.getOwnerWorkbook()
 
+    def _wrap(self, cls, node):
+        """Get the cached wrapper of passed DOM node which belongs to the same owner topic"""
+        owner_workbook = self.getOwnerWorkbook()
+        if owner_workbook is None:
+            return cls(node=node, ownerTopic=self._owner_topic)
+        return owner_workbook.getWrapper(cls, node, ownerTopic=self._owner_topic)
+
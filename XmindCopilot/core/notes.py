@@ -9,6 +9,7 @@ from .mixin import TopicMixinElement
 
 
 class NotesElement(TopicMixinElement):
+    __slots__ = ()
     TAG_NAME = const.TAG_NOTES
 
     def __init__(self, node=None, ownerTopic=None):
@@ -26,7 +27,7 @@ class NotesElement(TopicMixinElement):
             return
 
         if format is const.PLAIN_FORMAT_NOTE:
-            _note = PlainNotes(node=_note, ownerTopic=self.getOwnerTopic())
+            _note = self._wrap(PlainNotes, _note)
         else:
             raise Exception("Only support plain text notes right now")
 
@@ -34,6 +35,7 @@ class NotesElement(TopicMixinElement):
 
 
 class _NoteContentElement(TopicMixinElement):
+    __slots__ = ()
     def __init__(self, node=None, ownerTopic=None):
         super(_NoteContentElement, self).__init__(node, ownerTopic)
 
@@ -49,6 +51,7 @@ class PlainNotes(_NoteContentElement):
     :param ownerTopic:  `XmindCopilot.core.topic.TopicElement` object
 
     """
+    __slots__ = ()
 
     TAG_NAME = const.PLAIN_FORMAT_NOTE
 
@@ -9,6 +9,7 @@ from .mixin import WorkbookMixinElement
 
 
 class PositionElement(WorkbookMixinElement):
+    __slots__ = ()
     TAG_NAME = const.TAG_POSITION
 
     def __init__(self, node=None, ownerWorkbook=None):
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    XmindCopilot.core.reference
+"""
+import os
+import shutil
+
+from . import const
+from .. import utils
+
+XML_PARTS = (const.CONTENT_XML, const.STYLES_XML, const.COMMENTS_XML, const.MANIFEST_XML)
+
+
+class ReferenceStore(object):
+    """ Virtual directory of the references(attachments, revisions, etc.) of a workbook.
+
+    Unchanged references are read on demand from the source xmind file. Only added or
+    changed references are written to disk, into an overlay directory created lazily.
+
+    such as:
+        store = workbook.references
+        data = store.read("attachments/xxx.png")
+        path = store.getWritePath("attachments/yyy.png")  # write new file to path
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: source xmind file. If not an existing file, the store starts empty.
+        """
+        self._source = path if path and os.path.isfile(path) else None
+        self._zip = None
+        self._source_names = None
+        self._overlay_dir = None
+        # name -> file path of added or changed references
+        self._overlay = {}
+        # names of source references that have been removed
+        self._removed = set()
+
+    # ********** Source **********
+    def getSource(self):
+        return self._source
+
+    def _getZip(self):
+        if self._zip is None and self._source:
+            self._zip = utils.extract(self._source)
+        return self._zip
+
+    def _getSourceNames(self):
+        if self._source_names is None:
+            self._source_names = []
+            try:
+                zip_file = self._getZip()
+            except BaseException:
+                # FIXME: damaged xmind file is treated as empty
+                zip_file = None
+            if zip_file:
+                for info in zip_file.infolist():
+                    if info.is_dir() or info.filename in XML_PARTS:
+                        continue
+                    self._source_names.append(info.filename)
+        return self._source_names
+
+    def getSourceInfo(self, name):
+        """Get `ZipInfo` of unchanged source reference, None if it is added, changed or removed"""
+        if name in self._overlay or name in self._removed or name not in self._getSourceNames():
+            return None
+        return self._getZip().getinfo(name)
+
+    def getSourcePartInfo(self, name):
+        """Get `ZipInfo` of XML part(content.xml, etc.) in source xmind file, None if not found"""
+        if name not in XML_PARTS or not self._source:
+            return None
+        try:
+            return self._getZip().getinfo(name)
+        except KeyError:
+            return None
+
+    def close(self):
+        """Close the source xmind file. It will be reopened on demand."""
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+    def rebase(self, path):
+        """
+        Use another xmind file as source and drop all changes, e.g. after the workbook
+        has been saved to it.
+        """
+        self.close()
+        if self._overlay_dir:
+            shutil.rmtree(self._overlay_dir, ignore_errors=True)
+        self.__init__(path)
+
+    # ********** Read **********
+    def namelist(self):
+        if self._overlay_dir:
+            # Pick up files written into overlay directory directly
+            self.addDirectory(self._overlay_dir)
+        names = [n for n in self._getSourceNames() if n not in self._removed and n not in self._overlay]
+        names.extend(self._overlay)
+        return names
+
+    def __contains__(self, name):
+        return name in self._overlay or \
+            (name not in self._removed and name in self._getSourceNames())
+
+    def __iter__(self):
+        return iter(self.namelist())
+
+    def __len__(self):
+        return len(self.namelist())
+
+    def open(self, name):
+        """Open reference as binary file-like object"""
+        if name in self._overlay:
+            return open(self._overlay[name], "rb")
+        if name in self:
+            return self._getZip().open(name)
+        raise KeyError("Reference not found: %s" % name)
+
+    def read(self, name):
+        with self.open(name) as f:
+            return f.read()
+
+    def getPath(self, name):
+        """
+        Get file path of the reference. Unchanged source reference is extracted into the
+        overlay directory first, and is treated as changed since the file may be modified.
+        """
+        if name not in self._overlay:
+            data = self.read(name)
+            with open(self._newOverlayPath(name), "wb") as f:
+                f.write(data)
+        return self._overlay[name]
+
+    # ********** Write **********
+    def getOverlayDir(self):
+        if not self._overlay_dir:
+            self._overlay_dir = utils.temp_dir()
+        return self._overlay_dir
+
+    def _newOverlayPath(self, name):
+        path = utils.get_abs_path(utils.join_path(self.getOverlayDir(), name))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        self._overlay[name] = path
+        self._removed.discard(name)
+        return path
+
+    def getWritePath(self, name):
+        """Get file path to write an added or changed reference to"""
+        return self._newOverlayPath(name)
+
+    def write(self, name, data):
+        """Add or replace reference with bytes"""
+        with open(self._newOverlayPath(name), "wb") as f:
+            f.write(data)
+
+    def addDirectory(self, path):
+        """Add files under directory as added or changed references, named by relative path"""
+        for dirpath, dirnames, filenames in os.walk(path):
+            for filename in filenames:
+                file_path = utils.join_path(dirpath, filename)
+                name = os.path.relpath(file_path, path).replace(os.sep, "/")
+                if name not in self._overlay:
+                    self._overlay[name] = file_path
+                    self._removed.discard(name)
+
+    def remove(self, name):
+        path = self._overlay.pop(name, None)
+        if path and os.path.isfile(path):
+            os.remove(path)
+        if name in self._getSourceNames():
+            self._removed.add(name)
+
+    def isChanged(self, name):
+        """Whether the reference is added or changed since it was loaded"""
+        return name in self._overlay
+
+    def getChanged(self):
+        """Get {name: file path} of added or changed references"""
+        return dict(self._overlay)
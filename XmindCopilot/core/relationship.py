@@ -4,21 +4,19 @@
 """
     XmindCopilot.core.relationship
 """
-from .. import utils
 from . import const
 from .mixin import WorkbookMixinElement
-from .topic import TopicElement
 from .title import TitleElement
 
 
 class RelationshipElement(WorkbookMixinElement):
+    __slots__ = ()
     TAG_NAME = const.TAG_RELATIONSHIP
 
     def __init__(self, node=None, ownerWorkbook=None):
         super(RelationshipElement, self).__init__(node, ownerWorkbook)
 
-        self.addIdAttribute(const.ATTR_ID)
-        self.setAttribute(const.ATTR_TIMESTAMP, int(utils.get_current_time()))
+        self._initIdAndTimestamp(node)
 
     def _get_title(self):
         return self.getFirstChildNodeByTagName(const.TAG_TITLE)
@@ -28,12 +26,7 @@ class RelationshipElement(WorkbookMixinElement):
         if owner_workbook is None:
             return
 
-        end_point = owner_workbook.getElementById(id)
-        if end_point is None:
-            return
-
-        if end_point.tagName == const.TAG_TOPIC:
-            return TopicElement(end_point, owner_workbook)
+        return owner_workbook.getTopicById(id)
 
     # FIXME: Convert the following to getter/setter
 
@@ -60,12 +53,12 @@ class RelationshipElement(WorkbookMixinElement):
     def getTitle(self):
         title = self._get_title()
         if title:
-            title = TitleElement(title, self.getOwnerWorkbook())
+            title = self._wrap(TitleElement, title)
             return title.getTextContent()
 
     def setTitle(self, text):
         _title = self._get_title()
-        title = TitleElement(_title, self.getOwnerWorkbook())
+        title = self._wrap(TitleElement, _title) if _title else TitleElement(None, self.getOwnerWorkbook())
         title.setTextContent(text)
 
         if _title is None:
@@ -75,6 +68,7 @@ class RelationshipElement(WorkbookMixinElement):
 
 
 class RelationshipsElement(WorkbookMixinElement):
+    __slots__ = ()
     TAG_NAME = const.TAG_RELATIONSHIPS
 
     def __init__(self, node=None, ownerWorkbook=None):
@@ -85,8 +79,7 @@ class RelationshipsElement(WorkbookMixinElement):
         List all relationships
         """
         relationships = []
-        owner_workbook = self.getOwnerWorkbook()
         for r in self.getChildNodesByTagName(const.TAG_RELATIONSHIP):
-            relationships.append(RelationshipElement(r, owner_workbook))
+            relationships.append(self._wrap(RelationshipElement, r))
 
         return relationships
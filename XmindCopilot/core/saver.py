@@ -4,13 +4,26 @@
 """
     XmindCopilot.core.saver
 """
-import codecs
+import io
 import os
+import tempfile
+import zipfile
 
 from . import const
 from .. import utils
 
 
+def _copy_file_mode(src, dst):
+    """Give dst the mode of src, or the default mode of new files if src does not exist"""
+    if os.path.isfile(src):
+        mode = os.stat(src).st_mode
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    os.chmod(dst, mode & 0o777)
+
+
 class WorkbookSaver(object):
     def __init__(self, workbook):
         """ Save `WorkbookDocument` as XMind file.
@@ -18,72 +31,61 @@ class WorkbookSaver(object):
         :param workbook: `WorkbookDocument` object
         """
         self._workbook = workbook
-        self._temp_dir = utils.temp_dir()
-
-    def _get_content_xml(self):
-        content_path = utils.join_path(self._temp_dir, const.CONTENT_XML)
-        # encoding specifies the encoding which is to be used for the file.
-        with codecs.open(content_path, "w", encoding="utf-8") as f:
-            self._workbook.output(f)
-
-        return content_path
-
-    def _get_comments_xml(self):
-        comments_path = utils.join_path(self._temp_dir, const.COMMENTS_XML)
-        with codecs.open(comments_path, "w", encoding="utf-8") as f:
-            self._workbook.commentsbook.output(f)
+        self._source_fp = None
 
-        return comments_path
+    def _getSourceFile(self):
+        """Get source xmind file opened in binary mode to copy members from"""
+        if self._source_fp is None:
+            self._source_fp = open(self._workbook.references.getSource(), "rb")
+        return self._source_fp
 
-    def _get_styles_xml(self):
-        styles_path = utils.join_path(self._temp_dir, const.STYLES_XML)
-        with codecs.open(styles_path, "w", encoding="utf-8") as f:
-            self._workbook.stylesbook.output(f)
-
-        return styles_path
+    def _write_xml(self, f, name, document):
+        """
+        Serialize document straight into zip file member, without temp file.
 
-    def _get_manifest_xml(self):
-        Metainf_dir = os.path.join(self._temp_dir, const.META_INF_DIR)
-        if not os.path.exists(Metainf_dir):
-            os.makedirs(Metainf_dir)
-        manifest_path = utils.join_path(self._temp_dir, const.MANIFEST_XML)
-        with codecs.open(manifest_path, "w", encoding="utf-8") as f:
-            self._workbook.manifestbook.output(f)
+        :param f: `ZipFile` opened for writing
+        :param name: member name
+        :param document: `Document` to serialize
+        """
+        # TextIOWrapper buffers the small writes of DOM serialization before they reach the compressor
+        with io.TextIOWrapper(f.open(name, "w"), encoding="utf-8", newline="") as stream:
+            document.output(stream)
 
-        return manifest_path
+    def _write_part(self, f, name, document):
+        """
+        Write XML part into zip file. Part not modified since loaded is copied from the
+        source xmind file as it is.
+        """
+        if not document.isModified():
+            info = self._workbook.references.getSourcePartInfo(name)
+            if info is not None and utils.copy_zip_member(self._getSourceFile(), info, f):
+                return
+        self._write_xml(f, name, document)
 
-    def _get_origin_reference(self, except_revisions=False):
+    def _write_references(self, f, except_revisions=False):
         """
-        Get all references in xmind zip file.
+        Write references of the workbook into zip file. Unchanged references are
+        copied from the source xmind file, added or changed ones from disk.
 
         :param except_revisions: whether or not to save `Revisions` content in order ot save space.
         """
-        original_xmind_file = self._workbook.get_path()
-        reference_dir = utils.temp_dir()
-
-        filename, suffix = utils.split_ext(original_xmind_file)
-        if suffix != const.XMIND_EXT:
-            raise Exception('XMind filename require a "%s" extension' % const.XMIND_EXT)
-
-        original_zip = utils.extract(original_xmind_file)
-        try:
-            with original_zip as input_stream:
-                for name in input_stream.namelist():
-                    if name in [const.CONTENT_XML, const.STYLES_XML, const.COMMENTS_XML, const.MANIFEST_XML]:
-                        continue
-                    if const.REVISIONS_DIR in name and except_revisions:
-                        continue
-                    target_file = utils.get_abs_path(utils.join_path(reference_dir, name))
-                    if not os.path.exists(os.path.dirname(target_file)):
-                        os.makedirs(os.path.dirname(target_file))
-                    with open(target_file, 'xb') as f:
-                        f.write(original_zip.read(name))
-        except BaseException:
-            pass
-
-        return reference_dir
-
-    def save(self, path=None, only_content=False, except_attachments=False, except_revisions=False):
+        references = self._workbook.references
+        for name in references.namelist():
+            if const.REVISIONS_DIR in name and except_revisions:
+                continue
+            info = references.getSourceInfo(name)
+            if info is None:
+                f.write(references.getPath(name), name)
+                continue
+            # Copy unchanged reference as it is, without recompressing
+            if not utils.copy_zip_member(self._getSourceFile(), info, f):
+                new_info = zipfile.ZipInfo(name, info.date_time)
+                new_info.compress_type = info.compress_type
+                new_info.external_attr = info.external_attr
+                f.writestr(new_info, references.read(name))
+
+    def save(self, path=None, only_content=False, except_attachments=False, except_revisions=False,
+             compression=zipfile.ZIP_DEFLATED, compresslevel=None):
         """
         Save the workbook to the given path. If the path is not given,
         then will save to the path set in workbook.
@@ -91,6 +93,9 @@ class WorkbookSaver(object):
         :param only_content: only save content.xml
         :param except_attachments: only save content.xml、comments.xml、sytles.xml.
         :param except_revisions: whether or not to save `Revisions` content to save space.
+        :param compression: compression method of written parts, e.g. `zipfile.ZIP_STORED` for fast
+                            autosave. Unchanged references keep their original compression.
+        :param compresslevel: compression level, e.g. 9 for smallest archive. None for default.
         """
         original_path = self._workbook.get_path()
         new_path = path or original_path
@@ -100,33 +105,43 @@ class WorkbookSaver(object):
         if new_suffix != const.XMIND_EXT and new_suffix != const.XMIND8_EXT:
             raise Exception('XMind filename require a "%s" or "%s" extension' % {const.XMIND_EXT, const.XMIND8_EXT})
 
-        content = self._get_content_xml()
-        if not only_content:
-            styles = self._get_styles_xml()
-            comments = self._get_comments_xml()
-            manifest = self._get_manifest_xml()
-            if not except_attachments and\
-                    (os.path.exists(original_path) or self._workbook.reference_dir):
-                is_have_attachments = True
-                reference_dir = self._workbook.reference_dir
-                if not reference_dir:  # save original references if not given
-                    reference_dir = self._get_origin_reference(except_revisions)
-            else:
-                is_have_attachments = False
-
-        f = utils.compress(new_path)
-        f.write(content, const.CONTENT_XML)
-        if not only_content:
-            f.write(styles, const.STYLES_XML)
-            f.write(comments, const.COMMENTS_XML)
-            f.write(manifest, const.MANIFEST_XML)
-            if not except_attachments and is_have_attachments:
-                length = reference_dir.__len__()  # the length of the file string
-                for dirpath, dirnames, filenames in os.walk(reference_dir):
-                    for filename in filenames:
-                        f.write(utils.join_path(dirpath, filename),
-                                utils.join_path(dirpath[length + 1:] + os.sep, filename))
-        f.close()
+        # References may be served from the file being overwritten, so write to a temp file first
+        fd, temp_path = tempfile.mkstemp(suffix=new_suffix, dir=os.path.dirname(new_path))
+        os.close(fd)
+        try:
+            parts = [(const.CONTENT_XML, self._workbook)]
+            if not only_content:
+                parts += [(const.STYLES_XML, self._workbook.stylesbook),
+                          (const.COMMENTS_XML, self._workbook.commentsbook),
+                          (const.MANIFEST_XML, self._workbook.manifestbook)]
+            f = utils.compress(temp_path, compression, compresslevel)
+            for name, document in parts:
+                # A workbook created in memory may have no styles, comments or manifest
+                if document is not None:
+                    self._write_part(f, name, document)
+            if not only_content and not except_attachments:
+                self._write_references(f, except_revisions)
+            f.close()
+            if self._source_fp is not None:
+                self._source_fp.close()
+                self._source_fp = None
+
+            _copy_file_mode(new_path, temp_path)
+            references = self._workbook.references
+            if new_path == references.getSource():
+                references.close()
+            os.replace(temp_path, new_path)
+        except BaseException:
+            if self._source_fp is not None:
+                self._source_fp.close()
+                self._source_fp = None
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+            raise
+        if new_path == original_path:
+            references.rebase(new_path)
+            for name, document in parts:
+                document.setModified(False)
 
     # def save(self, path=None):
     #     """
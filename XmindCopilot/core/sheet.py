@@ -4,7 +4,6 @@
 """
 XmindCopilot.core.sheet command XMind sheets manipulation
 """
-from .. import utils
 from . import const
 from .mixin import WorkbookMixinElement
 from .topic import TopicElement
@@ -13,24 +12,24 @@ from .relationship import RelationshipElement, RelationshipsElement
 
 
 class SheetElement(WorkbookMixinElement):
+    __slots__ = ("_root_topic",)
     TAG_NAME = const.TAG_SHEET
 
     def __init__(self, node=None, ownerWorkbook=None):
         super(SheetElement, self).__init__(node, ownerWorkbook)
 
-        self.addIdAttribute(const.ATTR_ID)
-        self.setAttribute(const.ATTR_TIMESTAMP, int(utils.get_current_time()))
-        self._root_topic = self._get_root_topic()
+        self._initIdAndTimestamp(node)
+        # Resolved on demand for existing sheets, so that wrapping a lazily loaded sheet does
+        # not build its DOM. A new sheet needs its root topic to be a valid map.
+        self._root_topic = self._get_root_topic() if node is None else None
 
     def _get_root_topic(self):
         # This method initialize root topic, if not root topic DOM implementation, then create one
         topics = self.getChildNodesByTagName(const.TAG_TOPIC)
-        owner_workbook = self.getOwnerWorkbook()
         if len(topics) >= 1:
-            root_topic = topics[0]
-            root_topic = TopicElement(root_topic, owner_workbook)
+            root_topic = self._wrap(TopicElement, topics[0])
         else:
-            root_topic = TopicElement(ownerWorkbook=owner_workbook)
+            root_topic = TopicElement(ownerWorkbook=self.getOwnerWorkbook())
             self.appendChild(root_topic)
 
         return root_topic
@@ -43,12 +42,12 @@ class SheetElement(WorkbookMixinElement):
         Add relationship to sheet
         """
         _rels = self._getRelationships()
-        owner_workbook = self.getOwnerWorkbook()
-
-        rels = RelationshipsElement(_rels, owner_workbook)
 
         if not _rels:
+            rels = RelationshipsElement(None, self.getOwnerWorkbook())
             self.appendChild(rels)
+        else:
+            rels = self._wrap(RelationshipsElement, _rels)
 
         rels.appendChild(rel)
 
@@ -83,8 +82,7 @@ class SheetElement(WorkbookMixinElement):
         _rels = self._getRelationships()
         if not _rels:
             return []
-        owner_workbook = self.getOwnerWorkbook()
-        return RelationshipsElement(_rels, owner_workbook).getRelationships()
+        return self._wrap(RelationshipsElement, _rels).getRelationships()
 
     def removeRelationship(self, rel):
         """
@@ -95,14 +93,19 @@ class SheetElement(WorkbookMixinElement):
         if not rels:
             return
 
+        self._setModified()
         rel = rel.getImplementation()
         rels.removeChild(rel)
+        self._invalidate(rel)
         if not rels.hasChildNodes():
             self.getImplementation().removeChild(rels)
+            self._invalidate(rels)
 
         self.updateModifiedTime()
 
     def getRootTopic(self):
+        if self._root_topic is None:
+            self._root_topic = self._get_root_topic()
         return self._root_topic
 
     def _get_title(self):
@@ -112,12 +115,12 @@ class SheetElement(WorkbookMixinElement):
     def getTitle(self):
         title = self._get_title()
         if title:
-            title = TitleElement(title, self.getOwnerWorkbook())
+            title = self._wrap(TitleElement, title)
             return title.getTextContent()
 
     def setTitle(self, text):
         _title = self._get_title()
-        title = TitleElement(_title, self.getOwnerWorkbook())
+        title = self._wrap(TitleElement, _title) if _title else TitleElement(None, self.getOwnerWorkbook())
         title.setTextContent(text)
 
         if _title is None:
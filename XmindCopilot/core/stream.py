@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    XmindCopilot.core.stream
+
+    Read topics of an XMind file without building a DOM. content.xml is parsed
+    incrementally straight from the zip, and parsed elements are cleared as soon as
+    they are consumed, so memory stays flat regardless of file size.
+"""
+from collections import namedtuple
+from xml.etree import ElementTree
+
+from . import const
+from .. import utils
+
+TopicRecord = namedtuple("TopicRecord", [
+    "id",         # topic id
+    "title",      # title text, None if empty
+    "href",       # xlink:href, None if not set
+    "markers",    # tuple of marker ids
+    "labels",     # tuple of labels
+    "notes",      # plain notes, None if not set
+    "depth",      # 0 for root topic of sheet
+    "type",       # "root", "attached", "detached", "summary", "callout", etc.
+    "sheet",      # index of sheet
+    "sheet_id",   # id of sheet
+    "parent_id",  # id of parent topic, None for root topic
+    "path",       # tuple of titles of ancestor topics, from root topic to parent topic
+])
+
+_HREF = "{http://www.w3.org/1999/xlink}href"
+
+
+def _local(tag):
+    return tag[tag.rfind("}") + 1:]
+
+
+class _OpenTopic(object):
+    __slots__ = ("id", "title", "href", "markers", "labels", "notes", "depth", "type", "parent_id", "path")
+
+    def __init__(self, element, depth, type, parent):
+        self.id = element.get(const.ATTR_ID)
+        self.href = element.get(_HREF)
+        self.title = None
+        self.markers = []
+        self.labels = []
+        self.notes = None
+        self.depth = depth
+        self.type = type
+        if parent is None:
+            self.parent_id = None
+            self.path = ()
+        else:
+            self.parent_id = parent.id
+            self.path = parent.path + (parent.title,)
+
+
+def iter_topics(path):
+    """
+    Iterate topics of an XMind file as `TopicRecord`, without building a DOM.
+
+    Records come in post-order(sub topics before their parent topic), since a topic
+    is complete only when its end tag is parsed. Use depth/parent_id/path to
+    rebuild the structure.
+
+    such as:
+        for record in iter_topics("map.xmind"):
+            if record.href:
+                print(" -> ".join(record.path + (record.title,)), record.href)
+
+    :param path: XMind file path
+    """
+    with utils.extract(path) as zip_file:
+        with zip_file.open(const.CONTENT_XML) as stream:
+            yield from _iter_topics(stream)
+
+
+def _iter_topics(stream):
+    sheet = -1
+    sheet_id = None
+    # local names of open elements
+    tags = []
+    # open topics, from root topic to the innermost one
+    topics = []
+    # type attribute of open <topics> elements
+    topics_types = []
+    for event, element in ElementTree.iterparse(stream, events=("start", "end")):
+        tag = _local(element.tag)
+        if event == "start":
+            tags.append(tag)
+            if tag == const.TAG_TOPIC:
+                if topics:
+                    parent = topics[-1]
+                    type = topics_types[-1] if tags[-2] == const.TAG_TOPICS else None
+                else:
+                    parent = None
+                    type = const.TOPIC_ROOT
+                topics.append(_OpenTopic(element, len(topics), type, parent))
+            elif tag == const.TAG_TOPICS:
+                topics_types.append(element.get(const.ATTR_TYPE))
+            elif tag == const.TAG_SHEET:
+                sheet += 1
+                sheet_id = element.get(const.ATTR_ID)
+            elif tag == const.TAG_MARKERREF and len(tags) > 2 and tags[-3] == const.TAG_TOPIC:
+                topics[-1].markers.append(element.get(const.ATTR_MARKERID))
+            continue
+
+        tags.pop()
+        parent_tag = tags[-1] if tags else None
+        if tag == const.TAG_TOPIC:
+            topic = topics.pop()
+            element.clear()
+            yield TopicRecord(topic.id, topic.title, topic.href, tuple(topic.markers),
+                              tuple(topic.labels), topic.notes, topic.depth, topic.type, sheet, sheet_id,
+                              topic.parent_id, topic.path)
+        elif tag == const.TAG_TITLE and parent_tag == const.TAG_TOPIC:
+            topics[-1].title = element.text or None
+        elif tag == const.TAG_LABEL and len(tags) > 1 and tags[-2] == const.TAG_TOPIC:
+            topics[-1].labels.append(element.text or "")
+        elif tag == const.PLAIN_FORMAT_NOTE and parent_tag == const.TAG_NOTES and \
+                len(tags) > 1 and tags[-2] == const.TAG_TOPIC:
+            topics[-1].notes = element.text or None
+        elif tag == const.TAG_TOPICS:
+            topics_types.pop()
+            element.clear()
+        elif tag in (const.TAG_CHILDREN, const.TAG_SHEET):
+            element.clear()
@@ -45,6 +45,7 @@ class StylesBookDocument(Document):
 class StylesBookElement(Element):
     """ `StylesBookElement` as the one and only root element of the styles book document.
     """
+    __slots__ = ("_owner_stylesbook",)
     TAG_NAME = const.TAG_STYLESBOOK
 
     def __init__(self, node=None, ownerStylesBook=None):
@@ -71,6 +72,7 @@ class StyleElement(Element):
         <topic-properties shape-class="org.xmind.topicShape.ellipse"/>
     </style>
     """
+    __slots__ = ("_owner_stylesbook",)
     TAG_NAME = const.TAG_STYLE
 
     def __init__(self, node=None, ownerStylesBook=None):
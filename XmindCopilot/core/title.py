@@ -10,6 +10,7 @@ from .mixin import WorkbookMixinElement
 
 
 class TitleElement(WorkbookMixinElement):
+    __slots__ = ()
     TAG_NAME = const.TAG_TITLE
 
     def __init__(self, node=None, ownerWorkbook=None):
@@ -14,10 +14,13 @@ from .labels import LabelsElement, LabelElement
 from .markerref import MarkerRefElement
 from .markerref import MarkerRefsElement
 from .markerref import MarkerId
+from .walker import TopicWalker
+from .builder import SubtreeBuilder, iter_items, iter_indented_list, iter_pairs
 from ..fmt_cvt.latex_render import latex2img_web, latex2img_plt
-from ..fmt_cvt.md2xmind import MarkDown2Xmind
+from ..fmt_cvt.md2xmind import MarkDown2Xmind, convert_equation_titles
 from ..fmt_cvt.table_render import markdown_table_to_png
 from .. import utils
+import os
 import re
 import json
 
@@ -37,13 +40,13 @@ def split_hyperlink(hyperlink):
 
 
 class TopicElement(WorkbookMixinElement):
+    __slots__ = ()
     TAG_NAME = const.TAG_TOPIC
 
     def __init__(self, node=None, ownerWorkbook=None, title: str = "", image_path: str = ""):
         super(TopicElement, self).__init__(node, ownerWorkbook)
 
-        self.addIdAttribute(const.ATTR_ID)
-        self.setAttribute(const.ATTR_TIMESTAMP, int(utils.get_current_time()))
+        self._initIdAndTimestamp(node)
         if not title == "":
             self.setTitle(title)
         if not image_path == "":
@@ -94,12 +97,12 @@ class TopicElement(WorkbookMixinElement):
     def getTitle(self):
         title = self._get_title()
         if title:
-            title = TitleElement(title, self.getOwnerWorkbook())
+            title = self._wrap(TitleElement, title)
             return title.getTextContent()
 
     def setTitle(self, text):
         _title = self._get_title()
-        title = TitleElement(_title, self.getOwnerWorkbook())
+        title = self._wrap(TitleElement, _title) if _title else TitleElement(None, self.getOwnerWorkbook())
         title.setTextContent(text)
         if _title is None:
             self.appendChild(title)
@@ -111,14 +114,14 @@ class TopicElement(WorkbookMixinElement):
         :param svgwidth: svg:width of title of this topic, default is 500
         """
         _title = self._get_title()
-        title = TitleElement(_title, self.getOwnerWorkbook())
+        title = self._wrap(TitleElement, _title) if _title else TitleElement(None, self.getOwnerWorkbook())
         title.setSvgWidth(svgwidth)
 
     def getImage(self):
         """Get ImageElement of this topic"""
         image_node = self._get_image()
         if image_node:
-            return ImageElement(image_node, self.getOwnerWorkbook())
+            return self._wrap(ImageElement, image_node)
 
     def getImageAttr(self):
         image_element = self.getImage()
@@ -158,24 +161,31 @@ class TopicElement(WorkbookMixinElement):
             # im = latex2img_web(latex_equation)
             latex_equation = latex_equation.replace("$$", "")
             im = latex2img_plt(latex_equation)
-            self.setImage(im, align, height, width)
+            try:
+                self.setImage(im, align, height, width)
+            finally:
+                # The image is copied into the workbook
+                os.remove(im)
             return True
         except Exception:
             print("Warning: setLatexEquation failed:", latex_equation)
             return False
 
     # For Markdown to Xmind
-    def convertTitle2Equation(self, align=None, height=None, width=None, recursive=False):
+    def convertTitle2Equation(self, align=None, height=None, width=None, recursive=False, workers=None):
         """
         Convert title to latex equation
 
         :param align: image align (["top", "bottom", "left", "right"]). if it is None, it will be removed(Defaults to aligning top).
         :param height: image svg:height. If it is None, it will be removed.
         :param width: image svg:width. If it is None, it will be removed.
+        :param recursive: if convert sub topics. Their equations are rendered in one batch, see
+                          `XmindCopilot.fmt_cvt.md2xmind.convert_equation_titles`
+        :param workers: number of processes to render with if recursive, None for the number of CPUs
+        :return: {formula: error} of formulas failed to render if recursive
         """
         if recursive:
-            for c in self.getSubTopics():
-                c.convertTitle2Equation(align, height, width, recursive)
+            return convert_equation_titles([self], align, height, width, workers)
         title = self.getTitle()
         if title:
             if re.match(r'^[\s\n]{0,}\$.*?\$[\s\n]{0,}$', title, re.S):
@@ -190,8 +200,9 @@ class TopicElement(WorkbookMixinElement):
         :param recursive: if convert sub topics
         """
         if recursive:
-            for c in self.getSubTopics():
-                c.convertTitle2WebImage(align, height, width, recursive)
+            for topic, depth, path in self.walk(order="post"):
+                topic.convertTitle2WebImage(align, height, width)
+            return
         title = self.getTitle()
         if title:
             # FIXME:
@@ -214,8 +225,9 @@ class TopicElement(WorkbookMixinElement):
         The hyperlink format is [title](url)
         """
         if recursive:
-            for c in self.getSubTopics():
-                c.convertTitleWithHyperlink(recursive)
+            for topic, depth, path in self.walk(order="post"):
+                topic.convertTitleWithHyperlink()
+            return
         title = self.getTitle()
         if title:
             strmatch = re.search(r'\[(.*)\]\((.*)\)', title)
@@ -229,8 +241,9 @@ class TopicElement(WorkbookMixinElement):
         Convert title to table
         """
         if recursive:
-            for c in self.getSubTopics():
-                c.convertTitle2Table(recursive)
+            for topic, depth, path in self.walk(order="post"):
+                topic.convertTitle2Table(align, height, width)
+            return
         title = self.getTitle()
         if title:
             if re.match(r'^\|.*\|$', title, re.S):
@@ -245,13 +258,12 @@ class TopicElement(WorkbookMixinElement):
         refs = self._get_markerrefs()
         if not refs:
             return []
-        tmp = MarkerRefsElement(refs, self.getOwnerWorkbook())
+        tmp = self._wrap(MarkerRefsElement, refs)
         markers = tmp.getChildNodesByTagName(const.TAG_MARKERREF)
         marker_list = []
         if markers:
             for i in markers:
-                marker_list.append(MarkerRefElement(
-                    i, self.getOwnerWorkbook()))
+                marker_list.append(self._wrap(MarkerRefElement, i))
         return marker_list
 
     def addMarker(self, markerId):
@@ -270,13 +282,13 @@ class TopicElement(WorkbookMixinElement):
             tmp = MarkerRefsElement(None, self.getOwnerWorkbook())
             self.appendChild(tmp)
         else:
-            tmp = MarkerRefsElement(refs, self.getOwnerWorkbook())
+            tmp = self._wrap(MarkerRefsElement, refs)
         markers = tmp.getChildNodesByTagName(const.TAG_MARKERREF)
 
         # If the same family marker exists, replace it
         if markers:
             for m in markers:
-                mre = MarkerRefElement(m, self.getOwnerWorkbook())
+                mre = self._wrap(MarkerRefElement, m)
                 # look for a marker of same family
                 if mre.getMarkerId().getFamily() == markerId.getFamily():
                     mre.setMarkerId(markerId)
@@ -294,7 +306,7 @@ class TopicElement(WorkbookMixinElement):
         _labels = self._get_labels()
         if not _labels:
             return None
-        tmp = LabelsElement(_labels, self)
+        tmp = self._wrap(LabelsElement, _labels, ownerTopic=self)
         # labels = tmp.getChildNodesByTagName(const.TAG_LABEL)
         # label_list = []
         # if labels:
@@ -302,8 +314,10 @@ class TopicElement(WorkbookMixinElement):
         #         label_list.append(LabelElement(i, self.getOwnerWorkbook()))
         # return label_list
 
-        label = LabelElement(node=tmp.getFirstChildNodeByTagName(
-            const.TAG_LABEL), ownerTopic=self)
+        _label = tmp.getFirstChildNodeByTagName(const.TAG_LABEL)
+        if not _label:
+            return None
+        label = self._wrap(LabelElement, _label, ownerTopic=self)
         content = label.getLabel()
         return content
 
@@ -313,10 +327,11 @@ class TopicElement(WorkbookMixinElement):
             tmp = LabelsElement(None, self)
             self.appendChild(tmp)
         else:
-            tmp = LabelsElement(_labels, self)
+            tmp = self._wrap(LabelsElement, _labels, ownerTopic=self)
             old = tmp.getFirstChildNodeByTagName(const.TAG_LABEL)
             if old:
                 tmp.getImplementation().removeChild(old)
+                self._invalidate(old)
 
         label = LabelElement(content, None, self)
         tmp.appendChild(label)
@@ -345,7 +360,7 @@ class TopicElement(WorkbookMixinElement):
         _notes = self._get_notes()
         if not _notes:
             return None
-        tmp = NotesElement(_notes, self)
+        tmp = self._wrap(NotesElement, _notes, ownerTopic=self)
         # TODO: Only support plain text notes right now
         content = tmp.getContent(const.PLAIN_FORMAT_NOTE)
         return content
@@ -361,26 +376,23 @@ class TopicElement(WorkbookMixinElement):
             tmp = NotesElement(None, self)
             self.appendChild(tmp)
         else:
-            tmp = NotesElement(_notes, self)
+            tmp = self._wrap(NotesElement, _notes, ownerTopic=self)
             old = tmp.getFirstChildNodeByTagName(new.getFormat())
             if old:
                 tmp.getImplementation().removeChild(old)
+                self._invalidate(old)
 
         tmp.appendChild(new)
         return new
 
     def setFolded(self, recursive=False):
-        self.setAttribute(const.ATTR_BRANCH, const.VAL_FOLDED)
-        if recursive:
-            for c in self.getSubTopics():
-                c.setFolded(recursive=True)
+        for topic, depth, path in self.walk(max_depth=None if recursive else 0):
+            topic.setAttribute(const.ATTR_BRANCH, const.VAL_FOLDED)
         # self.updateModifiedTime()
 
     def setExpanded(self, recursive=False):
-        self.setAttribute(const.ATTR_BRANCH, None)
-        if recursive:
-            for c in self.getSubTopics():
-                c.setExpanded(recursive=True)
+        for topic, depth, path in self.walk(max_depth=None if recursive else 0):
+            topic.setAttribute(const.ATTR_BRANCH, None)
         # self.updateModifiedTime()
 
     def getPosition(self):
@@ -392,7 +404,7 @@ class TopicElement(WorkbookMixinElement):
         if position is None:
             return
 
-        position = PositionElement(position, self.getOwnerWorkbook())
+        position = self._wrap(PositionElement, position)
 
         x = position.getX()
         y = position.getY()
@@ -413,7 +425,7 @@ class TopicElement(WorkbookMixinElement):
             position = PositionElement(ownerWorkbook=owner_workbook)
             self.appendChild(position)
         else:
-            position = PositionElement(position, owner_workbook)
+            position = self._wrap(PositionElement, position)
 
         position.setX(x)
         position.setY(y)
@@ -422,7 +434,9 @@ class TopicElement(WorkbookMixinElement):
     def removePosition(self):
         position = self._get_position()
         if position is not None:
+            self._setModified()
             self.getImplementation().removeChild(position)
+            self._invalidate(position)
         # self.updateModifiedTime()
 
     def getType(self):
@@ -438,7 +452,7 @@ class TopicElement(WorkbookMixinElement):
             return const.TOPIC_ROOT
 
         if parent.tagName == const.TAG_TOPICS:
-            topics = TopicsElement(parent, self.getOwnerWorkbook())
+            topics = self._wrap(TopicsElement, parent)
             return topics.getType()
 
     def modify(self, fun, *args, recursive=False):
@@ -449,18 +463,26 @@ class TopicElement(WorkbookMixinElement):
         :param kwargs: kwargs for fun
         :param recursive: if modify sub topics
         """
-        fun(self, *args)
-        if recursive:
-            for c in self.getSubTopics():
-                c.modify(fun, *args, recursive=recursive)
+        for topic, depth, path in self.walk(max_depth=None if recursive else 0):
+            fun(topic, *args)
+
+    def walk(self, order="pre", max_depth=None, include_detached=False):
+        """ Iterate this topic and its sub topics without recursion.
+
+        :param order: "pre"(parent first), "post"(children first) or "bfs"(breadth-first)
+        :param max_depth: do not descend below this depth(this topic is depth 0), None for unlimited
+        :param include_detached: also walk detached(floating) sub topics
+        :return: a `TopicWalker` yielding (topic, depth, path), call its `prune()`
+                 inside the loop to skip sub topics of the topic yielded last
+        """
+        return TopicWalker(self, order, max_depth, include_detached)
 
     # 获取单层子主题(TopicsElement形式返回 节点仍然在本层)
     def getTopics(self, topics_type=const.TOPIC_ATTACHED):
         topic_children = self._get_children()
 
         if topic_children:
-            topic_children = ChildrenElement(
-                topic_children, self.getOwnerWorkbook())
+            topic_children = self._wrap(ChildrenElement, topic_children)
 
             return topic_children.getTopics(topics_type)
 
@@ -510,7 +532,7 @@ class TopicElement(WorkbookMixinElement):
             topic_children = ChildrenElement(ownerWorkbook=owner_workbook)
             self.appendChild(topic_children)
         else:
-            topic_children = ChildrenElement(topic_children, owner_workbook)
+            topic_children = self._wrap(ChildrenElement, topic_children)
 
         topics = topic_children.getTopics(topics_type)
         if not topics:
@@ -518,14 +540,15 @@ class TopicElement(WorkbookMixinElement):
             topics.setAttribute(const.ATTR_TYPE, topics_type)
             topic_children.appendChild(topics)
 
-        topic_list = []
-        for i in topics.getChildNodesByTagName(const.TAG_TOPIC):
-            topic_list.append(TopicElement(i, owner_workbook))
+        topic_list = topics.getChildNodesByTagName(const.TAG_TOPIC)
 
         if index < 0 or index >= len(topic_list):
             topics.appendChild(topic)
         else:
-            topics.insertBefore(topic, topic_list[index])
+            topics.insertBefore(topic, self._wrap(TopicElement, topic_list[index]))
+        if owner_workbook is not None:
+            owner_workbook.registerWrapper(topic)
+            owner_workbook.indexTopic(topic.getImplementation())
         topic.setTitleSvgWidth(svg_width)
         return topic
 
@@ -533,12 +556,12 @@ class TopicElement(WorkbookMixinElement):
         return self.addSubTopic(TopicElement(ownerWorkbook=self.getOwnerWorkbook(), title=title), index)
 
     def addSubTopicbyList(self, content_list, index=-1):
-        if index < 0:
-            for item in content_list:
-                self.addSubTopicbyTitle(item)
-        else:
-            for i in range(len(content_list)):
-                self.addSubTopicbyTitle(content_list[i], index+i)
+        """
+        Add sub topics titled by each string in content_list
+        :param content_list: list of string
+        :param index: insert index
+        """
+        self._addSubTopicTree(iter_pairs((None, title) for title in content_list), index)
 
     def addSubTopicbyIndentedList(self, content_list, index=-1):
         """
@@ -546,29 +569,89 @@ class TopicElement(WorkbookMixinElement):
         :param content_list: list of string
         :param index: insert index
         """
-        minIndent = None
-        last = None
-        for i in range(len(content_list)):
-            item = content_list[i]
-            indent = re.match(r'[\t]{0,}', item).group().count('\t')
-            # if indent == 0:
-            #     pindex = index
-            # else:
-            #     pindex = -1
-            if minIndent is None or indent <= minIndent:
-                minIndent = indent
-                if last is not None:
-                    subtopic = self.addSubTopicbyTitle(
-                        content_list[last].strip('\t'), index)
-                    if index >= 0:
-                        index += 1
-                    subtopic.addSubTopicbyIndentedList(
-                        content_list[last+1:i], -1)
-                last = i
-            if i == len(content_list) - 1:
-                subtopic = self.addSubTopicbyTitle(
-                    content_list[last].strip('\t'), index)
-                subtopic.addSubTopicbyIndentedList(content_list[last+1:], -1)
+        self._addSubTopicTree(iter_indented_list(content_list), index)
+
+    def addSubTopicTree(self, tree, index=-1, topics_type=const.TOPIC_ATTACHED, svg_width=500):
+        """
+        Build a subtree of topics detached in one linear pass, then attach it to the current
+        topic. Much faster than adding topics one by one for large trees. 100k topics take about
+        0.7s with the "etree" XML backend, but about 2.5s with the default "minidom" backend,
+        see `XmindCopilot.set_xml_backend`.
+
+        :param tree: indented list of titles(sub topics prefixed by more '\t'), nested dicts
+                     {title: sub tree or None}, or (parent, title) pairs.
+                     See `XmindCopilot.core.builder` for details.
+        :param index: insert top level topics before given index. If index not given, append them.
+        :param topics_type: TOPIC_ATTACHED or TOPIC_DETACHED
+        :param svg_width: svg width of titles (default 500)
+        :return: list of added top level sub topics
+        """
+        top_nodes = self._addSubTopicTree(iter_items(tree), index, topics_type, svg_width)
+        return [self._wrap(TopicElement, node) for node in top_nodes]
+
+    def _addSubTopicTree(self, items, index=-1, topics_type=const.TOPIC_ATTACHED, svg_width=500):
+        """Build topics from (parent position, title) items and attach them, return top level topic nodes"""
+        owner_workbook = self.getOwnerWorkbook()
+        builder = SubtreeBuilder(owner_workbook.getOwnerDocument() if owner_workbook else None,
+                                 topics_type, svg_width)
+        top_nodes = builder.build(items)
+        if not top_nodes:
+            return top_nodes
+
+        insert = self._getTopicNodeInserter(builder, index, topics_type)
+        for node in top_nodes:
+            insert(node)
+        return top_nodes
+
+    def _getTopicNodeInserter(self, builder, index, topics_type):
+        """Get function(topic node) inserting detached topic nodes in order before given index"""
+        self._setModified()
+        topic_children = self._get_children()
+        topics = None
+        if topic_children:
+            topics = self._wrap(ChildrenElement, topic_children).getTopics(topics_type)
+        if topics is None:
+            children_node, topics_node = builder.createTopicsNode()
+            if topic_children:
+                topic_children.appendChild(topics_node)
+            else:
+                self._node.appendChild(children_node)
+            ref_node = None
+        else:
+            topic_list = topics.getChildNodesByTagName(const.TAG_TOPIC)
+            ref_node = topic_list[index] if 0 <= index < len(topic_list) else None
+            topics_node = topics.getImplementation()
+
+        owner_workbook = self.getOwnerWorkbook()
+
+        def insert(node):
+            topics_node.insertBefore(node, ref_node)
+            if owner_workbook is not None:
+                owner_workbook.indexTopic(node)
+        return insert
+
+    def addSubTopicStream(self, items, index=-1, topics_type=const.TOPIC_ATTACHED, svg_width=500):
+        """
+        Build topics from a stream of (parent position, title) items, and attach each top level
+        topic as soon as its subtree is complete. Unlike `addSubTopicTree`, items are never
+        held in memory as a whole.
+
+        :param items: iterable of (parent position, title) in pre-order, where parent position is
+                      the position of parent item in items, and -1 for top level topic.
+                      See `SubtreeBuilder.iterBuild`.
+        :return: list of added top level sub topics
+        """
+        owner_workbook = self.getOwnerWorkbook()
+        builder = SubtreeBuilder(owner_workbook.getOwnerDocument() if owner_workbook else None,
+                                 topics_type, svg_width)
+        insert = None
+        topics = []
+        for node in builder.iterBuild(items):
+            if insert is None:
+                insert = self._getTopicNodeInserter(builder, index, topics_type)
+            insert(node)
+            topics.append(self._wrap(TopicElement, node))
+        return topics
 
     def addSubTopicbyMarkDown(self, mdtext, cvtEquation=False, cvtWebImage=False, index=-1):
         MarkDown2Xmind(self).convert2xmind(
@@ -580,7 +663,12 @@ class TopicElement(WorkbookMixinElement):
 
     def removeTopic(self):
         """Remove(Detach) self from parent topic"""
+        self._setModified()
         self.getParentNode().removeChild(self.getImplementation())
+        self._invalidate(self.getImplementation())
+        owner_workbook = self.getOwnerWorkbook()
+        if owner_workbook is not None:
+            owner_workbook.unindexTopic(self.getImplementation())
 
     def removeSubTopic(self):
         """Remove all sub topics"""
@@ -588,31 +676,24 @@ class TopicElement(WorkbookMixinElement):
         for t in topics:
             t.removeTopic()
 
+    def _removeSubTopicIf(self, predicate, recursive=False):
+        """Remove sub topics matching predicate, sub topics of a topic are checked before itself"""
+        for t, depth, path in self.walk(order="post", max_depth=None if recursive else 1):
+            if depth > 0 and predicate(t):
+                t.removeTopic()
+
     def removeSubTopicbyMarkerId(self, markerId, recursive=False):
-        topics = self.getSubTopics()
-        for t in topics:
-            if recursive:
-                t.removeSubTopicbyMarkerId(markerId, recursive)
-            for m in t.getMarkers():
-                if m.getMarkerId().name == markerId:
-                    t.removeTopic()
+        self._removeSubTopicIf(
+            lambda t: any(m.getMarkerId().name == markerId for m in t.getMarkers()), recursive)
 
     def removeSubTopicbyTitle(self, title, recursive=False):
-        topics = self.getSubTopics()
-        for t in topics:
-            if recursive:
-                t.removeSubTopicbyTitle(title, recursive)
-            if t.getTitle() == title:
-                t.removeTopic()
+        self._removeSubTopicIf(lambda t: t.getTitle() == title, recursive)
 
     def removeSubTopicWithEmptyTitle(self, recursive=True):
         """Remove sub topic with empty title(reserved for image)"""
-        topics = self.getSubTopics()
-        for t in topics:
-            if recursive:
-                t.removeSubTopicWithEmptyTitle(recursive)
-            if (t.getTitle() is None or re.match(r'^[\t\s]{0,}$', t.getTitle())) and t.getImage() is None:
-                t.removeTopic()
+        self._removeSubTopicIf(
+            lambda t: (t.getTitle() is None or re.match(r'^[\t\s]{0,}$', t.getTitle())) and t.getImage() is None,
+            recursive)
 
     def moveTopic(self, index):
         '''
@@ -628,17 +709,17 @@ class TopicElement(WorkbookMixinElement):
             topic_children = ChildrenElement(ownerWorkbook=owner_workbook)
             self.appendChild(topic_children)
         else:
-            topic_children = ChildrenElement(topic_children, owner_workbook)
+            topic_children = self._wrap(ChildrenElement, topic_children)
         topics = topic_children.getTopics(const.TOPIC_ATTACHED)
-        topic_list = []
-        for i in topics.getChildNodesByTagName(const.TAG_TOPIC):
-            topic_list.append(TopicElement(i, owner_workbook))
+        topic_list = topics.getChildNodesByTagName(const.TAG_TOPIC)
         if index >= 0 and index < len(topic_list):
             # TODO: Why don't need to remove origin topic?（and the moved topic will not be duplicated）
             # self.removeTopic()
-            topics.insertBefore(self, topic_list[index])
+            topics.insertBefore(self, self._wrap(TopicElement, topic_list[index]))
         elif index == -1:
             topics.appendChild(self)
+        if owner_workbook is not None:
+            owner_workbook.indexTopic(self.getImplementation())
 
     # 获取自身引索
     def getIndex(self):
@@ -654,6 +735,17 @@ class TopicElement(WorkbookMixinElement):
     def getHyperlink(self):
         return self.getAttribute(const.ATTR_HREF)
 
+    def getTopicHyperlinkTarget(self):
+        """ Get the topic linked by topic hyperlink(xmind:#id) of this topic
+
+        :return: a `TopicElement` instance or None if hyperlink is not a topic hyperlink
+        """
+        hyperlink = self.getHyperlink()
+        owner_workbook = self.getOwnerWorkbook()
+        if not hyperlink or not owner_workbook or not hyperlink.startswith(const.TOPIC_PROTOCOL):
+            return
+        return owner_workbook.getTopicById(hyperlink[len(const.TOPIC_PROTOCOL):])
+
     def setHyperlink(self, hyperlink: str):
         """ Set hyperlink string directly to topic
 
@@ -726,22 +818,23 @@ class TopicElement(WorkbookMixinElement):
         """ Get topic's main content in the form of a dictionary.
             if subtopic exist, recursively get the subtopics content.
         """
-        data = {
-            'id': self.getAttribute(const.ATTR_ID),
-            'link': self.getAttribute(const.ATTR_HREF),
-            'title': self.getTitle(),
-            'note': self.getNotes(),
-            'label': self.getLabels(),
-            'comment': self.getComments(),
-            'markers': [marker.getMarkerId().name for marker in self.getMarkers() if marker],
-        }
-
-        if self.getSubTopics(topics_type=const.TOPIC_ATTACHED):
-            data['topics'] = []
-            for sub_topic in self.getSubTopics(topics_type=const.TOPIC_ATTACHED):
-                data['topics'].append(sub_topic.getData())
-
-        return data
+        stack = []  # data of topics on current path
+        for topic, depth, path in self.walk():
+            data = {
+                'id': topic.getAttribute(const.ATTR_ID),
+                'link': topic.getAttribute(const.ATTR_HREF),
+                'title': topic.getTitle(),
+                'note': topic.getNotes(),
+                'label': topic.getLabels(),
+                'comment': topic.getComments(),
+                'markers': [marker.getMarkerId().name for marker in topic.getMarkers() if marker],
+            }
+            del stack[depth:]
+            if stack:
+                stack[-1].setdefault('topics', []).append(data)
+            stack.append(data)
+
+        return stack[0]
 
     def to_prettify_json(self):
         """
@@ -753,10 +846,11 @@ class TopicElement(WorkbookMixinElement):
         pnode = self._node.parentNode
         for i in range(2):
             pnode = pnode.parentNode
-        return TopicElement(pnode, self._owner_workbook)
+        return self._wrap(TopicElement, pnode)
 
 
 class ChildrenElement(WorkbookMixinElement):
+    __slots__ = ()
     TAG_NAME = const.TAG_CHILDREN
 
     def __init__(self, node=None, ownerWorkbook=None):
@@ -765,12 +859,13 @@ class ChildrenElement(WorkbookMixinElement):
     def getTopics(self, topics_type):
         topics = self.iterChildNodesByTagName(const.TAG_TOPICS)
         for i in topics:
-            t = TopicsElement(i, self.getOwnerWorkbook())
+            t = self._wrap(TopicsElement, i)
             if topics_type == t.getType():
                 return t
 
 
 class TopicsElement(WorkbookMixinElement):
+    __slots__ = ()
     TAG_NAME = const.TAG_TOPICS
 
     def __init__(self, node=None, ownerWorkbook=None):
@@ -785,9 +880,8 @@ class TopicsElement(WorkbookMixinElement):
         List all sub topics on the current topic
         """
         topics = []
-        ownerWorkbook = self.getOwnerWorkbook()
         for t in self.getChildNodesByTagName(const.TAG_TOPIC):
-            topics.append(TopicElement(t, ownerWorkbook))
+            topics.append(self._wrap(TopicElement, t))
 
         return topics
 
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    XmindCopilot.core.walker
+"""
+from collections import deque
+from collections.abc import Sequence
+from . import const
+
+
+class TopicPath(Sequence):
+    """ Topics from the start topic of a walk to a topic. Each path only links to the
+    path of its parent, so walking costs O(1) per topic no matter how deep the tree is.
+    The topics are collected on first access, and the path compares equal to the tuple.
+    """
+    __slots__ = ("topic", "parent", "_length", "_topics")
+
+    def __init__(self, topic, parent=None):
+        """
+        :param topic: last topic of the path
+        :param parent: `TopicPath` of the parent topic, None for the start topic
+        """
+        self.topic = topic
+        self.parent = parent
+        self._length = 1 if parent is None else parent._length + 1
+        self._topics = None
+
+    def toTuple(self):
+        if self._topics is None:
+            topics = []
+            node = self
+            # Reuse the nearest ancestor path already collected
+            while node is not None and node._topics is None:
+                topics.append(node.topic)
+                node = node.parent
+            topics.reverse()
+            self._topics = (node._topics if node is not None else ()) + tuple(topics)
+        return self._topics
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if index == -1:
+            return self.topic
+        return self.toTuple()[index]
+
+    def __iter__(self):
+        return iter(self.toTuple())
+
+    def __eq__(self, other):
+        if isinstance(other, TopicPath):
+            return self.toTuple() == other.toTuple()
+        if isinstance(other, tuple):
+            return self.toTuple() == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.toTuple())
+
+    def __repr__(self):
+        return "TopicPath(%r)" % (self.toTuple(),)
+
+
+class TopicWalker(object):
+    """ Iterate the topic tree with an explicit stack instead of recursion, so
+    deep outlines never hit the recursion limit.
+
+    Iteration yields ``(topic, depth, path)``, where depth of the start topic is 0
+    and path is a `TopicPath` of topics from the start topic to the yielded topic.
+
+    such as:
+        walker = topic.walk()
+        for t, depth, path in walker:
+            if t.getTitle() == "Draft":
+                walker.prune()  # skip sub topics of "Draft"
+    """
+    ORDERS = ("pre", "post", "bfs")
+
+    def __init__(self, topic, order="pre", max_depth=None, include_detached=False):
+        """
+        :param topic: start topic
+        :param order: "pre"(depth-first, parent first), "post"(depth-first, children first)
+                      or "bfs"(breadth-first)
+        :param max_depth: do not descend below this depth, None for unlimited
+        :param include_detached: also walk detached(floating) sub topics
+        """
+        if order not in self.ORDERS:
+            raise ValueError("Invalid walk order: %s" % order)
+        self._topic = topic
+        self._order = order
+        self._max_depth = max_depth
+        self._include_detached = include_detached
+        self._pruned = False
+
+    def __iter__(self):
+        if self._order == "pre":
+            return self._walk_pre()
+        elif self._order == "post":
+            return self._walk_post()
+        return self._walk_bfs()
+
+    def prune(self):
+        """
+        Skip sub topics of the topic yielded last. Only works in "pre" and "bfs" order,
+        sub topics have been visited already in "post" order.
+        """
+        self._pruned = True
+
+    def _expandable(self, depth):
+        return self._max_depth is None or depth < self._max_depth
+
+    def _getChildren(self, topic):
+        children = topic.getSubTopics(const.TOPIC_ATTACHED)
+        if self._include_detached:
+            children = children + topic.getSubTopics(const.TOPIC_DETACHED)
+        return children
+
+    def _walk_pre(self):
+        stack = [(self._topic, 0, TopicPath(self._topic))]
+        while stack:
+            topic, depth, path = stack.pop()
+            self._pruned = False
+            yield topic, depth, path
+            if self._pruned or not self._expandable(depth):
+                continue
+            for child in reversed(self._getChildren(topic)):
+                stack.append((child, depth + 1, TopicPath(child, path)))
+
+    def _walk_bfs(self):
+        queue = deque([(self._topic, 0, TopicPath(self._topic))])
+        while queue:
+            topic, depth, path = queue.popleft()
+            self._pruned = False
+            yield topic, depth, path
+            if self._pruned or not self._expandable(depth):
+                continue
+            for child in self._getChildren(topic):
+                queue.append((child, depth + 1, TopicPath(child, path)))
+
+    def _walk_post(self):
+        stack = [(self._topic, 0, TopicPath(self._topic), False)]
+        while stack:
+            topic, depth, path, expanded = stack.pop()
+            if expanded or not self._expandable(depth):
+                yield topic, depth, path
+                continue
+            stack.append((topic, depth, path, True))
+            for child in reversed(self._getChildren(topic)):
+                stack.append((child, depth + 1, TopicPath(child, path), False))
@@ -12,12 +12,15 @@ from .mixin import WorkbookMixinElement
 from .sheet import SheetElement
 from .topic import TopicElement
 from .relationship import RelationshipElement
+from .reference import ReferenceStore
+from . import lazy
 from .. import utils
 
 
 class WorkbookElement(WorkbookMixinElement):
     """`WorkbookElement` as the one and only root element of the document correspond XMind root topic.
     """
+    __slots__ = ()
     TAG_NAME = const.TAG_WORKBOOK
 
     def __init__(self, node=None, ownerWorkbook=None):
@@ -40,8 +43,7 @@ class WorkbookElement(WorkbookMixinElement):
 
     def getSheets(self):
         sheets = self.getChildNodesByTagName(const.TAG_SHEET)
-        owner_workbook = self.getOwnerWorkbook()
-        sheets = [SheetElement(sheet, owner_workbook) for sheet in sheets]
+        sheets = [self._wrap(SheetElement, sheet) for sheet in sheets]
 
         return sheets
 
@@ -64,6 +66,9 @@ class WorkbookElement(WorkbookMixinElement):
         else:
             self.insertBefore(sheet, sheets[index])
 
+        owner_workbook = self.getOwnerWorkbook()
+        if owner_workbook is not None:
+            owner_workbook.indexTopic(sheet.getImplementation())
         self.updateModifiedTime()
 
     def removeSheet(self, sheet):
@@ -73,6 +78,8 @@ class WorkbookElement(WorkbookMixinElement):
 
         if sheet.getParentNode() == self.getImplementation():
             self.removeChild(sheet)
+            self._invalidate(sheet.getImplementation())
+            self.getOwnerWorkbook().unindexTopic(sheet.getImplementation())
             self.updateModifiedTime()
 
     def moveSheet(self, original_index, target_index):
@@ -109,7 +116,7 @@ class WorkbookDocument(Document):
     """
 
     def __init__(self, node=None, path=None, stylesbook=None, commentsbook=None,
-                 manifestbook=None, reference_dir=None):
+                 manifestbook=None, reference_dir=None, read_only=False, references=None):
         """Construct new `WorkbookDocument` object
 
         :param node: pass DOM node object and parse as `WorkbookDocument` object.
@@ -117,13 +124,25 @@ class WorkbookDocument(Document):
         :param path: set workbook will to be placed.
         :param stylesbook: an instance which implements encapsulation of the XMind styles.xml.
         :param commentsbook: an instance which implements encapsulation of the XMind comments.xml.
+        :param reference_dir: DEPRECATED directory of extracted references, its files are
+                              added to `references` as changed references.
+        :param read_only: if True, wrapping existing nodes will not add id or rewrite timestamp.
+        :param references: `ReferenceStore` of the workbook. If not given, then serve
+                           references from the xmind file on path.
         """
         super(WorkbookDocument, self).__init__(node)
+        self._read_only = read_only
         self._path = path
         self.stylesbook = stylesbook
         self.commentsbook = commentsbook
         self.manifestbook = manifestbook
-        self.reference_dir = reference_dir
+        self.references = references or ReferenceStore(self.get_path())
+        if reference_dir:
+            self.references.addDirectory(reference_dir)
+        # DOM node -> wrapper(flyweight) cache, see `getWrapper`
+        self._wrapper_cache = {}
+        # topic id -> topic DOM node, built lazily by `getTopicById`
+        self._topic_index = None
         # Initialize WorkbookDocument to make sure that contains WorkbookElement as root.
         _workbook_element = self.getFirstChildNodeByTagName(const.TAG_WORKBOOK)
 
@@ -131,12 +150,117 @@ class WorkbookDocument(Document):
 
         if not _workbook_element:
             self.appendChild(self._workbook_element)
+        self.registerWrapper(self._workbook_element)
 
         self.setVersion(const.VERSION)
 
     def getWorkbookElement(self):
         return self._workbook_element
 
+    def output(self, output_stream):
+        # Sheets loaded lazily and never accessed are written as they are
+        if not lazy.writexml(self._node, output_stream):
+            super(WorkbookDocument, self).output(output_stream)
+
+    def getWrapper(self, cls, node, **kwargs):
+        """
+        Get the wrapper of passed DOM node. The same node always returns the same wrapper
+        instance, which avoids allocating new wrappers on every traversal.
+
+        :param cls: wrapper class, constructed by ``cls(node=node, **kwargs)`` on cache miss
+        :param node: DOM node to wrap
+        """
+        wrapper = self._wrapper_cache.get(node)
+        if wrapper is None or wrapper.__class__ is not cls:
+            wrapper = cls(node=node, **kwargs)
+            self._wrapper_cache[node] = wrapper
+        return wrapper
+
+    def registerWrapper(self, wrapper):
+        """Register wrapper so that its DOM node is always wrapped by it"""
+        self._wrapper_cache[wrapper.getImplementation()] = wrapper
+
+    def invalidateWrapper(self, node):
+        """Drop cached wrappers of passed DOM node and all of its descendants"""
+        cache = self._wrapper_cache
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            cache.pop(node, None)
+            stack.extend(node.childNodes)
+
+    def _iterTopicNodes(self, node):
+        """Iterate topic DOM nodes under passed node(included) without recursion"""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.nodeType == node.ELEMENT_NODE and node.tagName == const.TAG_TOPIC:
+                yield node
+            stack.extend(reversed(node.childNodes))
+
+    def _buildTopicIndex(self):
+        index = {}
+        for node in self._iterTopicNodes(self._node):
+            topic_id = node.getAttribute(const.ATTR_ID)
+            if topic_id:
+                index[topic_id] = node
+        self._topic_index = index
+
+    def indexTopic(self, node):
+        """
+        Add topics under passed DOM node(included) to the topic id index.
+        Do nothing if the index is not built yet or the node is not attached to this workbook.
+        """
+        if self._topic_index is None:
+            return
+        parent = node
+        while parent is not None and parent is not self._node:
+            parent = parent.parentNode
+        if parent is None:
+            return
+        for topic_node in self._iterTopicNodes(node):
+            topic_id = topic_node.getAttribute(const.ATTR_ID)
+            if topic_id:
+                self._topic_index[topic_id] = topic_node
+
+    def unindexTopic(self, node):
+        """Remove topics under passed DOM node(included) from the topic id index"""
+        if self._topic_index is None:
+            return
+        for topic_node in self._iterTopicNodes(node):
+            topic_id = topic_node.getAttribute(const.ATTR_ID)
+            if self._topic_index.get(topic_id) is topic_node:
+                del self._topic_index[topic_id]
+
+    def getTopicById(self, topic_id):
+        """
+        Get topic by its id in O(1). The id index is built in one pass on first call,
+        and kept up to date by `addSubTopic`, `removeTopic`, `moveTopic` and sheet operations.
+
+        :param topic_id: topic id
+        :return: a `TopicElement` instance or None if not found
+        """
+        if self._topic_index is None:
+            self._buildTopicIndex()
+        node = self._topic_index.get(topic_id)
+        if node is None:
+            return
+        if node.getAttribute(const.ATTR_ID) != topic_id:
+            # id changed behind the index
+            del self._topic_index[topic_id]
+            return
+        return self.getWrapper(TopicElement, node, ownerWorkbook=self)
+
+    def isReadOnly(self):
+        return self._read_only
+
+    def setReadOnly(self, read_only=True):
+        """
+        In read-only mode, wrapping existing topics/sheets/relationships has no side effects on the DOM.
+        New elements still get their id and timestamp.
+        """
+        self._read_only = read_only
+
     def createRelationship(self, topic1, topic2, title=None):
         """
         Create relationship with two topics(on the same sheet) and return a `RelationshipElement` instance
@@ -248,8 +372,8 @@ class WorkbookDocument(Document):
         return json.dumps(self.getData(), indent=4, separators=(',', ': '), ensure_ascii=False)
 
     def get_attachments_path(self):
-        """Get temp attachments path under reference directory"""
-        attach_path = os.path.join(self.reference_dir, "attachments")
+        """Get temp directory where added or changed attachments are written"""
+        attach_path = os.path.join(self.references.getOverlayDir(), "attachments")
         if not os.path.isdir(attach_path):
             os.makedirs(attach_path)
         return attach_path
\ No newline at end of file
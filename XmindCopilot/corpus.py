@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    XmindCopilot.corpus
+
+    Run a function over many xmind files in a process pool. Parsing is CPU-bound,
+    so processes(instead of threads) are used to scale with cores.
+
+    such as:
+        def count_topics(path):
+            return sum(1 for _ in XmindCopilot.iter_topics(path))
+
+        for result in XmindCopilot.map_corpus(paths, count_topics, workers=8):
+            if result.error:
+                print(result.path, "failed:", result.error)
+            else:
+                print(result.path, result.value)
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+CorpusResult = namedtuple("CorpusResult", [
+    "path",   # path as given
+    "value",  # return value of fn, None if failed
+    "error",  # exception raised by fn, None if succeeded
+])
+
+
+def map_corpus(paths, fn, workers=None, max_pending=None, initializer=None, initargs=()):
+    """
+    Call fn(path) for each path in worker processes, and yield `CorpusResult` in completion
+    order. Exception raised for a file is collected into its result instead of stopping the
+    others.
+
+    :param paths: iterable of file paths(or other picklable items fn takes)
+    :param fn: function(path) -> value. fn, its arguments and return value are pickled, so it
+               should be defined at module level(or a `functools.partial` of one).
+    :param workers: number of processes, None for the number of CPUs. 0 or 1 runs fn in the
+                    current process.
+    :param max_pending: max number of submitted files not done yet, which bounds memory on
+                        large corpora. Default is 4 times workers.
+    :param initializer: called with initargs once in each process before fn, such as to load
+                        what fn reuses across files
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for path in paths:
+            try:
+                yield CorpusResult(path, fn(path), None)
+            except Exception as e:
+                yield CorpusResult(path, None, e)
+        return
+
+    max_pending = max_pending or workers * 4
+    paths = iter(paths)
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        # future -> path
+        pending = {}
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < max_pending:
+                    try:
+                        path = next(paths)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[executor.submit(fn, path)] = path
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        yield CorpusResult(path, future.result(), None)
+                    else:
+                        yield CorpusResult(path, None, error)
+        finally:
+            # Consumer stopped early, do not run the rest
+            for future in pending:
+                future.cancel()
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import shutil
 from io import BytesIO
 from PIL import Image
 import numpy as np
@@ -9,13 +10,44 @@ matplotlib.use('Agg')
 import matplotlib.font_manager as mfm
 import matplotlib.pyplot as plt
 from matplotlib import mathtext
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import requests
 import tempfile
+from functools import partial
 from ..utils import generate_id
+from ..corpus import map_corpus
+from .render_cache import get_render_cache, set_render_cache
 
 
 TEMP_DIR = tempfile.gettempdir()
 
+
+def _temp_path(ext="png"):
+    return os.path.join(TEMP_DIR, generate_id() + "." + ext)
+
+
+def _copy_cached(cache, key, target=None, exts=("png",)):
+    """
+    Copy a cached file to target, or to a temporary file owned by the caller. Cached files may
+    be evicted by any later `RenderCache.add`, even from another process, so their paths are
+    never returned.
+
+    :return: path of the copy, None if not cached
+    """
+    cached = cache.get(key, exts)
+    if not cached:
+        return None
+    if target is None:
+        target = _temp_path(os.path.splitext(cached)[1][1:])
+    try:
+        shutil.copyfile(cached, target)
+    except FileNotFoundError:
+        # Evicted right after the lookup
+        return None
+    return target
+
+
 # DEPRECATED
 
 
@@ -44,6 +76,22 @@ def latex2img(text, size=32, color=(0.0, 0.0, 0.0), out=None, **kwds):
     family = kwds.get('family', None)
     weight = kwds.get('weight', 'normal')
 
+    cache = get_render_cache()
+    if cache is not None:
+        key = cache.key("latex2img", text, size, tuple(color), dpi, family, weight, matplotlib.__version__)
+        cached = cache.get(key)
+        try:
+            if cached:
+                if out is not None:
+                    shutil.copyfile(cached, out)
+                    return
+                im = Image.open(cached)
+                im.load()
+                return im
+        except FileNotFoundError:
+            # Evicted right after the lookup, render it again
+            pass
+
     bfo = BytesIO()  # file-like object
     prop = mfm.FontProperties(family=family, size=size, weight=weight)
     mathtext.math_to_image(text, bfo, prop=prop, dpi=dpi)
@@ -56,6 +104,10 @@ def latex2img(text, size=32, color=(0.0, 0.0, 0.0), out=None, **kwds):
 
     im = np.dstack((r, g, b, a)).astype(np.uint8)
     im = Image.fromarray(im)
+    if cache is not None:
+        temp_path = cache.getTempPath()
+        im.save(temp_path, format='png')
+        cache.add(key, temp_path, move=True)
 
     if out is None:
         return im
@@ -73,11 +125,20 @@ def latex2img_web(expression, output_file=None, padding=10, image_format='png',
     :param padding: Padding, integer, default is 10
     :param image_format: Image format, string, default is 'png'
     :param verbose: Whether to print verbose information, boolean, default is False
-    :return: File path of the generated image
+    :return: File path of the generated image. If output_file is None, it is a temporary file
+             owned by the caller.
     """
     # base_url = "https://tools.timodenk.com"
     base_url = "http://localhost:3000"
     expression = expression.replace("$", "")  # Remove dollar signs
+
+    cache = get_render_cache()
+    if cache is not None:
+        key = cache.key("latex2img_web", expression, padding, image_format, base_url)
+        cached = _copy_cached(cache, key, output_file, (image_format, 'svg', 'jpg'))
+        if cached:
+            return cached
+
     endpoint = f"/api/tex2img/{expression}"
     query_params = {'padding': padding, 'format': image_format}
 
@@ -94,10 +155,11 @@ def latex2img_web(expression, output_file=None, padding=10, image_format='png',
         else:
             file_extension = image_format
         if output_file is None:
-            print(TEMP_DIR)
-            output_file = os.path.join(TEMP_DIR, generate_id() + f".{file_extension}")
+            output_file = _temp_path(file_extension)
         with open(output_file, 'wb') as f:
             f.write(response.content)
+        if cache is not None:
+            cache.add(key, output_file, file_extension)
         vprint(f"Equation rendered and saved as {output_file}")
         return output_file
     elif response.status_code == 414:
@@ -108,8 +170,28 @@ def latex2img_web(expression, output_file=None, padding=10, image_format='png',
         vprint(f"An error occurred with status code: {response.status_code}")
 
 
+def _plt_cache_key(cache, formula, fontsize, dpi):
+    return cache.key("latex2img_plt", formula, fontsize, dpi, "cm", matplotlib.__version__)
+
+
 def latex2img_plt(formula, filename=None, fontsize=20, dpi=300):
+    """
+    Render LaTeX formula to png with matplotlib. Rendered images are cached, see
+    `XmindCopilot.fmt_cvt.render_cache`.
+
+    :param formula: formula NOT enclosed between dollar signs
+    :param filename: output png path. If None, the image is written to a temporary file owned
+                     by the caller.
+    :return: image path
+    """
     file_extension = "png"
+    cache = get_render_cache()
+    if cache is not None:
+        key = _plt_cache_key(cache, formula, fontsize, dpi)
+        cached = _copy_cached(cache, key, filename)
+        if cached:
+            return cached
+
     # 配置LaTeX渲染引擎
     plt.rcParams["mathtext.fontset"] = "cm"  # 使用Computer Modern字体
 
@@ -118,13 +200,94 @@ def latex2img_plt(formula, filename=None, fontsize=20, dpi=300):
     fig = plt.figure()
     fig.text(0, 0, f"${formula}$", fontsize=fontsize)
 
-    if filename is None:
-        filename = os.path.join(TEMP_DIR, generate_id() + f".{file_extension}")
+    output = filename or _temp_path(file_extension)
 
     # 保存为图片
-    plt.savefig(filename, dpi=dpi, bbox_inches='tight', pad_inches=0.02)
-    plt.close()
-    return filename
+    try:
+        plt.savefig(output, dpi=dpi, bbox_inches='tight', pad_inches=0.02)
+    finally:
+        plt.close()
+    if cache is not None:
+        cache.add(key, output, file_extension)
+    return output
+
+
+# ********** Batch rendering **********
+# Figure reused by the equations rendered in this process, see `_init_equation_worker`
+_equation_figure = None
+
+
+def _init_equation_worker(cache=None):
+    """
+    Warm up a worker of `render_equations`: load matplotlib fonts and create the figure that
+    every equation is drawn on, so each formula costs only its own layout and png encoding.
+
+    :param cache: `RenderCache` of the parent process
+    """
+    global _equation_figure
+    set_render_cache(cache)
+    plt.rcParams["mathtext.fontset"] = "cm"
+    # Not managed by pyplot, so it is never closed or switched by other code
+    _equation_figure = Figure()
+    FigureCanvasAgg(_equation_figure)
+
+
+def _render_equation(formula, fontsize=20, dpi=300):
+    """Render formula on the warm figure, same output as `latex2img_plt(formula)`"""
+    if _equation_figure is None:
+        _init_equation_worker(get_render_cache())
+    cache = get_render_cache()
+    if cache is not None:
+        key = _plt_cache_key(cache, formula, fontsize, dpi)
+        cached = _copy_cached(cache, key)
+        if cached:
+            return cached
+    output = _temp_path()
+    text = _equation_figure.text(0, 0, f"${formula}$", fontsize=fontsize)
+    try:
+        _equation_figure.savefig(output, dpi=dpi, bbox_inches='tight', pad_inches=0.02)
+    finally:
+        text.remove()
+    if cache is not None:
+        cache.add(key, output, "png")
+    return output
+
+
+def render_equations(formulas, workers=None, fontsize=20, dpi=300):
+    """
+    Render many formulas like `latex2img_plt`. Duplicates are rendered once, cached ones are
+    served without rendering, and the rest are rendered in a pool of worker processes which
+    keep matplotlib loaded between formulas.
+
+    :param formulas: formulas NOT enclosed between dollar signs
+    :param workers: number of processes, None for the number of CPUs. 0 or 1 renders in the
+                    current process.
+    :return: ({formula: image path}, {formula: exception}) of rendered and failed formulas. The
+             images are temporary files owned by the caller.
+    """
+    paths = {}
+    errors = {}
+    cache = get_render_cache()
+    pending = []
+    for formula in dict.fromkeys(formulas):
+        cached = _copy_cached(cache, _plt_cache_key(cache, formula, fontsize, dpi)) if cache is not None else None
+        if cached:
+            paths[formula] = cached
+        else:
+            pending.append(formula)
+    if not pending:
+        return paths, errors
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(pending))
+    render = partial(_render_equation, fontsize=fontsize, dpi=dpi)
+    for result in map_corpus(pending, render, workers, initializer=_init_equation_worker, initargs=(cache,)):
+        if result.error is None:
+            paths[result.path] = result.value
+        else:
+            errors[result.path] = result.error
+    return paths, errors
 
 
 if __name__ == "__main__":
@@ -1,4 +1,13 @@
+import os
 import re
+from collections import namedtuple
+from functools import partial
+
+from ..corpus import map_corpus
+from .latex_render import render_equations
+
+# Title which is a latex equation, see `TopicElement.convertTitle2Equation`
+_EQUATION_TITLE = re.compile(r'^[\s\n]{0,}\$.*?\$[\s\n]{0,}$', re.S)
 
 
 class MDSection(object):
@@ -77,41 +86,18 @@ class MDSection(object):
     def elementSplit(self, text):
         """
         Split the markdown text into elements and process textline indentation.
-        For example: code block, equation block, multilevel-list, table(not implemented), etc.
+        For example: code block, equation block, multilevel-list, table, etc.
+        Blocks are detected line by line, see `iter_md_blocks`. Horizontal rules are kept
+        as elements.
         """
-        code_match = re.findall(r"(\s{0,}```.*?```)", text, re.S)
-        latex_match = re.findall(r"(\s{0,}\$\$.*?\$\$)", text, re.S)
-        table_match = re.findall(r"(\s{0,}\|.*\|)", text, re.S)
-        lines = text.split('\n')
         outputList = []
-        while lines:
-            # Code block
-            if code_match and lines and lines[0] in code_match[0]:  
-                while lines and lines[0] in code_match[0]:
-                    lines.pop(0)
-                outputList.append(code_match.pop(0))
-            # Latex block
-            elif latex_match and lines and lines[0] in latex_match[0]:
-                while lines and lines[0] in latex_match[0]:
-                    lines.pop(0)
-                outputList.append(latex_match.pop(0))
-            # Table block
-            elif table_match and lines and lines[0] in table_match[0]:
-                while lines and lines[0] in table_match[0]:
-                    lines.pop(0)
-                outputList.append(table_match.pop(0))
-            elif lines:
-                if re.match(r'[\s\t]*$', lines[0]):  # Empty line
-                    lines.pop(0)
-                else:  # Indent handling
-                    line = lines.pop(0)
-                    level = self._getListLevel(line)
-                    if level is not None:  # Note: Including the case of level 0
-                        topictitle = "\t"*level + \
-                            re.match(self.listLineMatchStr, line).groups()[2]
-                    else:
-                        topictitle = line
-                    outputList.append(topictitle)
+        for block in iter_md_blocks(text.split('\n'), rules=True):
+            if block.kind == "list":
+                outputList.append("\t"*block.level + block.text)
+            elif block.kind == "heading":
+                outputList.append("#"*block.level + " " + block.text)
+            else:
+                outputList.append(block.text)
         return outputList
 
     def toXmind(self, parentTopic, cvtEquation=False, 
@@ -160,6 +146,144 @@ class MDSection(object):
             subSection.printSubSections(indent+4)
 
 
+# ********** Tokenizer **********
+MDBlock = namedtuple("MDBlock", [
+    "kind",   # "heading", "list", "text", "code", "math" or "table"
+    "level",  # level of heading(1~6) or list item(0 for top level), 0 for others
+    "text",   # title of the topic, lines joined by '\n' for code, math and table
+    "line",   # line number where the block starts
+])
+
+_HEADING_LINE = re.compile(MDSection.titleLineMatchStr)
+_LIST_LINE = re.compile(MDSection.listLineMatchStr)
+# Kind and end of blocks spanning lines, by their opening mark
+_FENCES = (("```", "code"), ("$$", "math"))
+
+
+def _is_table_line(stripped):
+    return len(stripped) > 1 and stripped[0] == "|" and stripped[-1] == "|"
+
+
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+
+def _iter_lines(chunks):
+    """Split chunks of one or more complete lines into lines without line breaks"""
+    for chunk in chunks:
+        if chunk.endswith("\n"):
+            chunk = chunk[:-2] if chunk.endswith("\r\n") else chunk[:-1]
+        elif chunk.endswith("\r"):
+            chunk = chunk[:-1]
+        if "\n" in chunk or "\r" in chunk:
+            yield from _LINE_BREAK.split(chunk)
+        else:
+            yield chunk
+
+
+def iter_md_blocks(lines, indent=2, tab_width=4, rules=False):
+    """
+    Tokenize markdown lines into `MDBlock` events, reading each line once.
+
+    Headings and horizontal rules("---") inside code or math blocks are taken as content.
+    Empty lines are skipped.
+
+    :param lines: iterable of lines(line breaks at the end are stripped), such as a file object.
+                  An item may also hold several complete lines.
+    :param indent: spaces per list level
+    :param tab_width: tabs are expanded to this width first
+    :param rules: yield horizontal rules as "rule" blocks instead of skipping them
+    """
+    # [kind, start line number, lines] of the open code, math or table block
+    block = None
+    for number, line in enumerate(_iter_lines(lines)):
+        if "\t" in line:
+            line = line.expandtabs(tab_width)
+        stripped = line.strip()
+
+        if block is not None:
+            kind = block[0]
+            if kind != "table":
+                block[2].append(line)
+                if (kind == "code" and stripped.startswith("```")) or (kind == "math" and "$$" in stripped):
+                    yield MDBlock(kind, 0, "\n".join(block[2]), block[1])
+                    block = None
+                continue
+            if _is_table_line(stripped):
+                block[2].append(line)
+                continue
+            yield MDBlock(kind, 0, "\n".join(block[2]), block[1])
+            block = None
+
+        if not stripped:
+            continue
+        first = stripped[0]
+        if first == "#":
+            match = _HEADING_LINE.match(line)
+            if match:
+                yield MDBlock("heading", len(match.group(1)), match.group(2), number)
+                continue
+        elif first in "`$":
+            for mark, kind in _FENCES:
+                if stripped.startswith(mark):
+                    if mark in stripped[len(mark):]:
+                        # Opened and closed in one line
+                        yield MDBlock(kind, 0, line, number)
+                    else:
+                        block = [kind, number, [line]]
+                    break
+            else:
+                yield MDBlock("text", 0, line, number)
+            continue
+        elif first == "|" and _is_table_line(stripped):
+            block = ["table", number, [line]]
+            continue
+        elif line.startswith("---"):
+            if rules:
+                yield MDBlock("rule", 0, line, number)
+            continue
+
+        if first in "-+*" or first.isdigit():
+            match = _LIST_LINE.match(line)
+            if match:
+                yield MDBlock("list", len(match.group(1)) // indent, match.group(3), number)
+                continue
+        yield MDBlock("text", 0, line, number)
+
+    if block is not None:
+        # Not closed until the end
+        yield MDBlock(block[0], 0, "\n".join(block[2]), block[1])
+
+
+def iter_md_items(blocks):
+    """
+    Convert `MDBlock` events to (parent, title) pairs of `TopicElement.addSubTopicTree`,
+    where parent is None for top level topic, or the position of the parent pair.
+
+    A heading is the parent of following blocks until the next heading of the same or
+    higher level. Blocks under a heading are nested by list level.
+    """
+    # (heading level, position) of open headings, from outermost to innermost
+    headings = []
+    # (list level, position) of items under the innermost heading
+    items = []
+    for position, block in enumerate(blocks):
+        if block.kind == "heading":
+            while headings and headings[-1][0] >= block.level:
+                headings.pop()
+            yield (headings[-1][1] if headings else None), block.text
+            headings.append((block.level, position))
+            items = []
+            continue
+        while items and items[-1][0] >= block.level:
+            items.pop()
+        if items:
+            parent = items[-1][1]
+        else:
+            parent = headings[-1][1] if headings else None
+        yield parent, block.text
+        items.append((block.level, position))
+
+
 class MarkDown2Xmind(object):
 
     _ws_only_line_re = re.compile(r"^[ \t]+$", re.M)
@@ -228,33 +352,182 @@ class MarkDown2Xmind(object):
         text = re.sub(r"[\n]+", "\n", text)
         return text
 
-    def convert2xmind(self, text, cvtEquation=False, cvtWebImage=False, cvtHyperLink=False, cvtTable=False, index=-1):
-        """Convert the given text."""
+    def iterBlocks(self, text):
+        """Tokenize the given text into `MDBlock` events"""
+        if not isinstance(text, str):
+            text = str(text, 'utf-8')
+        # Standardize line endings
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return iter_md_blocks(text.split("\n"), tab_width=self.tab_width)
+
+    def convert2xmind(self, text, cvtEquation=False, cvtWebImage=False, cvtHyperLink=False, cvtTable=False, index=-1,
+                      workers=None):
+        """
+        Convert the given text.
+
+        :param workers: number of processes to render equations with, None for the number of CPUs
+        :return: {formula: error} of equations failed to render
+        """
         if not self.topic:
             print("Please set the topic first")
             return
-        text = self.preProcess(text)
-        mdSection = MDSection("", text)
-        mdSection.toXmind(self.topic, cvtEquation,
-                          cvtWebImage, cvtHyperLink, cvtTable, index=index)
+        topics = self.topic.addSubTopicTree(list(iter_md_items(self.iterBlocks(text))), index)
+        return self._convertTitles(topics, cvtEquation, cvtWebImage, cvtHyperLink, cvtTable, workers)
+
+    def convert2xmind_stream(self, file_like, cvtEquation=False, cvtWebImage=False, cvtHyperLink=False,
+                             cvtTable=False, index=-1, workers=None):
+        """
+        Convert markdown read line by line from file_like, such as an opened file. The text is
+        never loaded as a whole, and each top level topic is attached once it is complete.
+
+        :param file_like: iterable of lines, str or utf-8 bytes. An item may also hold several
+                          complete lines, but a line should not be split across items.
+        :param workers: number of processes to render equations with, None for the number of CPUs
+        :return: {formula: error} of equations failed to render
+        """
+        if not self.topic:
+            print("Please set the topic first")
+            return
+        lines = (line.decode('utf-8') if isinstance(line, bytes) else line for line in file_like)
+        items = ((-1 if parent is None else parent, title)
+                 for parent, title in iter_md_items(iter_md_blocks(lines, tab_width=self.tab_width)))
+        topics = self.topic.addSubTopicStream(items, index)
+        return self._convertTitles(topics, cvtEquation, cvtWebImage, cvtHyperLink, cvtTable, workers)
+
+    def _convertTitles(self, topics, cvtEquation, cvtWebImage, cvtHyperLink, cvtTable, workers=None):
+        """Convert titles of topics and their sub topics, return {formula: error} of equations"""
+        # FIXME: Maybe it is a better choice to remove these functions from TopicElement
+        if cvtTable:
+            for topic in topics:
+                topic.convertTitle2Table(recursive=True)
+        errors = {}
+        if cvtEquation:
+            # All the equations are rendered in one batch
+            errors = convert_equation_titles(topics, height=50, workers=workers)
+        for topic in topics:
+            if cvtWebImage:
+                topic.convertTitle2WebImage(recursive=True)
+            if cvtHyperLink:
+                topic.convertTitleWithHyperlink(recursive=True)
+        return errors
 
     def convert2xmindtext(self, text):
         """Convert the given text."""
         buf = []
-        text = self.preProcess(text)
-        mdSection = MDSection("", text)
-        textList = mdSection.toXmindText()
-        for item in textList:
-            tablevel = len(re.match(r"([\t]{0,})", item).groups()[0])
-            buf.append(item.replace("\n", "\n"+"\t"*tablevel))
-            # buf.append(item.replace("\n", "\r"))
+        # Levels of open headings
+        headings = []
+        for block in self.iterBlocks(text):
+            if block.kind == "heading":
+                while headings and headings[-1] >= block.level:
+                    headings.pop()
+                headings.append(block.level)
+                tablevel = len(headings)
+                item = block.text
+            else:
+                tablevel = len(headings) + 1 + block.level
+                item = re.sub(r"\[(.*?)\]\(.*?\)", r"\1", block.text)
+            buf.append("\t"*tablevel + item.replace("\n", "\n"+"\t"*tablevel))
         return "\n".join(buf)
 
     def printSubSections(self, text):
         """Print the sub-sections of the given text."""
-        text = self.preProcess(text)
-        mdSection = MDSection("", text)
-        mdSection.printSubSections()
+        print(" "*4, "")
+        headings = []
+        for block in self.iterBlocks(text):
+            if block.kind == "heading":
+                while headings and headings[-1] >= block.level:
+                    headings.pop()
+                headings.append(block.level)
+                print(" "*(4+4*len(headings)), block.text)
+
+
+# ********** Batch import **********
+def parse_markdown_file(path, tab_width=4):
+    """
+    Parse markdown file to (parent, title) pairs of `TopicElement.addSubTopicTree`. The
+    result is picklable, so files can be parsed in worker processes.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return list(iter_md_items(iter_md_blocks(f, tab_width=tab_width)))
+
+
+def convert_equation_titles(topics, align=None, height=None, width=None, workers=None):
+    """
+    Convert titles of topics and their sub topics to latex equation images, like
+    `TopicElement.convertTitle2Equation`. Equations are collected in one walk, rendered by
+    `render_equations` in worker processes, then set as images of their topics. A topic whose
+    equation fails to render keeps its title.
+
+    :param topics: root topics to convert
+    :param workers: number of render processes, None for the number of CPUs
+    :return: {formula: error} of formulas failed to render
+    """
+    equations = []
+    for root in topics:
+        for topic, depth, path in root.walk():
+            title = topic.getTitle()
+            if title and _EQUATION_TITLE.match(title):
+                # Same as TopicElement.setLatexEquation
+                equations.append((topic, title.replace("\n", " ").replace("$$", "")))
+    if not equations:
+        return {}
+    paths, errors = render_equations((formula for _, formula in equations), workers)
+    try:
+        for topic, formula in equations:
+            path = paths.get(formula)
+            if path is None:
+                continue
+            try:
+                topic.setImage(path, align, height, width)
+            except Exception as e:
+                errors[formula] = e
+                continue
+            topic.setTitle("")
+    finally:
+        # Rendered images are copied into the workbook
+        for path in paths.values():
+            os.remove(path)
+    return errors
+
+
+def convert_markdown_files(workbook, paths, workers=None, root=None, cvtEquation=False, cvtWebImage=False,
+                           cvtHyperLink=False, cvtTable=False, equation_errors=None):
+    """
+    Import markdown files into workbook, one sheet per file. Files are parsed in parallel by
+    `XmindCopilot.map_corpus`, and sheets are added in the order of paths. Equations of all the
+    files are rendered in one batch after parsing.
+
+    :param paths: markdown file paths
+    :param workers: number of processes to parse files and render equations with, None for the
+                    number of CPUs
+    :param root: sheets and root topics are titled by paths relative to root, or by file names
+                 if root is None
+    :param equation_errors: dict to collect {formula: error} of equations failed to render
+    :return: {path: error} of files failed to import
+    """
+    paths = list(paths)
+    # Sheets are created in order, and filled as files are parsed
+    sheets = {}
+    for path in paths:
+        title = os.path.relpath(path, root) if root else os.path.basename(path)
+        sheet = workbook.createSheet()
+        sheet.setTitle(title)
+        sheet.getRootTopic().setTitle(title)
+        sheets[path] = sheet
+
+    errors = {}
+    topics = []
+    for result in map_corpus(paths, partial(parse_markdown_file, tab_width=MarkDown2Xmind.tab_width), workers):
+        sheet = sheets[result.path]
+        if result.error is not None:
+            errors[result.path] = result.error
+            workbook.removeSheet(sheet)
+            continue
+        topics.extend(sheet.getRootTopic().addSubTopicTree(result.value))
+    failed = MarkDown2Xmind()._convertTitles(topics, cvtEquation, cvtWebImage, cvtHyperLink, cvtTable, workers)
+    if equation_errors is not None:
+        equation_errors.update(failed)
+    return errors
 
 
 if __name__ == "__main__":
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""
+    XmindCopilot.fmt_cvt.render_cache
+
+    Content-addressed disk cache of rendered images(LaTeX equations, etc.). Files are
+    named by the hash of everything that affects the output(formula, font size, dpi,
+    renderer and its version), so identical formulas are rendered only once across
+    notes, processes and runs. The least recently used files are evicted when the
+    cache grows over its size limit.
+
+    such as:
+        set_render_cache(RenderCache("~/.cache/xmind_render", max_size=64 * 1024 * 1024))
+        latex2img_plt(r"\\frac{a}{b}")  # rendered
+        latex2img_plt(r"\\frac{a}{b}")  # served from the cache
+        set_render_cache(None)  # disable caching
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from ..utils import generate_id
+
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "XmindCopilot_render_cache")
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+# Files being written are named with this prefix, and skipped by lookups and eviction
+_TEMP_PREFIX = ".tmp-"
+
+
+class RenderCache(object):
+    """Directory of rendered files named by the hash of their render parameters"""
+
+    def __init__(self, directory=DEFAULT_DIR, max_size=DEFAULT_MAX_SIZE):
+        """
+        :param directory: cache directory, created on first write
+        :param max_size: max total size in bytes, None for unlimited
+        """
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_size = max_size
+        # Total size of cached files, counted on first write
+        self._size = None
+
+    @staticmethod
+    def key(*params):
+        """Hash render parameters into a cache key"""
+        return hashlib.sha256(repr(params).encode("utf-8")).hexdigest()
+
+    def _getPath(self, key, ext):
+        return os.path.join(self.directory, key + "." + ext)
+
+    def get(self, key, exts=("png",)):
+        """
+        Get path of the cached file and mark it as recently used.
+
+        :param exts: possible file extensions of the file
+        :return: file path, None if not cached
+        """
+        for ext in exts:
+            path = self._getPath(key, ext)
+            try:
+                # mtime is the last use time for eviction
+                os.utime(path)
+                return path
+            except OSError:
+                continue
+        return None
+
+    def getTempPath(self, ext="png"):
+        """Get a temporary path in the cache directory to render into, see `add`"""
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, _TEMP_PREFIX + generate_id() + "." + ext)
+
+    def add(self, key, path, ext="png", move=False):
+        """
+        Add a rendered file to the cache.
+
+        :param path: rendered file
+        :param move: move the file into the cache(it should be on the same file system, such as
+                     a path from `getTempPath`), otherwise copy it
+        :return: path of the cached file
+        """
+        target = self._getPath(key, ext)
+        if move:
+            os.replace(path, target)
+        else:
+            temp_path = self.getTempPath(ext)
+            shutil.copyfile(path, temp_path)
+            # Readers never see a partially written file
+            os.replace(temp_path, target)
+        if self._size is not None:
+            self._size += os.path.getsize(target)
+        self.evict()
+        return target
+
+    def addData(self, key, data, ext="png"):
+        """Add rendered file content to the cache, return path of the cached file"""
+        temp_path = self.getTempPath(ext)
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        return self.add(key, temp_path, ext, move=True)
+
+    def _listFiles(self):
+        """[(mtime, size, path), ...] of cached files"""
+        files = []
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return files
+        for entry in entries:
+            if entry.name.startswith(_TEMP_PREFIX) or not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def getSize(self):
+        """Total size of cached files in bytes"""
+        return sum(size for _, size, _ in self._listFiles())
+
+    def evict(self):
+        """Remove least recently used files until the cache fits in max_size"""
+        if self.max_size is None:
+            return
+        if self._size is not None and self._size <= self.max_size:
+            return
+        # Other processes may share the directory, count again before evicting
+        files = self._listFiles()
+        self._size = sum(size for _, size, _ in files)
+        files.sort()
+        for _, size, path in files:
+            if self._size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
+
+    def clear(self):
+        for _, _, path in self._listFiles():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._size = 0
+
+
+_render_cache = RenderCache(os.environ.get("XMINDCOPILOT_RENDER_CACHE", DEFAULT_DIR))
+
+
+def get_render_cache():
+    """Get the `RenderCache` shared by renderers, None if caching is disabled"""
+    return _render_cache
+
+
+def set_render_cache(cache):
+    """
+    Set the `RenderCache` shared by renderers.
+
+    :param cache: `RenderCache`, directory path of a `RenderCache`, or None to disable caching
+    """
+    global _render_cache
+    if isinstance(cache, str):
+        cache = RenderCache(cache)
+    _render_cache = cache
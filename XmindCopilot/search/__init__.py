@@ -10,10 +10,15 @@ Description: file content
 # -*- coding: utf-8 -*-
 
 from deprecated import deprecated
+from functools import partial
 import re
 import os
 import XmindCopilot
 from ..core import const
+from .engine import compile_pattern, SearchMatch, SearchResult, TopicSearchEngine
+from .index import SearchIndex
+from .prefilter import create_matcher, check_xmind, read_content
+from .query import TopicQuery, QuerySyntaxError, compile_query
 
 
 class Pointer(object):
@@ -77,81 +82,32 @@ class Pointer(object):
 def topic_search(topic, str, depth: int = -1, re_match=False):
     """
     Search for title containing str (return fisrt topic matched)
+
+    :param re_match: also match titles where str is found as a regular expression by
+                     re.search(not anchored at the start, as before)
     """
-    title = topic.getTitle()
-    # print(title,'\n')
-    if title and (re_match and re.search(str, title) or str in title):
-        return topic
-
-    subtopiclist = topic.getSubTopics()
-    if depth == -1 and subtopiclist:
-        for t in subtopiclist:
-            if topic_search(t, str):
-                return topic_search(t, str)
-    elif depth > 0 and subtopiclist:
-        for t in subtopiclist:
-            if topic_search(t, str, depth=depth-1):
-                return topic_search(t, str, depth=depth-1)
-
-    return None
+    patterns = [re.compile(str), str] if re_match else str
+    return TopicSearchEngine(patterns, depth=depth).first(topic).getFirst()
 
 def topic_search_by_title(topic, title, depth: int = -1):
-    # Search for title containing str(return fisrt topic matched)
-    title_ = topic.getTitle()
-    # print(title,'\n')
-    if title and (title == title_):
-        return topic
-
-    subtopiclist = topic.getSubTopics()
-    if depth == -1 and subtopiclist:
-        for t in subtopiclist:
-            if topic_search_by_title(t, title):
-                return topic_search_by_title(t, title)
-    elif depth > 0 and subtopiclist:
-        for t in subtopiclist:
-            if topic_search_by_title(t, title, depth=depth-1):
-                return topic_search_by_title(t, title, depth=depth-1)
-
-    return None
+    # Search for title equal to title(return fisrt topic matched)
+    if not title:
+        return None
+    return TopicSearchEngine(title, depth=depth, exact=True).first(topic).getFirst()
 
 def topic_search_by_hyperlink(topic, url, depth: int = -1):
-    # Search for title(return fisrt topic matched)
-    hyperlink = topic.getHyperlink()
-
-    if hyperlink and (url == hyperlink):
-        return topic
-
-    subtopiclist = topic.getSubTopics()
-    if depth == -1 and subtopiclist:
-        for t in subtopiclist:
-            if topic_search_by_hyperlink(t, url):
-                return topic_search_by_hyperlink(t, url)
-    elif depth > 0 and subtopiclist:
-        for t in subtopiclist:
-            if topic_search_by_hyperlink(t, url, depth=depth-1):
-                return topic_search_by_hyperlink(t, url, depth=depth-1)
-
-    return None
+    # Search for hyperlink(return fisrt topic matched)
+    if not url:
+        return None
+    return TopicSearchEngine(url, field="hyperlink", depth=depth, exact=True).first(topic).getFirst()
 
 def topic_search_snap(topic, ptr, str):
-    title = topic.getTitle()
-    if title:
-        ptr.path.append(title)
-        # 是否包含在标题中(正则表达式)
-        if re.search(str, title):
-            ptr.snap()
-            # ptr.treeprint()
-            # 并没有节省时间？
-            # ptr.path.pop()
-            # return
-    else:
-        ptr.path.append("[Title Empty]")
-
-    subtopiclist = topic.getSubTopics()
-    if subtopiclist:
-        for t in subtopiclist:
-            topic_search_snap(t, ptr, str)
-    ptr.path.pop()
+    # 是否包含在标题中(正则表达式)
+    base = ptr.path
+    for match in TopicSearchEngine(str, regex=True).all(topic):
+        ptr.path = base + match.getPathTitles()
+        ptr.snap()
+    ptr.path = base
     return
 
 
@@ -180,48 +136,100 @@ def getTopicAddress(topic):
 """ Xmind File Search """
 
 
-def workbooksearch(path, str):
-    workbook = XmindCopilot.load(path, get_refs=False)
+def _search_file(path, searchstr, matcher=None):
+    """
+    Search an xmind file for `BatchSearch`
+    :param matcher: `RawMatcher` of searchstr. If given, files whose raw content can not
+                    match are skipped without parsing.
+    :raise IOError: failed to open the file
+    """
+    check_xmind(path)
+    if matcher is not None:
+        content = read_content(path)
+        if content is not None and not matcher.search(content):
+            return []
+    workbook = XmindCopilot.load(path, get_refs=False, read_only=True)
     sheets = workbook.getSheets()
+    if not sheets[0].getTitle():
+        raise IOError("Failed to open:"+workbook.get_path())
     search_result = []
-    if sheets[0].getTitle():
-        for sheet in sheets:
-            root_topic = sheet.getRootTopic()
-            ptr = Pointer()
-            # FIXME: 目前此函数只能从roottopic开始
-            topic_search_snap(root_topic, ptr, str)
-            search_result += ptr.snapshot
-    else:
-        if os.path.isfile(path):
-            print("Failed to open:"+workbook.get_path())
-        else:
-            print("File doesn't exist:"+workbook.get_path())
+    for sheet in sheets:
+        root_topic = sheet.getRootTopic()
+        ptr = Pointer()
+        # FIXME: 目前此函数只能从roottopic开始
+        topic_search_snap(root_topic, ptr, searchstr)
+        search_result += ptr.snapshot
     return search_result
 
 
+def workbooksearch(path, str):
+    try:
+        return _search_file(path, str)
+    except IOError as e:
+        print(e)
+        return []
+
+
 """ Batch Search """
 
 
-def BatchSearch(searchstr, paths, verbose=True):
+def _print_search_result(path, search_result, searchstr):
+    print("\033[92m"+path+"\033[0m")
+    for r in search_result:
+        # r = r.replace("\n", " ")
+        r = r.replace(
+            searchstr, "\033[1;91m"+searchstr+"\033[1;0m")
+        r = r.replace("->", "\033[1;96m->\033[1;0m")
+        print(r)
+    print("\n")
+
+
+class BatchSearchResult(dict):
+    """{path: search result} of files with matches, and {path: error message} of files failed to open in errors"""
+
+    def __init__(self, results=(), errors=None):
+        super(BatchSearchResult, self).__init__(results)
+        self.errors = errors or {}
+
+
+def BatchSearch(searchstr, paths, verbose=True, index=None, workers=1, prefilter=True):
     """
     Batch Search for xmind files
     :param searchstr: search string
     :param paths: xmind file path list
     :param verbose: whether to print the search result
+    :param index: `SearchIndex` or its database path. If given, new or changed files are
+                  indexed first and the query is answered by the index instead of parsing
+                  every file.
+    :param workers: number of processes to parse files with, see `XmindCopilot.map_corpus`.
+                    Results are printed in completion order then.
+    :param prefilter: skip parsing files whose raw content can not match plain text searchstr,
+                      see `XmindCopilot.search.prefilter`
+    :return: `BatchSearchResult`, files not searched(not xmind archives, etc.) are in its errors
     """
-    tot_result = {}
-    for path in paths:
-        search_result = workbooksearch(path, searchstr)
-        if search_result:
-            tot_result[path] = search_result
+    paths = list(paths)
+    if index is not None:
+        if not isinstance(index, SearchIndex):
+            with SearchIndex(index) as index:
+                return BatchSearch(searchstr, paths, verbose, index, workers)
+        index.update(paths, workers=workers)
+        tot_result = BatchSearchResult(index.search(searchstr, paths), index.getErrors(paths))
+        if verbose:
+            for path, search_result in tot_result.items():
+                _print_search_result(path, search_result, searchstr)
+        return tot_result
+
+    matcher = create_matcher([searchstr]) if prefilter else None
+    results = {}
+    errors = {}
+    for result in XmindCopilot.map_corpus(paths, partial(_search_file, searchstr=searchstr, matcher=matcher),
+                                          workers):
+        if result.error is not None:
+            errors[result.path] = str(result.error)
+        elif result.value:
+            results[result.path] = result.value
             if verbose:
-                print("\033[92m"+path+"\033[0m")
-                for r in search_result:
-                    # r = r.replace("\n", " ")
-                    r = r.replace(
-                        searchstr, "\033[1;91m"+searchstr+"\033[1;0m")
-                    r = r.replace("->", "\033[1;96m->\033[1;0m")
-                    print(r)
-                print("\n")
-
-    return tot_result
+                _print_search_result(result.path, result.value, searchstr)
+    # Results come in completion order with workers, keep the order of paths
+    return BatchSearchResult(((path, results[path]) for path in paths if path in results),
+                             {path: errors[path] for path in paths if path in errors})
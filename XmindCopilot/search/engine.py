@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    XmindCopilot.search.engine
+
+    Single-pass topic search. Patterns are compiled once and every topic is
+    evaluated at most once per search.
+"""
+import heapq
+import re
+
+_META_CHARS = frozenset("\\.^$*+?{}[]|()")
+
+
+def compile_pattern(pattern, regex=False, exact=False, flags=0):
+    """
+    Compile search pattern
+
+    :param pattern: str or compiled pattern(returned as it is)
+    :param regex: treat str pattern as regular expression, otherwise as plain text
+    :param exact: the whole value should match the pattern
+    :param flags: re flags for str pattern
+    """
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    if not regex:
+        pattern = re.escape(pattern)
+    if exact:
+        # Patterns are matched by search(), anchor both ends
+        pattern = r"\A(?:%s)\Z" % pattern
+    return re.compile(pattern, flags)
+
+
+def is_literal(pattern, regex=False, flags=0):
+    """Whether str pattern only matches itself(case-sensitively), so it can be searched as plain text"""
+    if not isinstance(pattern, str) or flags:
+        return False
+    return not regex or not _META_CHARS.intersection(pattern)
+
+
+class SearchMatch(object):
+    """A matched topic with its position in the walk"""
+
+    def __init__(self, topic, depth, path, score):
+        self.topic = topic
+        self.depth = depth
+        self.path = path
+        self.score = score
+
+    def getPathTitles(self, empty_title="[Title Empty]"):
+        return [t.getTitle() or empty_title for t in self.path]
+
+
+class SearchResult(object):
+    """Matches of a search and the number of topics visited"""
+
+    def __init__(self, matches=None, visited=0):
+        self.matches = matches or []
+        self.visited = visited
+
+    def __iter__(self):
+        return iter(self.matches)
+
+    def __len__(self):
+        return len(self.matches)
+
+    def __bool__(self):
+        return bool(self.matches)
+
+    def getTopics(self):
+        return [m.topic for m in self.matches]
+
+    def getFirst(self):
+        return self.matches[0].topic if self.matches else None
+
+
+class TopicSearchEngine(object):
+    """
+    Search topics with precompiled patterns.
+
+    such as:
+        engine = TopicSearchEngine("Draft", depth=2)
+        topic = engine.first(root_topic).getFirst()
+        result = engine.all(root_topic)
+        print(len(result), result.visited)
+    """
+    FIELDS = {
+        "title": lambda topic: topic.getTitle(),
+        "hyperlink": lambda topic: topic.getHyperlink(),
+    }
+
+    def __init__(self, patterns, field="title", depth=-1, regex=False, exact=False,
+                 require_all=False, flags=0):
+        """
+        :param patterns: pattern or list of patterns(str or compiled)
+        :param field: "title", "hyperlink" or function(topic) returning the value to search
+        :param depth: max search depth, -1 for unlimited
+        :param regex: treat str patterns as regular expressions
+        :param exact: the whole value should match the pattern
+        :param require_all: topic matches only if all patterns match, otherwise any pattern
+        :param flags: re flags for str patterns
+        """
+        if isinstance(patterns, (str, re.Pattern)):
+            patterns = [patterns]
+        self.patterns = [compile_pattern(p, regex, exact, flags) for p in patterns]
+        self.getValue = self.FIELDS[field] if isinstance(field, str) else field
+        self.max_depth = None if depth == -1 else max(depth, 0)
+        self.require_all = require_all
+
+    def score(self, topic):
+        """Number of patterns matched by the topic, 0 if it does not match"""
+        value = self.getValue(topic)
+        if not value:
+            return 0
+        score = 0
+        for pattern in self.patterns:
+            if pattern.search(value):
+                score += 1
+            elif self.require_all:
+                return 0
+        return score
+
+    def _iterMatches(self, topic, result):
+        for t, depth, path in topic.walk(max_depth=self.max_depth):
+            result.visited += 1
+            score = self.score(t)
+            if score:
+                yield SearchMatch(t, depth, path, score)
+
+    def first(self, topic):
+        """Stop at the first match in pre-order"""
+        return self.search(topic, limit=1)
+
+    def all(self, topic):
+        return self.search(topic)
+
+    def search(self, topic, limit=None):
+        """
+        :param limit: stop after `limit` matches in pre-order, None for all matches
+        """
+        result = SearchResult()
+        for match in self._iterMatches(topic, result):
+            result.matches.append(match)
+            if limit is not None and len(result.matches) >= limit:
+                break
+        return result
+
+    def top(self, topic, k):
+        """
+        Best k matches: more patterns matched first, then shallower, then pre-order
+        """
+        result = SearchResult()
+        heap = []
+        for order, match in enumerate(self._iterMatches(topic, result)):
+            item = (match.score, -match.depth, -order, match)
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item[:3] > heap[0][:3]:
+                heapq.heapreplace(heap, item)
+        result.matches = [item[-1] for item in sorted(heap, key=lambda i: i[:3], reverse=True)]
+        return result
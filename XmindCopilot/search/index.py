@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    XmindCopilot.search.index
+
+    Persistent full-text index of an XMind corpus, stored in SQLite. Titles, notes,
+    labels and paths of topics are indexed per file, and a file is indexed again only
+    when its mtime or size changes. Plain text queries are answered by a FTS5 trigram
+    index(if SQLite supports it), others by scanning the indexed titles, so no xmind
+    file is parsed for a query.
+
+    such as:
+        index = SearchIndex("corpus.db")
+        index.update(paths)
+        for path, snaps in index.search("PID", paths).items():
+            print(path, snaps)
+"""
+import os
+import sqlite3
+
+import XmindCopilot
+from ..corpus import map_corpus
+from .engine import compile_pattern, is_literal
+
+SCHEMA_VERSION = "1"
+FIELDS = ("title", "notes", "labels", "topic_path")
+EMPTY_TITLE = "[Title Empty]"
+CONNECT_SYM = "->"
+
+
+def _has_trigram(conn):
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.trigram_test USING fts5(a, tokenize='trigram case_sensitive 1')")
+        conn.execute("DROP TABLE temp.trigram_test")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _fts_phrase(text):
+    return '"%s"' % text.replace('"', '""')
+
+
+def iter_topic_rows(path):
+    """
+    Iterate (title, notes, labels, topic path) of topics searched by `BatchSearch`(attached
+    topics from root topic of each sheet, in pre-order). Topic path is formatted as
+    `Pointer.snap` does, e.g. "Root->Topic->Sub Topic->".
+
+    :raise IOError: failed to open the xmind file
+    """
+    workbook = XmindCopilot.load(path, get_refs=False, read_only=True)
+    sheets = workbook.getSheets()
+    if not sheets[0].getTitle():
+        # The same check as `workbooksearch`
+        if os.path.isfile(path):
+            raise IOError("Failed to open:" + workbook.get_path())
+        raise IOError("File doesn't exist:" + workbook.get_path())
+    for sheet in sheets:
+        # Topic paths of ancestors of current topic, by depth
+        prefixes = []
+        for topic, depth, _ in sheet.getRootTopic().walk():
+            title = topic.getTitle()
+            del prefixes[depth:]
+            prefix = prefixes[-1] if prefixes else ""
+            prefixes.append(prefix + (title or EMPTY_TITLE).replace("\r\n", "") + CONNECT_SYM)
+            yield title, topic.getNotes(), topic.getLabels(), prefixes[-1]
+
+
+def _topic_rows(path):
+    return list(iter_topic_rows(path))
+
+
+class SearchIndex(object):
+    """
+    On-disk index of xmind files for `BatchSearch`, keyed by file path, mtime and size.
+    """
+
+    def __init__(self, db_path):
+        """
+        :param db_path: SQLite database file, created if not exists. ":memory:" for a
+                        temporary index.
+        """
+        self._conn = sqlite3.connect(db_path)
+        self._fts = False
+        self._initSchema()
+
+    def _initSchema(self):
+        conn = self._conn
+        conn.execute("CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value TEXT)")
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        fts = _has_trigram(conn)
+        if meta.get("version") == SCHEMA_VERSION and meta.get("fts") == str(int(fts)):
+            self._fts = fts
+            return
+
+        # Created by another version, or by SQLite with different FTS5 support
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS files")
+            conn.execute("DROP TABLE IF EXISTS topics")
+            # Topics of a file take rowid range [first_row, last_row] of topics table
+            conn.execute("CREATE TABLE files(id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime INTEGER, "
+                         "size INTEGER, first_row INTEGER, last_row INTEGER, error TEXT)")
+            if fts:
+                conn.execute("CREATE VIRTUAL TABLE topics USING fts5(file_id UNINDEXED, %s, "
+                             "tokenize='trigram case_sensitive 1')" % ", ".join(FIELDS))
+            else:
+                conn.execute("CREATE TABLE topics(rowid INTEGER PRIMARY KEY, file_id INTEGER, %s)" %
+                             ", ".join("%s TEXT" % f for f in FIELDS))
+            conn.executemany("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)",
+                             [("version", SCHEMA_VERSION), ("fts", str(int(fts)))])
+        self._fts = fts
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # ********** Update **********
+    def _getFile(self, path):
+        return self._conn.execute("SELECT id, mtime, size, first_row, last_row FROM files WHERE path = ?",
+                                  (path,)).fetchone()
+
+    def _removeFile(self, row):
+        file_id, _, _, first_row, last_row = row
+        if first_row is not None:
+            self._conn.execute("DELETE FROM topics WHERE rowid BETWEEN ? AND ?", (first_row, last_row))
+        self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _addFile(self, path, mtime, size, rows, error=None):
+        """
+        :param rows: (title, notes, labels, topic path) of topics, see `iter_topic_rows`
+        :param error: error message if failed to open the file
+        """
+        conn = self._conn
+        file_id = conn.execute("INSERT INTO files(path, mtime, size, error) VALUES (?, ?, ?, ?)",
+                               (path, mtime, size, error)).lastrowid
+        if not rows:
+            return
+        first_row = (conn.execute("SELECT max(rowid) FROM topics").fetchone()[0] or 0) + 1
+        conn.executemany("INSERT INTO topics(rowid, file_id, %s) VALUES (?, ?, %s)" %
+                         (", ".join(FIELDS), ", ".join("?" * len(FIELDS))),
+                         ((row_id, file_id) + tuple(row) for row_id, row in enumerate(rows, first_row)))
+        conn.execute("UPDATE files SET first_row = ?, last_row = ? WHERE id = ?",
+                     (first_row, first_row + len(rows) - 1, file_id))
+
+    def update(self, paths, prune=False, workers=1):
+        """
+        Index new or changed(by mtime and size) files. Missing files are recorded as errors.
+
+        :param paths: xmind file paths
+        :param prune: also drop indexed files not in paths
+        :param workers: number of processes to parse files with, see `XmindCopilot.map_corpus`
+        :return: number of files indexed
+        """
+        # path -> (mtime, size) of files to index
+        stale = {}
+        abs_paths = set()
+        with self._conn:
+            for path in paths:
+                path = os.path.abspath(path)
+                abs_paths.add(path)
+                row = self._getFile(path)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # Missing file is kept as an error without topics
+                    if row and row[1] is None:
+                        continue
+                    if row:
+                        self._removeFile(row)
+                    self._addFile(path, None, None, None, "File doesn't exist:" + path)
+                    continue
+                if row and row[1] == stat.st_mtime_ns and row[2] == stat.st_size:
+                    continue
+                if row:
+                    self._removeFile(row)
+                stale[path] = (stat.st_mtime_ns, stat.st_size)
+            if prune:
+                for row in self._conn.execute("SELECT path FROM files").fetchall():
+                    if row[0] not in abs_paths:
+                        self._removeFile(self._getFile(row[0]))
+
+        for result in map_corpus(list(stale), _topic_rows, workers):
+            error = None
+            if result.error is not None:
+                error = str(result.error) or result.error.__class__.__name__
+            with self._conn:
+                self._addFile(result.path, *stale[result.path], rows=result.value, error=error)
+        return len(stale)
+
+    # ********** Query **********
+    def getErrors(self, paths=None):
+        """Get {path: error message} of indexed files failed to open"""
+        errors = dict(self._conn.execute("SELECT path, error FROM files WHERE error IS NOT NULL"))
+        if paths is None:
+            return errors
+        return {path: errors[os.path.abspath(path)] for path in paths if os.path.abspath(path) in errors}
+
+    def _iterCandidates(self, pattern, field, regex, flags, compiled):
+        """Iterate (file_id, value, topic path) of topics that may match, in rowid order"""
+        if self._fts and is_literal(pattern, regex, flags) and len(pattern) >= 3:
+            # Trigram index finds topics containing the literal
+            return self._conn.execute(
+                "SELECT file_id, %s, topic_path FROM topics WHERE topics MATCH ? ORDER BY rowid" % field,
+                ("%s : %s" % (field, _fts_phrase(pattern)),))
+        self._conn.create_function("xmind_search", 1, lambda value: bool(value and compiled.search(value)))
+        return self._conn.execute(
+            "SELECT file_id, %s, topic_path FROM topics WHERE xmind_search(%s) ORDER BY rowid" % (field, field))
+
+    def search(self, pattern, paths=None, field="title", regex=True, flags=0):
+        """
+        Search indexed topics, the same as `BatchSearch` does without index.
+
+        :param pattern: str pattern
+        :param paths: only return results of these files(keys of result are paths as given),
+                      None for all indexed files
+        :param field: "title", "notes", "labels" or "topic_path"
+        :param regex: treat pattern as regular expression
+        :param flags: re flags
+        :return: {path: [topic path formatted as `Pointer.snap`, ...]}
+        """
+        if field not in FIELDS:
+            raise ValueError("Unknown field: %s" % field)
+        compiled = compile_pattern(pattern, regex, flags=flags)
+        matches = {}
+        for file_id, value, topic_path in self._iterCandidates(pattern, field, regex, flags, compiled):
+            if value and compiled.search(value):
+                matches.setdefault(file_id, []).append(topic_path)
+
+        file_paths = dict(self._conn.execute("SELECT path, id FROM files"))
+        if paths is None:
+            paths = sorted(file_paths, key=file_paths.get)
+        result = {}
+        for path in paths:
+            file_id = file_paths.get(os.path.abspath(path))
+            if file_id in matches:
+                result[path] = matches[file_id]
+        return result
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    XmindCopilot.search.prefilter
+
+    Raw byte pre-filter for batch search. Plain text needles are XML-escaped and
+    looked up in the raw content.xml bytes(titles, notes and everything else), so
+    that files which can not contain a match are skipped without parsing. A file
+    passing the filter may still have no match, it is searched as usual then.
+    Files with character references(such as "&#10;") are searched by a slower
+    pattern which also accepts each char of a needle as a reference.
+
+    such as:
+        matcher = create_matcher(["PID", "Kalman"])
+        if matcher is None or matcher.search(read_content(path)):
+            ...  # parse and search the file
+"""
+import os
+import re
+import zipfile
+
+from ..core import const
+from .. import utils
+from .engine import is_literal
+
+# Escaped forms of a char in XML text, writers differ in escaping quotes and '>'
+_XML_VARIANTS = {
+    "&": (b"&amp;",),
+    "<": (b"&lt;",),
+    ">": (b">", b"&gt;"),
+    '"': (b'"', b"&quot;"),
+    "'": (b"'", b"&apos;"),
+}
+# Text written with character references can not be matched by plain bytes
+_CHAR_REF = b"&#"
+
+
+def _char_ref_pattern(char):
+    """bytes regular expression of decimal and hex character references of char"""
+    hex_digits = b"".join(b"[%s%s]" % (d.encode(), d.upper().encode()) if d.isalpha() else d.encode()
+                          for d in "%x" % ord(char))
+    return b"&#0*%d;|&#[xX]0*%s;" % (ord(char), hex_digits)
+
+
+def _needle_pattern(needle, char_refs=False):
+    """
+    bytes regular expression matching needle in XML text in any escaped form
+
+    :param char_refs: also match chars written as character references
+    """
+    parts = []
+    for char in needle:
+        variants = [re.escape(v) for v in _XML_VARIANTS.get(char, (char.encode("utf-8"),))]
+        if char_refs:
+            variants.append(_char_ref_pattern(char))
+        if len(variants) == 1:
+            parts.append(variants[0])
+        else:
+            parts.append(b"(?:" + b"|".join(variants) + b")")
+    return b"".join(parts)
+
+
+class RawMatcher(object):
+    """Find whether any of the needles may occur in raw XML bytes"""
+
+    def __init__(self, needles):
+        """
+        :param needles: plain text to find, see `create_matcher`
+        """
+        self._needles = list(needles)
+        # Needles without special chars are found by bytes.find, others by one regex
+        self._literals = []
+        escaped = []
+        for needle in self._needles:
+            if _XML_VARIANTS.keys() & set(needle):
+                escaped.append(_needle_pattern(needle))
+            else:
+                self._literals.append(needle.encode("utf-8"))
+        self._regex = re.compile(b"|".join(escaped)) if escaped else None
+        # Compiled on the first file with character references
+        self._char_ref_regex = None
+
+    def search(self, data):
+        """
+        :param data: content.xml bytes
+        :return: False if none of the needles can occur in the text of data
+        """
+        if data.find(_CHAR_REF) != -1:
+            if self._char_ref_regex is None:
+                self._char_ref_regex = re.compile(b"|".join(_needle_pattern(n, True) for n in self._needles))
+            return self._char_ref_regex.search(data) is not None
+        for literal in self._literals:
+            if data.find(literal) != -1:
+                return True
+        return self._regex is not None and self._regex.search(data) is not None
+
+
+def create_matcher(patterns, regex=True, flags=0):
+    """
+    Create `RawMatcher` of search patterns.
+
+    :param patterns: str patterns, a topic matches if it matches any of them
+    :param regex: patterns are regular expressions
+    :param flags: re flags
+    :return: None if any pattern can not be pre-filtered(regular expression, case-insensitive,
+             line breaks which XML parsers normalize, etc.)
+    """
+    patterns = list(patterns)
+    for pattern in patterns:
+        if not pattern or not is_literal(pattern, regex, flags) or "\r" in pattern or "\n" in pattern:
+            return None
+    return RawMatcher(patterns)
+
+
+def check_xmind(path):
+    """
+    Check that path is an existing xmind archive.
+
+    :raise IOError: with message of the reason
+    """
+    path = utils.get_abs_path(path)
+    if utils.split_ext(path)[1] not in (const.XMIND_EXT, const.XMIND8_EXT):
+        raise IOError("Not an xmind file:" + path)
+    if not os.path.isfile(path):
+        raise IOError("File doesn't exist:" + path)
+    if not zipfile.is_zipfile(path):
+        raise IOError("Not an xmind archive:" + path)
+
+
+def read_content(path):
+    """Read raw content.xml bytes of xmind file, None if there is no content.xml"""
+    with utils.extract(path) as archive:
+        try:
+            return archive.read(const.CONTENT_XML)
+        except KeyError:
+            return None
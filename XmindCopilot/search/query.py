@@ -0,0 +1,423 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    XmindCopilot.search.query
+
+    A small query language over topic fields. A query is compiled once into a
+    predicate tree and evaluated in a single walk over the topics. Queries on
+    topic ids or comments are answered from the id index and the comment index
+    of the workbook instead, without walking.
+
+    Terms:
+        title:foo           title contains "foo"(bare words and "quoted text" search titles too)
+        title="Foo"         title is exactly "Foo"
+        title~/^fo+/i       title matches regular expression(flags: i, m, s)
+        note:foo            notes contains "foo", also note= and note~
+        label:"to do"       label is "to do", also label~
+        marker:priority-1   has marker "priority-1", marker:priority for any of the family
+        hyperlink:github    hyperlink contains "github", also hyperlink= and hyperlink~
+        comment:foo         comments contain "foo", also comment= and comment~
+        id:0a1b2c           topic id is "0a1b2c"
+        depth<4             depth of topic(the root topic of a sheet is 0), also <=, >, >=, =
+
+    Terms are combined with AND(or just spaces), OR and NOT, grouped by parentheses.
+
+    such as:
+        query = compile_query('title~/PID/ AND marker:priority-1 AND label:"todo" AND depth<4')
+        for match in query.search(workbook):
+            print(match.getPathTitles())
+"""
+import re
+
+from ..core import const
+from ..core.sheet import SheetElement
+from ..core.topic import TopicElement
+from ..core.workbook import WorkbookDocument
+from .engine import SearchMatch, SearchResult
+
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<paren>[()])
+    |(?P<op><=|>=|[:~=<>])
+    |(?P<regex>/(?:[^/\\]|\\.)*/[ims]*)
+    |(?P<string>"(?:[^"\\]|\\.)*")
+    |(?P<word>[^\s()"/:~=<>]+)
+    )""", re.X)
+_REGEX_FLAGS = {"i": re.I, "m": re.M, "s": re.S}
+_KEYWORDS = ("AND", "OR", "NOT")
+
+
+class QuerySyntaxError(ValueError):
+    def __init__(self, message, query, position):
+        super(QuerySyntaxError, self).__init__("%s at position %d: %s" % (message, position, query))
+        self.query = query
+        self.position = position
+
+
+# ********** Predicates **********
+class _Predicate(object):
+    def match(self, topic, depth):
+        raise NotImplementedError
+
+    def candidates(self, workbook):
+        """Ids of topics which may match found by workbook indexes, None if not indexed"""
+        return None
+
+    def maxDepth(self):
+        """Max depth of matched topics, None for unlimited"""
+        return None
+
+
+class _And(_Predicate):
+    def __init__(self, children):
+        self.children = children
+
+    def match(self, topic, depth):
+        return all(child.match(topic, depth) for child in self.children)
+
+    def candidates(self, workbook):
+        result = None
+        for child in self.children:
+            ids = child.candidates(workbook)
+            if ids is not None:
+                result = ids if result is None else result & ids
+        return result
+
+    def maxDepth(self):
+        depths = [d for d in (child.maxDepth() for child in self.children) if d is not None]
+        return min(depths) if depths else None
+
+
+class _Or(_And):
+    def match(self, topic, depth):
+        return any(child.match(topic, depth) for child in self.children)
+
+    def candidates(self, workbook):
+        result = set()
+        for child in self.children:
+            ids = child.candidates(workbook)
+            if ids is None:
+                return None
+            result |= ids
+        return result
+
+    def maxDepth(self):
+        depths = [child.maxDepth() for child in self.children]
+        return None if None in depths else max(depths)
+
+
+class _Not(_Predicate):
+    def __init__(self, child):
+        self.child = child
+
+    def match(self, topic, depth):
+        return not self.child.match(topic, depth)
+
+
+class _Depth(_Predicate):
+    COMPARE = {
+        "<": lambda a, b: a < b,
+        "<=": lambda a, b: a <= b,
+        ">": lambda a, b: a > b,
+        ">=": lambda a, b: a >= b,
+        "=": lambda a, b: a == b,
+        ":": lambda a, b: a == b,
+    }
+
+    def __init__(self, op, depth):
+        self.op = op
+        self.depth = depth
+        self._compare = self.COMPARE[op]
+
+    def match(self, topic, depth):
+        return self._compare(depth, self.depth)
+
+    def maxDepth(self):
+        if self.op == "<":
+            return self.depth - 1
+        if self.op in ("<=", "=", ":"):
+            return self.depth
+
+
+def _markers(topic):
+    return [marker.getMarkerId().name for marker in topic.getMarkers()]
+
+
+def _comments(topic):
+    # A workbook created in memory may have no comments
+    workbook = topic.getOwnerWorkbook()
+    if workbook is None or workbook.commentsbook is None:
+        return ()
+    return (topic.getComments(),)
+
+
+class _Field(_Predicate):
+    # field -> function(topic) returning values of the field
+    FIELDS = {
+        "title": lambda topic: (topic.getTitle(),),
+        "note": lambda topic: (topic.getNotes(),),
+        "label": lambda topic: (topic.getLabels(),),
+        "marker": _markers,
+        "hyperlink": lambda topic: (topic.getHyperlink(),),
+        "comment": _comments,
+        "id": lambda topic: (topic.getAttribute(const.ATTR_ID),),
+    }
+    ALIASES = {"notes": "note", "labels": "label", "markers": "marker", "link": "hyperlink",
+               "comments": "comment"}
+    # Fields compared as a whole by ':'
+    KEYWORD_FIELDS = ("label", "marker", "id")
+
+    def __init__(self, field, op, value):
+        """
+        :param op: ':' contains(equals for keyword fields), '=' equals, '~' regular expression
+        :param value: str, or compiled regular expression
+        """
+        self.field = field
+        self.op = op
+        self.value = value
+        self._getValues = self.FIELDS[field]
+        if isinstance(value, re.Pattern):
+            self._test = lambda v: value.search(v) is not None
+        elif op == "~":
+            value = self.value = re.compile(value)
+            self._test = lambda v: value.search(v) is not None
+        elif op == "=" or (field != "marker" and field in self.KEYWORD_FIELDS):
+            self._test = lambda v: v == value
+        elif field == "marker":
+            # A marker family(e.g. "priority") matches any marker of the family
+            self._test = lambda v: v == value or v.split("-")[0] == value
+        else:
+            self._test = lambda v: value in v
+
+    def match(self, topic, depth):
+        test = self._test
+        for value in self._getValues(topic):
+            if value and test(value):
+                return True
+        return False
+
+    def candidates(self, workbook):
+        if self.field == "id" and isinstance(self.value, str):
+            return {self.value}
+        if self.field == "comment" and workbook.commentsbook is not None:
+            test = self._test
+            return {topic_id for topic_id, content in workbook.commentsbook.getData().items()
+                    if content and test(content)}
+        return None
+
+
+# ********** Parser **********
+class _Parser(object):
+    def __init__(self, query):
+        self.query = query
+        self.tokens = self._tokenize(query)
+        self.position = 0
+
+    def _tokenize(self, query):
+        """[(kind, text, position), ...]"""
+        tokens = []
+        position = 0
+        end = len(query.rstrip())
+        while position < end:
+            match = _TOKEN.match(query, position)
+            if not match or not match.lastgroup:
+                raise QuerySyntaxError("Unexpected character", query, position)
+            tokens.append((match.lastgroup, match.group(match.lastgroup), match.start(match.lastgroup)))
+            position = match.end()
+        return tokens
+
+    def _peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None, len(self.query))
+
+    def _next(self):
+        token = self._peek()
+        self.position += 1
+        return token
+
+    def _isKeyword(self, token, keyword):
+        return token[0] == "word" and token[1] == keyword
+
+    def parse(self):
+        if not self.tokens:
+            raise QuerySyntaxError("Empty query", self.query, 0)
+        predicate = self._parseOr()
+        kind, text, position = self._peek()
+        if kind is not None:
+            raise QuerySyntaxError("Unexpected '%s'" % text, self.query, position)
+        return predicate
+
+    def _parseOr(self):
+        children = [self._parseAnd()]
+        while self._isKeyword(self._peek(), "OR"):
+            self._next()
+            children.append(self._parseAnd())
+        return children[0] if len(children) == 1 else _Or(children)
+
+    def _parseAnd(self):
+        children = [self._parseUnary()]
+        while True:
+            token = self._peek()
+            if self._isKeyword(token, "AND"):
+                self._next()
+            elif token[0] is None or token[1] == ")" or self._isKeyword(token, "OR"):
+                break
+            # Terms next to each other are joined by AND
+            children.append(self._parseUnary())
+        return children[0] if len(children) == 1 else _And(children)
+
+    def _parseUnary(self):
+        kind, text, position = self._next()
+        if kind == "word" and text == "NOT":
+            return _Not(self._parseUnary())
+        if kind == "paren" and text == "(":
+            predicate = self._parseOr()
+            kind, text, position = self._next()
+            if text != ")":
+                raise QuerySyntaxError("Missing ')'", self.query, position)
+            return predicate
+        if kind == "word" and self._peek()[0] == "op":
+            return self._parseTerm(text, position)
+        if kind in ("word", "string", "regex") and text not in _KEYWORDS:
+            # Bare value searches titles
+            return _Field("title", ":", self._value(kind, text))
+        if kind is None:
+            raise QuerySyntaxError("Unexpected end of query", self.query, position)
+        raise QuerySyntaxError("Unexpected '%s'" % text, self.query, position)
+
+    def _parseTerm(self, field, field_position):
+        _, op, op_position = self._next()
+        kind, text, position = self._next()
+        if kind not in ("word", "string", "regex"):
+            raise QuerySyntaxError("Missing value of '%s'" % field, self.query, position)
+        if field == "depth":
+            if op == "~" or kind != "word" or not text.isdigit():
+                raise QuerySyntaxError("Invalid depth condition", self.query, op_position)
+            return _Depth(op, int(text))
+        field = _Field.ALIASES.get(field, field)
+        if field not in _Field.FIELDS:
+            raise QuerySyntaxError("Unknown field '%s'" % field, self.query, field_position)
+        if op not in (":", "=", "~"):
+            raise QuerySyntaxError("Invalid operator '%s' of '%s'" % (op, field), self.query, op_position)
+        try:
+            return _Field(field, op, self._value(kind, text))
+        except re.error as e:
+            raise QuerySyntaxError("Invalid regular expression(%s)" % e, self.query, position)
+
+    def _value(self, kind, text):
+        if kind == "string":
+            return re.sub(r"\\(.)", r"\1", text[1:-1])
+        if kind == "regex":
+            end = text.rindex("/")
+            flags = 0
+            for flag in text[end + 1:]:
+                flags |= _REGEX_FLAGS[flag]
+            return re.compile(text[1:end].replace("\\/", "/"), flags)
+        return text
+
+
+# ********** Query **********
+class TopicQuery(object):
+    """
+    Compiled query, see `XmindCopilot.search.query` for the syntax.
+
+    such as:
+        query = TopicQuery("marker:task-done AND NOT label:archived")
+        result = query.search(workbook)
+        print(len(result), result.visited)
+    """
+
+    def __init__(self, query):
+        """
+        :raise QuerySyntaxError: invalid query
+        """
+        self.query = query
+        self.predicate = _Parser(query).parse()
+        self.max_depth = self.predicate.maxDepth()
+
+    def __repr__(self):
+        return "<TopicQuery: %s>" % self.query
+
+    def match(self, topic, depth=0):
+        """Whether the topic at passed depth matches the query"""
+        return self.predicate.match(topic, depth)
+
+    def _getRoots(self, target):
+        if isinstance(target, WorkbookDocument):
+            return [sheet.getRootTopic() for sheet in target.getSheets()]
+        if isinstance(target, SheetElement):
+            return [target.getRootTopic()]
+        return [target]
+
+    def search(self, target, limit=None):
+        """
+        Search attached topics in pre-order.
+
+        :param target: `WorkbookDocument`(all sheets), `SheetElement` or `TopicElement`. Depth
+                       is counted from the root topic of each sheet, or from the passed topic.
+        :param limit: stop after `limit` matches, None for all matches
+        :return: `SearchResult`
+        """
+        roots = [root for root in self._getRoots(target) if root is not None]
+        workbook = roots[0].getOwnerWorkbook() if roots else None
+        candidates = self.predicate.candidates(workbook) if workbook is not None else None
+        if candidates is not None:
+            return self._searchCandidates(roots, workbook, candidates, limit)
+
+        result = SearchResult()
+        for root in roots:
+            for topic, depth, path in root.walk(max_depth=self.max_depth):
+                result.visited += 1
+                if self.predicate.match(topic, depth):
+                    result.matches.append(SearchMatch(topic, depth, path, 1))
+                    if limit is not None and len(result.matches) >= limit:
+                        return result
+        return result
+
+    def _locate(self, node, root_nodes, workbook):
+        """
+        Get (walk order key, path from its root) of topic node, None if it is not reached by
+        walking the roots.
+        """
+        key = []
+        path = []
+        while True:
+            path.append(workbook.getWrapper(TopicElement, node, ownerWorkbook=workbook))
+            root = root_nodes.get(node)
+            if root is not None:
+                key.append(root)
+                key.reverse()
+                path.reverse()
+                return key, path
+            topics = node.parentNode
+            if (topics is None or topics.nodeType != topics.ELEMENT_NODE or topics.tagName != const.TAG_TOPICS
+                    or topics.getAttribute(const.ATTR_TYPE) != const.TOPIC_ATTACHED):
+                return None
+            key.append(topics.childNodes.index(node))
+            node = topics.parentNode.parentNode
+
+    def _searchCandidates(self, roots, workbook, candidates, limit):
+        """Search topics of passed ids only, in the same order as walking"""
+        # root node -> position(+1 so that it is true)
+        root_nodes = {root.getImplementation(): i + 1 for i, root in enumerate(roots)}
+        found = []
+        for topic_id in candidates:
+            topic = workbook.getTopicById(topic_id)
+            if topic is None:
+                continue
+            located = self._locate(topic.getImplementation(), root_nodes, workbook)
+            if located is None:
+                continue
+            key, path = located
+            depth = len(path) - 1
+            if (self.max_depth is None or depth <= self.max_depth) and self.predicate.match(topic, depth):
+                found.append((key, SearchMatch(topic, depth, tuple(path), 1)))
+        found.sort(key=lambda item: item[0])
+        matches = [match for _, match in found]
+        return SearchResult(matches[:limit] if limit is not None else matches, len(candidates))
+
+
+def compile_query(query):
+    """Compile query text to `TopicQuery`"""
+    return TopicQuery(query)
@@ -8,10 +8,9 @@
 """
 import os
 import time
-import random
+import struct
 import tempfile
 import zipfile
-from hashlib import md5
 from functools import wraps
 from xml.dom.minidom import parse, parseString
 
@@ -20,16 +19,39 @@ from xml.dom.minidom import parse, parseString
 temp_dir = tempfile.mkdtemp
 
 
+# Random bytes per id, 26 hex chars(104 bits)
+_ID_BYTES = 13
+_ID_BATCH = 4096
+_ids = iter(())
+
+
+def _generate_ids():
+    encoded = os.urandom(_ID_BYTES * _ID_BATCH).hex()
+    return iter([encoded[i:i + 2 * _ID_BYTES] for i in range(0, len(encoded), 2 * _ID_BYTES)])
+
+
+def _reset_ids():
+    # Child process must not hand out the ids buffered by its parent
+    global _ids
+    _ids = iter(())
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_ids)
+
+
 def generate_id():
     """
-    Generate unique 26-digit random string
+    Generate unique 26-digit random string, with 104 random bits from `os.urandom`.
+    Random bytes are read and encoded in batches, which makes bulk creation of topics cheap.
     """
-    # FIXME: Why not use something like the builtin uuid.uuid1() method?
-    # md5 current time get 32-digit random string
-    timestamp = md5(str(get_current_time()).encode('utf-8')).hexdigest()
-    lotter = md5(str(random.random()).encode('utf-8')).hexdigest()
-    _id = timestamp[19:] + lotter[:13]
-    return _id
+    global _ids
+    try:
+        return next(_ids)
+    except StopIteration:
+        # Iterator may be replaced by another thread meanwhile, both are random anyway
+        _ids = _generate_ids()
+        return next(_ids)
 
 
 # ********** Zip **********
@@ -37,8 +59,70 @@ def extract(path):
     return zipfile.ZipFile(path, "r")
 
 
-def compress(path):
-    return zipfile.ZipFile(path, "w")
+def compress(path, compression=zipfile.ZIP_STORED, compresslevel=None):
+    """
+    :param compression: zipfile.ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2 or ZIP_LZMA
+    :param compresslevel: compression level, None for default of the method
+    """
+    return zipfile.ZipFile(path, "w", compression, compresslevel=compresslevel)
+
+
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+
+
+# Private ZipFile attributes used to write a member raw, see `copy_zip_member`
+_ZIPFILE_INTERNALS = ("_lock", "_writing", "fp", "start_dir", "filelist", "NameToInfo", "_didModify")
+
+
+def copy_zip_member(src_fp, info, dst):
+    """
+    Copy member of a zip file into another zip file without decompressing and
+    recompressing it. If the ZipFile internals this relies on are missing, or dst
+    already has a member of the same name, the member is written by `ZipFile.writestr`.
+
+    :param src_fp: source zip file opened in binary mode
+    :param info: `ZipInfo` of the member in source zip file
+    :param dst: `ZipFile` opened for writing
+    :return: False if the member can not be copied(encrypted or zip64),
+             it should be written in the normal way then.
+    """
+    if info.flag_bits & 0x1 or info.file_size >= zipfile.ZIP64_LIMIT \
+            or info.compress_size >= zipfile.ZIP64_LIMIT:
+        return False
+
+    new_info = zipfile.ZipInfo(info.filename, info.date_time)
+    new_info.compress_type = info.compress_type
+    new_info.external_attr = info.external_attr
+    new_info.create_system = info.create_system
+    if not all(hasattr(dst, name) for name in _ZIPFILE_INTERNALS) or not hasattr(new_info, "FileHeader") \
+            or info.filename in dst.NameToInfo:
+        with zipfile.ZipFile(src_fp) as src:
+            data = src.read(info)
+        dst.writestr(new_info, data)
+        return True
+
+    src_fp.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(src_fp.read(_LOCAL_HEADER.size))
+    src_fp.seek(header[10] + header[11], os.SEEK_CUR)
+    data = src_fp.read(info.compress_size)
+    # Sizes are known, so no data descriptor is needed after the data
+    new_info.flag_bits = info.flag_bits & ~0x08
+    new_info.CRC = info.CRC
+    new_info.file_size = info.file_size
+    new_info.compress_size = info.compress_size
+    # ZipFile has no public API to add compressed data, write it like ZipFile.writestr does
+    with dst._lock:
+        if dst._writing:
+            raise ValueError("Can't copy member while there is an open writing handle")
+        dst.fp.seek(dst.start_dir)
+        new_info.header_offset = dst.fp.tell()
+        dst.fp.write(new_info.FileHeader(False))
+        dst.fp.write(data)
+        dst.start_dir = dst.fp.tell()
+        dst.filelist.append(new_info)
+        dst.NameToInfo[new_info.filename] = new_info
+        dst._didModify = True
+    return True
 
 
 # ********** Path **********
@@ -113,7 +113,7 @@ class RepoManager(object):
         self.load_xmind(xmind_dir)
         
     def load_xmind(self, xmind_dir):
-        self.workbook = XmindCopilot.load(xmind_dir)
+        self.workbook = XmindCopilot.load(xmind_dir, lazy_sheets=True)
         self.repo_node = topic_search_by_title(self.workbook.getSheets()[2].getRootTopic(), "Repos", 1)
         self.star_node = topic_search_by_title(self.workbook.getSheets()[2].getRootTopic(), "Stars", 1)
 
@@ -13,7 +13,7 @@ import os
 import sys
 import glob
 sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
-from XmindCopilot.search import BatchSearch
+from XmindCopilot.search import BatchSearch, SearchIndex
 # autopep8: on
 
 
@@ -28,10 +28,17 @@ def getXmindPath():
     return path
 
 
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "global_search.db")
+
+
 def GlobalSearchLooper():
-    while True:
-        searchstr = input("Search:")
-        BatchSearch(searchstr, getXmindPath(), True)
+    # Files are parsed only when added or changed since last query
+    with SearchIndex(INDEX_PATH) as index:
+        while True:
+            searchstr = input("Search:")
+            result = BatchSearch(searchstr, getXmindPath(), True, index=index)
+            for message in result.errors.values():
+                print(message)
 
 
 if __name__ == "__main__":
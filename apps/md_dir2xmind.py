@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+# autopep8: off
+import os
+import sys
+import glob
+sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+import XmindCopilot
+from XmindCopilot.fmt_cvt.md2xmind import convert_markdown_files
+# autopep8: on
+
+
+def MarkdownDir2Xmind(md_dir, xmind_path, workers=None):
+    """Import markdown files under md_dir into xmind_path, one sheet per file"""
+    paths = sorted(glob.glob(os.path.join(md_dir, "**", "*.md"), recursive=True))
+    is_new = not os.path.isfile(xmind_path)
+    workbook = XmindCopilot.load(xmind_path)
+    empty_sheet = workbook.getPrimarySheet()
+    equation_errors = {}
+    errors = convert_markdown_files(workbook, paths, workers, root=md_dir,
+                                    cvtEquation=True, cvtWebImage=True, cvtHyperLink=True, cvtTable=True,
+                                    equation_errors=equation_errors)
+    for path, error in errors.items():
+        print("Failed to import:" + path, error)
+    for formula, error in equation_errors.items():
+        print("Failed to render equation:" + formula, error)
+    # A new workbook starts with an empty sheet
+    if is_new and len(workbook.getSheets()) > 1:
+        workbook.removeSheet(empty_sheet)
+    XmindCopilot.save(workbook)
+
+
+if __name__ == "__main__":
+    md_dir = "apps/notes"
+    xmind_path = "apps/notes.xmind"
+    MarkdownDir2Xmind(md_dir, xmind_path)
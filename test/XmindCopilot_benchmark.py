@@ -0,0 +1,489 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for XmindCopilot on large synthetic workbooks.
+
+Usage:
+    python test/XmindCopilot_benchmark.py            # run all benchmarks
+    python test/XmindCopilot_benchmark.py traversal  # run selected benchmarks
+"""
+import os
+import sys
+import time
+import zipfile
+
+sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+# Support CLI pytest (Import error)
+import XmindCopilot
+
+TMP_DIR = os.path.join(os.path.dirname(__file__), "tmp")
+
+if not os.path.isdir(TMP_DIR):
+    os.mkdir(TMP_DIR)
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def timeit(func, *args, repeat=3, **kwargs):
+    """Return the best wall time(seconds) of `repeat` runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        cost = time.perf_counter() - start
+        best = cost if best is None else min(best, cost)
+    return best
+
+
+def report(name, seconds, extra=""):
+    print("%-40s %10.2f ms %s" % (name, seconds * 1000, extra))
+
+
+# ********** Synthetic Workbook **********
+def make_content_xml(breadth=10, depth=4, sheets=1):
+    """
+    Build content.xml of a synthetic workbook. Each sheet has sum(breadth^i, i=0..depth) topics.
+    """
+    counter = [0]
+
+    def topic_xml(level, buf):
+        counter[0] += 1
+        n = counter[0]
+        buf.append('<topic id="%026d" timestamp="1689055356465"><title>Topic %d</title>' % (n, n))
+        if n % 7 == 0:
+            buf.append('<marker-refs><marker-ref marker-id="priority-1"/></marker-refs>')
+        if n % 11 == 0:
+            buf.append('<labels><label>label %d</label></labels>' % n)
+        if n % 13 == 0:
+            buf.append('<notes><plain>note of topic %d</plain></notes>' % n)
+        if level < depth:
+            buf.append('<children><topics type="attached">')
+            for _ in range(breadth):
+                topic_xml(level + 1, buf)
+            buf.append('</topics></children>')
+        buf.append('</topic>')
+
+    buf = ['<?xml version="1.0" encoding="UTF-8" standalone="no"?>'
+           '<xmap-content xmlns="urn:xmind:xmap:xmlns:content:2.0" '
+           'xmlns:fo="http://www.w3.org/1999/XSL/Format" xmlns:svg="http://www.w3.org/2000/svg" '
+           'xmlns:xhtml="http://www.w3.org/1999/xhtml" xmlns:xlink="http://www.w3.org/1999/xlink" '
+           'timestamp="1689065780904" version="2.0">']
+    for i in range(sheets):
+        buf.append('<sheet id="s%025d" timestamp="1689055356465">' % i)
+        topic_xml(0, buf)
+        buf.append('<title>Sheet %d</title></sheet>' % i)
+    buf.append('</xmap-content>')
+    return "".join(buf)
+
+
+def make_synthetic_xmind(breadth=10, depth=4, sheets=1, name=None):
+    """Write a synthetic xmind file into TMP_DIR and return its path"""
+    name = name or "Synthetic_%d_%d_%d.xmind" % (breadth, depth, sheets)
+    path = os.path.join(TMP_DIR, name)
+    if not os.path.isfile(path):
+        with zipfile.ZipFile(path, "w") as f:
+            f.writestr("content.xml", make_content_xml(breadth, depth, sheets))
+    return path
+
+
+# ********** Benchmarks **********
+def _traverse(topic):
+    topic.getTitle()
+    for t in topic.getSubTopics():
+        _traverse(t)
+
+
+@benchmark
+def traversal():
+    """Traversal cost with read-only mode on and off"""
+    path = make_synthetic_xmind(10, 4)
+    for read_only in (False, True):
+        cost = []
+        for _ in range(3):
+            workbook = XmindCopilot.load(path, get_refs=False, read_only=read_only)
+            root_topic = workbook.getPrimarySheet().getRootTopic()
+            cost.append(timeit(_traverse, root_topic, repeat=1))
+        report("traversal(read_only=%s)" % read_only, min(cost))
+
+
+@benchmark
+def wrapper_cache():
+    """Cold traversal(allocate wrappers) vs warm traversal(reuse cached wrappers)"""
+    path = make_synthetic_xmind(10, 4)
+    workbook = XmindCopilot.load(path, get_refs=False, read_only=True)
+    report("getData(cold)", timeit(workbook.getData, repeat=1))
+    report("getData(warm)", timeit(workbook.getData))
+    print("%-40s %10d" % ("cached wrappers", len(workbook._wrapper_cache)))
+
+
+@benchmark
+def topic_index():
+    """Find topic by id: recursive walk vs workbook id index"""
+    path = make_synthetic_xmind(10, 4)
+    workbook = XmindCopilot.load(path, get_refs=False, read_only=True)
+    root_topic = workbook.getPrimarySheet().getRootTopic()
+    topic_id = "%026d" % 11111
+
+    def walk_find(topic):
+        if topic.getID() == topic_id:
+            return topic
+        for t in topic.getSubTopics():
+            found = walk_find(t)
+            if found:
+                return found
+
+    report("recursive walk", timeit(walk_find, root_topic))
+    report("getTopicById(build index)", timeit(workbook.getTopicById, topic_id, repeat=1))
+    report("getTopicById(indexed)", timeit(workbook.getTopicById, topic_id))
+
+
+@benchmark
+def comments():
+    """getData() on a workbook with thousands of comments"""
+    path = make_synthetic_xmind(10, 3)
+    workbook = XmindCopilot.load(path, get_refs=False, read_only=True)
+    root_topic = workbook.getPrimarySheet().getRootTopic()
+    for topic in root_topic.getSubTopics():
+        for subtopic in topic.getSubTopics():
+            for i in range(30):
+                subtopic.addComment("comment %d" % i)
+    print("%-40s %10d" % ("comments", len(workbook.commentsbook.getComments())))
+    report("getData", timeit(workbook.getData))
+
+
+@benchmark
+def search():
+    """Single-pass search engine on a deep match"""
+    from XmindCopilot.search import topic_search, TopicSearchEngine
+    path = make_synthetic_xmind(10, 4)
+    workbook = XmindCopilot.load(path, get_refs=False, read_only=True)
+    root_topic = workbook.getPrimarySheet().getRootTopic()
+    report("topic_search(first)", timeit(topic_search, root_topic, "Topic 11111"))
+    engine = TopicSearchEngine(r"Topic 1\d{4}$", regex=True)
+    report("engine.all", timeit(engine.all, root_topic), "%d matches" % len(engine.all(root_topic)))
+    report("engine.top(10)", timeit(engine.top, root_topic, 10))
+
+
+@benchmark
+def topic_query():
+    """Compiled query: single walk vs answered from the comment and id indexes"""
+    from XmindCopilot.search import compile_query
+    path = make_synthetic_xmind(10, 4)
+    workbook = XmindCopilot.load(path, get_refs=False, read_only=True)
+    root_topic = workbook.getPrimarySheet().getRootTopic()
+    for topic in root_topic.getSubTopics()[:3]:
+        topic.addComment("review")
+    for query in (r"title~/Topic 1\d{4}$/ AND depth>=3", "title:111 AND depth<4",
+                  "comment:review AND depth<3", "id:%026d" % 11111):
+        query = compile_query(query)
+        report(query.query[:40], timeit(query.search, workbook), "%d matches" % len(query.search(workbook)))
+
+
+@benchmark
+def save():
+    """Save after a one-word title edit on a workbook with many attachments"""
+    path = os.path.join(TMP_DIR, "SyntheticAttachments.xmind")
+    if not os.path.isfile(path):
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as f:
+            f.writestr("content.xml", make_content_xml(10, 3))
+            for i in range(200):
+                f.writestr("attachments/%026d.png" % i, os.urandom(256 * 1024))
+    workbook = XmindCopilot.load(path)
+    workbook.getPrimarySheet().getRootTopic().setTitle("Edited")
+    report("load", timeit(XmindCopilot.load, path))
+    report("save", timeit(XmindCopilot.save, workbook, os.path.join(TMP_DIR, "SyntheticAttachmentsSaved.xmind")))
+
+
+@benchmark
+def xml_backend():
+    """Parse/serialize a 50k-topic content.xml with each XML backend"""
+    import io
+    import tracemalloc
+    from XmindCopilot.core.backend import BACKENDS, available_backends
+    data = make_content_xml(15, 4).encode("utf-8")
+    print("%-40s %10d" % ("content.xml bytes", len(data)))
+    for name in available_backends():
+        backend = BACKENDS[name]()
+        tracemalloc.start()
+        document = backend.parse(data)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        report("parse(%s)" % name, timeit(backend.parse, data), "peak %.1f MB" % (peak / 2 ** 20))
+        report("serialize(%s)" % name, timeit(document.writexml, io.StringIO(), encoding="utf-8"))
+
+
+@benchmark
+def iter_topics():
+    """Streaming iter_topics vs load + walk, memory should stay flat as the map grows"""
+    import tracemalloc
+    for breadth in (10, 15):
+        path = make_synthetic_xmind(breadth, 4)
+        count = sum(1 for _ in XmindCopilot.iter_topics(path))
+        tracemalloc.start()
+        for _ in XmindCopilot.iter_topics(path):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        report("iter_topics(%d topics)" % count, timeit(lambda: list(XmindCopilot.iter_topics(path)), repeat=1),
+               "peak %.1f MB" % (peak / 2 ** 20))
+
+        def load_walk():
+            workbook = XmindCopilot.load(path, read_only=True)
+            for t, depth, p in workbook.getPrimarySheet().getRootTopic().walk():
+                t.getTitle()
+        tracemalloc.start()
+        load_walk()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        report("load + walk(%d topics)" % count, timeit(load_walk, repeat=1), "peak %.1f MB" % (peak / 2 ** 20))
+
+
+@benchmark
+def lazy_sheets():
+    """Load a 40-sheet workbook and edit one sheet, with lazy_sheets on and off"""
+    path = make_synthetic_xmind(10, 3, 40)
+    out = os.path.join(TMP_DIR, "SyntheticLazySheetsSaved.xmind")
+
+    def load_edit(lazy_sheets):
+        workbook = XmindCopilot.load(path, lazy_sheets=lazy_sheets)
+        workbook.getSheets()[2].getRootTopic().setTitle("Edited")
+        return workbook
+
+    for lazy_sheets in (False, True):
+        report("load + edit(lazy_sheets=%s)" % lazy_sheets, timeit(load_edit, lazy_sheets))
+        workbook = load_edit(lazy_sheets)
+        report("save(lazy_sheets=%s)" % lazy_sheets, timeit(XmindCopilot.save, workbook, out))
+
+
+@benchmark
+def wrapper_memory():
+    """Peak memory allocated by getData() on a 11k-topic map, mostly wrappers of __slots__ classes"""
+    import tracemalloc
+    path = make_synthetic_xmind(10, 4)
+    workbook = XmindCopilot.load(path)
+    tracemalloc.start()
+    start = time.perf_counter()
+    workbook.getData()
+    cost = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    report("getData", cost, "peak %.1f MB, retained %.1f MB" % (peak / 2 ** 20, current / 2 ** 20))
+
+
+@benchmark
+def generate_id():
+    """ID generation speed, and uniqueness of 10M ids"""
+    from XmindCopilot.utils import generate_id
+    report("generate_id x 1M", timeit(lambda: [generate_id() for _ in range(1000000)]))
+    count = 10 ** 7
+    ids = set(generate_id() for _ in range(count))
+    print("%-40s %10d / %d" % ("unique ids", len(ids), count))
+    assert len(ids) == count
+
+
+@benchmark
+def subtree_builder():
+    """Add a 111k-topic indented list under root topic with each XML backend"""
+    from XmindCopilot.core.backend import available_backends
+    lines = []
+    stack = [("T", 0)]
+    while stack:
+        title, level = stack.pop()
+        if level:
+            lines.append("\t" * (level - 1) + title)
+        if level < 5:
+            stack.extend(("%s.%d" % (title, i), level + 1) for i in reversed(range(10)))
+    try:
+        for name in available_backends():
+            XmindCopilot.set_xml_backend(name)
+            root_topic = XmindCopilot.load(os.path.join(TMP_DIR, "SubtreeBuilder.xmind")).getPrimarySheet().getRootTopic()
+            report("addSubTopicbyIndentedList(%s)" % name, timeit(root_topic.addSubTopicbyIndentedList, lines, repeat=1),
+                   "%d topics" % len(lines))
+    finally:
+        XmindCopilot.set_xml_backend("minidom")
+
+
+def make_corpus(count=40, breadth=10, depth=3):
+    """Copy a synthetic xmind file `count` times into TMP_DIR/corpus and return the paths"""
+    import shutil
+    source = make_synthetic_xmind(breadth, depth)
+    corpus_dir = os.path.join(TMP_DIR, "corpus")
+    if not os.path.isdir(corpus_dir):
+        os.mkdir(corpus_dir)
+    paths = []
+    for i in range(count):
+        path = os.path.join(corpus_dir, "Corpus_%d_%d_%d.xmind" % (breadth, depth, i))
+        if not os.path.isfile(path):
+            shutil.copy(source, path)
+        paths.append(path)
+    return paths
+
+
+@benchmark
+def search_index():
+    """BatchSearch over a 40-file corpus, parsing every file vs persistent SQLite index"""
+    from XmindCopilot.search import BatchSearch, SearchIndex
+    paths = make_corpus()
+    db_path = os.path.join(TMP_DIR, "corpus.db")
+    if os.path.isfile(db_path):
+        os.remove(db_path)
+    report("BatchSearch(parse)", timeit(BatchSearch, "Topic 11", paths, False, repeat=1))
+    with SearchIndex(db_path) as index:
+        report("SearchIndex.update(build)", timeit(index.update, paths, repeat=1))
+        report("SearchIndex.update(unchanged)", timeit(index.update, paths))
+        report("BatchSearch(index, plain)", timeit(BatchSearch, "Topic 11", paths, False, index=index))
+        report("BatchSearch(index, regex)", timeit(BatchSearch, "^Topic 1[0-9]$", paths, False, index=index))
+
+
+@benchmark
+def parallel_search():
+    """BatchSearch over a 40-file corpus, serially vs a process per CPU"""
+    from XmindCopilot.search import BatchSearch
+    paths = make_corpus()
+    workers = os.cpu_count() or 1
+    report("BatchSearch(workers=1)", timeit(BatchSearch, "Topic 11", paths, False, repeat=1))
+    report("BatchSearch(workers=%d)" % workers,
+           timeit(BatchSearch, "Topic 11", paths, False, workers=workers, repeat=1))
+
+
+@benchmark
+def search_prefilter():
+    """BatchSearch over a 40-file corpus for a literal without hits, with and without raw byte pre-filter"""
+    from XmindCopilot.search import BatchSearch
+    paths = make_corpus()
+    report("BatchSearch(prefilter=False)", timeit(BatchSearch, "No such topic", paths, False, prefilter=False, repeat=1))
+    report("BatchSearch(prefilter=True)", timeit(BatchSearch, "No such topic", paths, False, repeat=1))
+    report("BatchSearch(prefilter, hit)", timeit(BatchSearch, "Topic 11", paths, False, repeat=1))
+
+
+def make_markdown(size=5 * 1024 * 1024):
+    """Write a synthetic markdown file of about `size` bytes into TMP_DIR and return its path"""
+    path = os.path.join(TMP_DIR, "Synthetic_%d.md" % size)
+    if os.path.isfile(path):
+        return path
+    chunk = []
+    for i in range(20):
+        chunk.append("## Section %d\n\nSome text with a [link](https://example.com/%d).\n" % (i, i))
+        chunk.append("### Sub section %d\n\n- item\n  - sub item\n    - sub sub item\n1. numbered\n" % i)
+        chunk.append("```python\n# comment, not a heading\nprint(%d)\n```\n" % i)
+        chunk.append("$$\nx_%d = \\frac{a}{b}\n$$\n" % i)
+        chunk.append("| a | b |\n|---|---|\n| %d | %d |\n\n#### Detail %d\n\ntext\n" % (i, i, i))
+    chunk = "".join(chunk)
+    with open(path, "w", encoding="utf-8") as f:
+        n = 0
+        while f.tell() < size:
+            f.write("# Chapter %d\n\n" % n)
+            f.write(chunk)
+            n += 1
+    return path
+
+
+@benchmark
+def markdown_parser():
+    """Parse a 5 MB markdown file: MDSection vs single-pass tokenizer"""
+    from XmindCopilot.fmt_cvt.md2xmind import MarkDown2Xmind, MDSection, iter_md_items
+    with open(make_markdown(), encoding="utf-8") as f:
+        text = f.read()
+    md2xmind = MarkDown2Xmind()
+    report("MDSection.toXmindText", timeit(lambda: MDSection("", md2xmind.preProcess(text)).toXmindText(), repeat=1))
+    report("iterBlocks", timeit(lambda: list(md2xmind.iterBlocks(text)), repeat=1),
+           "%d blocks" % len(list(md2xmind.iterBlocks(text))))
+    report("iter_md_items", timeit(lambda: list(iter_md_items(md2xmind.iterBlocks(text))), repeat=1))
+    report("convert2xmindtext", timeit(md2xmind.convert2xmindtext, text, repeat=1))
+    workbook = XmindCopilot.load(os.path.join(TMP_DIR, "Markdown.xmind"))
+    md2xmind = MarkDown2Xmind(workbook.getPrimarySheet().getRootTopic())
+    report("convert2xmind", timeit(md2xmind.convert2xmind, text, repeat=1))
+
+
+@benchmark
+def markdown_stream():
+    """Import a 5 MB markdown file from a string vs streamed from the file, with peak traced memory"""
+    import tracemalloc
+    from XmindCopilot.fmt_cvt.md2xmind import MarkDown2Xmind
+    path = make_markdown()
+
+    def convert():
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        MarkDown2Xmind(XmindCopilot.load(os.path.join(TMP_DIR, "Markdown.xmind")).getPrimarySheet().getRootTopic()
+                       ).convert2xmind(text)
+
+    def convert_stream():
+        with open(path, encoding="utf-8") as f:
+            MarkDown2Xmind(XmindCopilot.load(os.path.join(TMP_DIR, "Markdown.xmind")).getPrimarySheet().getRootTopic()
+                           ).convert2xmind_stream(f)
+
+    for name, func in (("convert2xmind", convert), ("convert2xmind_stream", convert_stream)):
+        seconds = timeit(func, repeat=1)
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        report(name, seconds, "peak %.1f MB" % (peak / 1024 / 1024))
+
+
+@benchmark
+def markdown_element_split():
+    """MDSection.elementSplit on code-heavy notes, time should grow linearly with the size"""
+    from XmindCopilot.fmt_cvt.md2xmind import MDSection
+    section = MDSection()
+    for count in (1000, 4000, 16000):
+        text = "\n".join("text %d\n```python\nprint(%d)\n```\n| %d |\n|---|" % (i, i, i) for i in range(count))
+        report("elementSplit(%d blocks)" % (count * 3), timeit(section.elementSplit, text))
+
+
+@benchmark
+def latex_render_cache():
+    """latex2img_plt on 20 formulas: rendered vs served from the render cache"""
+    from XmindCopilot.fmt_cvt.latex_render import latex2img_plt
+    from XmindCopilot.fmt_cvt.render_cache import RenderCache, get_render_cache, set_render_cache
+    formulas = [r"\frac{x_{%d}}{\sqrt{y^2 + %d}}" % (i, i) for i in range(20)]
+    previous = get_render_cache()
+    cache = RenderCache(os.path.join(TMP_DIR, "render_cache"))
+    cache.clear()
+    set_render_cache(cache)
+    try:
+        report("latex2img_plt(render)", timeit(lambda: [latex2img_plt(f) for f in formulas], repeat=1))
+        report("latex2img_plt(cached)", timeit(lambda: [latex2img_plt(f) for f in formulas]))
+    finally:
+        set_render_cache(previous)
+
+
+@benchmark
+def latex_batch_render():
+    """Convert 60 equation titles(20 distinct) one by one vs in one batch, render cache disabled"""
+    from XmindCopilot.fmt_cvt.render_cache import get_render_cache, set_render_cache
+    titles = [r"$$\frac{x_{%d}}{\sqrt{y^2 + %d}}$$" % (i % 20, i % 20) for i in range(60)]
+
+    def make_root():
+        root = XmindCopilot.load(os.path.join(TMP_DIR, "latex_batch_render.xmind")).getPrimarySheet().getRootTopic()
+        for title in titles:
+            root.addSubTopicbyTitle(title)
+        return root
+
+    def serial(root):
+        for topic, depth, path in root.walk(order="post"):
+            topic.convertTitle2Equation(height=50)
+
+    previous = get_render_cache()
+    set_render_cache(None)
+    try:
+        report("convertTitle2Equation(per topic)", timeit(lambda: serial(make_root()), repeat=1))
+        for workers in (1, 2):
+            report("convertTitle2Equation(batch, workers=%d)" % workers,
+                   timeit(lambda: make_root().convertTitle2Equation(height=50, recursive=True, workers=workers),
+                          repeat=1))
+    finally:
+        set_render_cache(previous)
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print("[%s] %s" % (name, BENCHMARKS[name].__doc__))
+        BENCHMARKS[name]()
@@ -1,16 +1,24 @@
 
+import gc
 import os
+import shutil
 import sys
 import unittest
+import zipfile
+from PIL import Image
 
 sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 # Support CLI pytest (Import error)
 import XmindCopilot
-from XmindCopilot.search import topic_search
+from XmindCopilot.search import topic_search, topic_search_by_title, topic_search_by_hyperlink
+from XmindCopilot.search import TopicSearchEngine, BatchSearch, SearchIndex
+from XmindCopilot.search import compile_query, QuerySyntaxError
+from XmindCopilot.search.prefilter import create_matcher
 from XmindCopilot.file_shrink import xmind_shrink
-from XmindCopilot.fmt_cvt.md2xmind import MarkDown2Xmind
+from XmindCopilot.fmt_cvt.md2xmind import MarkDown2Xmind, MDSection, convert_markdown_files, iter_md_blocks
 from XmindCopilot.fmt_cvt.latex_render import latex2img
-from XmindCopilot.fmt_cvt.latex_render import latex2img_web
+from XmindCopilot.fmt_cvt.latex_render import latex2img_web, latex2img_plt, render_equations
+from XmindCopilot.fmt_cvt.render_cache import RenderCache, get_render_cache, set_render_cache
 from XmindCopilot.topic_cluster import topic_cluster
 
 TMP_DIR = os.path.join(os.path.dirname(__file__), "tmp")
@@ -37,6 +45,278 @@ class TestXmindCopilot(unittest.TestCase):
             print('  ', topic.getTitle())
         self.assertTrue(True)
 
+    def testXmindLoadReadOnly(self):
+        workbook = XmindCopilot.load(TEST_TEMPLATE_XMIND, read_only=True)
+        before = workbook.getImplementation().toxml()
+        workbook.getData()
+        self.assertEqual(before, workbook.getImplementation().toxml())
+        # New topics still get id
+        topic = workbook.getPrimarySheet().getRootTopic().addSubTopicbyTitle("New")
+        self.assertEqual(len(topic.getID()), 26)
+
+    def testWrapperCache(self):
+        workbook = XmindCopilot.load(TEST_TEMPLATE_XMIND)
+        self.assertIs(workbook.getSheets()[0], workbook.getPrimarySheet())
+        root_topic = workbook.getPrimarySheet().getRootTopic()
+        subtopic = root_topic.getSubTopics()[0]
+        self.assertIs(subtopic, root_topic.getSubTopics()[0])
+        self.assertIs(subtopic.getParentTopic(), root_topic)
+        new_topic = root_topic.addSubTopicbyTitle("New")
+        self.assertIs(new_topic, root_topic.getSubTopics()[-1])
+        new_topic.removeTopic()
+        self.assertNotIn(new_topic.getImplementation(), workbook._wrapper_cache)
+
+    def testGetTopicById(self):
+        workbook = XmindCopilot.load(TEST_TEMPLATE_XMIND)
+        root_topic = workbook.getPrimarySheet().getRootTopic()
+        subtopic = root_topic.getSubTopics()[0]
+        self.assertIs(workbook.getTopicById(subtopic.getID()), subtopic)
+        new_topic = subtopic.addSubTopicbyTitle("New")
+        self.assertIs(workbook.getTopicById(new_topic.getID()), new_topic)
+        link_topic = root_topic.addSubTopicbyTitle("Link")
+        link_topic.setTopicHyperlink(new_topic.getID())
+        self.assertIs(link_topic.getTopicHyperlinkTarget(), new_topic)
+        rel = workbook.createRelationship(link_topic, new_topic)
+        self.assertIs(rel.getEnd2(), new_topic)
+        new_topic.removeTopic()
+        self.assertIsNone(workbook.getTopicById(new_topic.getID()))
+
+    def testCommentsIndex(self):
+        workbook = XmindCopilot.load(TEST_TEMPLATE_XMIND)
+        root_topic = workbook.getPrimarySheet().getRootTopic()
+        subtopic = root_topic.getSubTopics()[0]
+        self.assertIsNone(subtopic.getComments())
+        subtopic.addComment("first")
+        subtopic.addComment("second")
+        self.assertEqual(subtopic.getComments(), "first\nsecond")
+        comments = workbook.commentsbook.getCommentsFor([subtopic.getID(), root_topic.getID()])
+        self.assertEqual([c.getContent() for c in comments[subtopic.getID()]], ["first", "second"])
+        self.assertNotIn(root_topic.getID(), comments)
+
+    def testReferenceStore(self):
+        workbook = XmindCopilot.load(TEST_TEMPLATE_XMIND)
+        references = workbook.references
+        names = references.namelist()
+        self.assertTrue(names)
+        # Nothing extracted on load
+        self.assertIsNone(references._overlay_dir)
+        topic = workbook.getPrimarySheet().getRootTopic().addSubTopicbyTitle("Image")
+        topic.setImage(Image.new("RGB", (8, 8)))
+        image_name = topic.getImage()._getImgRefName()
+        self.assertEqual(references.getChanged().keys(), {image_name})
+        xmind_path = os.path.join(TMP_DIR, "TestReferenceStore.xmind")
+        XmindCopilot.save(workbook, xmind_path)
+        workbook = XmindCopilot.load(xmind_path)
+        self.assertEqual(set(workbook.references.namelist()), set(names) | {image_name})
+        self.assertEqual(workbook.references.read(names[0]),
+                         XmindCopilot.load(TEST_TEMPLATE_XMIND).references.read(names[0]))
+
+    def testSaveRawCopy(self):
+        workbook = XmindCopilot.load(TEST_TEMPLATE_XMIND)
+        workbook.getPrimarySheet().getRootTopic().setTitle("Edited")
+        xmind_path = os.path.join(TMP_DIR, "TestSaveRawCopy.xmind")
+        XmindCopilot.save(workbook, xmind_path)
+        with zipfile.ZipFile(TEST_TEMPLATE_XMIND) as src, zipfile.ZipFile(xmind_path) as dst:
+            self.assertIsNone(dst.testzip())
+            for name in workbook.references.namelist():
+                src_info, dst_info = src.getinfo(name), dst.getinfo(name)
+                self.assertEqual((src_info.compress_type, src_info.compress_size, src_info.CRC),
+                                 (dst_info.compress_type, dst_info.compress_size, dst_info.CRC))
+
+    def testCopyZipMember(self):
+        from XmindCopilot.utils import copy_zip_member
+        zip_path = os.path.join(TMP_DIR, "TestCopyZipMember.zip")
+        with open(TEST_TEMPLATE_XMIND, "rb") as src_fp, zipfile.ZipFile(src_fp) as src:
+            info = src.getinfo("content.xml")
+            with zipfile.ZipFile(zip_path, "w") as dst:
+                self.assertTrue(copy_zip_member(src_fp, info, dst))
+                # Duplicate names go through writestr and its duplicate check
+                with self.assertWarns(UserWarning):
+                    self.assertTrue(copy_zip_member(src_fp, info, dst))
+            content = src.read(info)
+        with zipfile.ZipFile(zip_path) as dst:
+            self.assertIsNone(dst.testzip())
+            self.assertEqual([i.filename for i in dst.infolist()], ["content.xml"] * 2)
+            self.assertEqual(dst.getinfo("content.xml").CRC, info.CRC)
+            self.assertEqual(dst.read("content.xml"), content)
+
+    def testSaveCompression(self):
+        workbook = XmindCopilot.load(TEST_TEMPLATE_XMIND)
+        workbook.getPrimarySheet().getRootTopic().setTitle("Edited")
+        stored_path = os.path.join(TMP_DIR, "TestSaveStored.xmind")
+        deflated_path = os.path.join(TMP_DIR, "TestSaveDeflated.xmind")
+        XmindCopilot.save(workbook, stored_path, compression=zipfile.ZIP_STORED)
+        XmindCopilot.save(workbook, deflated_path, compression=zipfile.ZIP_DEFLATED, compresslevel=9)
+        with zipfile.ZipFile(stored_path) as stored, zipfile.ZipFile(deflated_path) as deflated:
+            self.assertEqual(stored.getinfo("content.xml").compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(deflated.getinfo("content.xml").compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(stored.read("content.xml"), deflated.read("content.xml"))
+            self.assertLess(os.path.getsize(deflated_path), os.path.getsize(stored_path))
+        self.assertEqual(XmindCopilot.load(deflated_path).getData(), workbook.getData())
+
+    def testSaveModifiedParts(self):
+        xmind_path = os.path.join(TMP_DIR, "TestSaveModifiedParts.xmind")
+        shutil.copy(TEST_TEMPLATE_XMIND, xmind_path)
+        workbook = XmindCopilot.load(xmind_path, read_only=True)
+        documents = [workbook, workbook.stylesbook, workbook.commentsbook, workbook.manifestbook]
+        self.assertEqual([d.isModified() for d in documents], [False] * 4)
+        workbook.getPrimarySheet().getRootTopic().setTitle("Edited")
+        self.assertEqual([d.isModified() for d in documents], [True, False, False, False])
+        XmindCopilot.save(workbook)
+        self.assertEqual([d.isModified() for d in documents], [False] * 4)
+        with zipfile.ZipFile(TEST_TEMPLATE_XMIND) as src, zipfile.ZipFile(xmind_path) as dst:
+            self.assertNotEqual(src.read("content.xml"), dst.read("content.xml"))
+            for name in ("styles.xml", "comments.xml", "META-INF/manifest.xml"):
+                self.assertEqual(src.getinfo(name).compress_size, dst.getinfo(name).compress_size)
+                self.assertEqual(src.read(name), dst.read(name))
+        self.assertEqual(XmindCopilot.load(xmind_path).getPrimarySheet().getRootTopic().getTitle(), "Edited")
+
+    def testSaveNewWorkbook(self):
+        from XmindCopilot.core.workbook import WorkbookDocument
+        workbook = WorkbookDocument()
+        workbook.createSheet()
+        xmind_path = os.path.join(TMP_DIR, "TestSaveNewWorkbook.xmind")
+        XmindCopilot.save(workbook, xmind_path)
+        with zipfile.ZipFile(xmind_path) as f:
+            content = f.read("content.xml").decode("utf-8")
+        # Every new sheet has its root topic
+        self.assertEqual(content.count("<sheet"), 2)
+        self.assertEqual(content.count("<topic"), 2)
+
+    def testLazySheets(self):
+        from XmindCopilot.core import lazy
+        data = XmindCopilot.load(TEST_TEMPLATE_XMIND, read_only=True).getData()
+        workbook = XmindCopilot.load(TEST_TEMPLATE_XMIND, read_only=True, lazy_sheets=True)
+        sheets = workbook.getSheets()
+        self.assertTrue(all(lazy.is_pending(sheet.getImplementation()) for sheet in sheets))
+        sheets[2].getRootTopic().setTitle("Edited")
+        self.assertEqual([lazy.is_pending(sheet.getImplementation()) for sheet in sheets], [True, True, False])
+        xmind_path = os.path.join(TMP_DIR, "TestLazySheets.xmind")
+        XmindCopilot.save(workbook, xmind_path)
+        # Untouched sheets are written verbatim
+        with zipfile.ZipFile(TEST_TEMPLATE_XMIND) as src, zipfile.ZipFile(xmind_path) as dst:
+            src_index = lazy.index_sheets(src.read("content.xml"))
+            dst_index = lazy.index_sheets(dst.read("content.xml"))
+        self.assertEqual([src_index.getContent(i) for i in range(2)], [dst_index.getContent(i) for i in range(2)])
+        self.assertEqual(XmindCopilot.load(xmind_path, lazy_sheets=True).getData()[:2], data[:2])
+        self.assertEqual(XmindCopilot.load(xmind_path).getSheets()[2].getRootTopic().getTitle(), "Edited")
+
+    def testXmlBackend(self):
+        from XmindCopilot.core.backend import available_backends
+        data = XmindCopilot.load(TEST_TEMPLATE_XMIND).getData()
+        try:
+            for name in available_backends():
+                XmindCopilot.set_xml_backend(name)
+                workbook = XmindCopilot.load(TEST_TEMPLATE_XMIND, read_only=True)
+                self.assertEqual(workbook.getData(), data)
+                workbook.getPrimarySheet().getRootTopic().addSubTopicbyTitle("New").setTitle("A & B")
+                xmind_path = os.path.join(TMP_DIR, "TestXmlBackend_%s.xmind" % name)
+                XmindCopilot.save(workbook, xmind_path)
+                XmindCopilot.set_xml_backend("minidom")
+                root_topic = XmindCopilot.load(xmind_path).getPrimarySheet().getRootTopic()
+                self.assertEqual(root_topic.getSubTopics()[-1].getTitle(), "A & B")
+        finally:
+            XmindCopilot.set_xml_backend("minidom")
+
+    def testIterTopics(self):
+        records = list(XmindCopilot.iter_topics(TEST_TEMPLATE_XMIND))
+        workbook = XmindCopilot.load(TEST_TEMPLATE_XMIND, read_only=True)
+        expected = []
+        for index, sheet in enumerate(workbook.getSheets()):
+            for topic, depth, path in sheet.getRootTopic().walk(include_detached=True):
+                expected.append((topic.getID(), topic.getTitle() or None, topic.getHyperlink(), depth, index,
+                                 tuple(t.getTitle() for t in path[:-1])))
+        # Records also include summary/callout topics, which are not walked
+        actual = set((r.id, r.title, r.href, r.depth, r.sheet, r.path) for r in records)
+        self.assertLessEqual(set(expected), actual)
+        self.assertEqual(len(actual), len(records))
+        record = [r for r in records if r.title == "多标签"][0]
+        self.assertEqual(record.labels, ("标签01", "标签02"))
+        self.assertEqual(record.parent_id, [r for r in records if r.title == "标签测试"][0].id)
+
+    def testAddSubTopicTree(self):
+        workbook = XmindCopilot.load(os.path.join(TMP_DIR, "TestAddSubTopicTree.xmind"))
+        root_topic = workbook.getPrimarySheet().getRootTopic()
+
+        def titles(topic):
+            return [(t.getTitle(), titles(t)) for t in topic.getSubTopics()]
+
+        expected = [("A", [("A.1", [("A.1.a", [])]), ("A.2", [])]), ("B", [])]
+        for tree in (["A", "\tA.1", "\t\tA.1.a", "\tA.2", "B"],
+                     ["\tA", "\t\t\tA.1", "\t\t\t\tA.1.a", "\t\tA.2", "B"],
+                     {"A": {"A.1": ["A.1.a"], "A.2": None}, "B": None},
+                     [(None, "A"), ("A", "A.1"), (None, "B"), ("A.1", "A.1.a"), (0, "A.2")]):
+            topic = root_topic.addSubTopicbyTitle("Tree")
+            added = topic.addSubTopicTree(tree)
+            self.assertEqual([t.getTitle() for t in added], ["A", "B"])
+            self.assertEqual(titles(topic), expected)
+            self.assertEqual(workbook.getTopicById(added[0].getSubTopics()[1].getID()).getTitle(), "A.2")
+
+        topic = root_topic.addSubTopicbyTitle("List")
+        topic.addSubTopicbyList(["1", "4"])
+        topic.addSubTopicbyList(["2", "3"], 1)
+        topic.addSubTopicbyIndentedList(["0", "\t0.1"], 0)
+        self.assertEqual(titles(topic), [("0", [("0.1", [])]), ("1", []), ("2", []), ("3", []), ("4", [])])
+        self.assertEqual(topic.getSubTopics()[0].getImplementation().toxml().count('svg:width="500"'), 2)
+        # minidom elements are built from its internals only if they behave like setAttribute
+        from XmindCopilot.core import backend
+        self.assertTrue(backend._minidom_attrs_supported())
+        document = workbook.getOwnerDocument()
+        self.assertEqual(backend.MinidomBackend().buildElement("topic", {"id": "1"}, document).toxml(),
+                         backend.XmlBackend.buildElement(backend.MinidomBackend(), "topic", {"id": "1"}, document).toxml())
+
+    def testGenerateId(self):
+        from XmindCopilot.utils import generate_id
+        ids = [generate_id() for _ in range(100000)]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertTrue(all(len(i) == 26 and int(i, 16) >= 0 for i in ids))
+        if hasattr(os, "fork"):
+            # Child process must not reuse ids buffered by parent
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.write(write_fd, generate_id().encode("ascii"))
+                os._exit(0)
+            os.waitpid(pid, 0)
+            self.assertNotEqual(os.read(read_fd, 26).decode("ascii"), generate_id())
+            os.close(read_fd)
+            os.close(write_fd)
+
+    def testTopicWalk(self):
+        workbook = XmindCopilot.load(os.path.join(TMP_DIR, "TestTopicWalk.xmind"))
+        root_topic = workbook.getPrimarySheet().getRootTopic()
+        root_topic.setTitle("R")
+        a = root_topic.addSubTopicbyTitle("A")
+        a.addSubTopicbyTitle("A1")
+        root_topic.addSubTopicbyTitle("B")
+        titles = lambda walker: [t.getTitle() for t, depth, path in walker]
+        self.assertEqual(titles(root_topic.walk()), ["R", "A", "A1", "B"])
+        self.assertEqual(titles(root_topic.walk(order="post")), ["A1", "A", "B", "R"])
+        self.assertEqual(titles(root_topic.walk(order="bfs")), ["R", "A", "B", "A1"])
+        self.assertEqual(titles(root_topic.walk(max_depth=1)), ["R", "A", "B"])
+        walker = root_topic.walk()
+        visited = []
+        for t, depth, path in walker:
+            visited.append(t.getTitle())
+            if t is a:
+                walker.prune()
+        self.assertEqual(visited, ["R", "A", "B"])
+        paths = [path for t, depth, path in root_topic.walk(order="post")]
+        self.assertEqual(paths[0], (root_topic, a, a.getSubTopics()[0]))
+        self.assertEqual([t.getTitle() for t in paths[0][1:]], ["A", "A1"])
+        self.assertIs(paths[0].parent, paths[1])
+        # Deep outline should not hit the recursion limit
+        topic = root_topic
+        for i in range(3000):
+            topic = topic.addSubTopicbyTitle("D%d" % i)
+        depth, path = [(d, p) for t, d, p in root_topic.walk() if t is topic][0]
+        self.assertEqual(depth, 3000)
+        self.assertEqual(len(path), 3001)
+        self.assertEqual(path[-1], topic)
+        self.assertEqual(len(tuple(path)), 3001)
+        root_topic.setFolded(recursive=True)
+        self.assertEqual(root_topic.getData()["title"], "R")
+
 
 class TestTopicCluster(unittest.TestCase):
     def testTopicCluster(self):
@@ -63,6 +343,147 @@ class TestSearch(unittest.TestCase):
             print('  ', subtopic.getTitle())
         self.assertTrue(True)
 
+    def testSearchEngine(self):
+        workbook = XmindCopilot.load(os.path.join(TMP_DIR, "TestSearchEngine.xmind"))
+        root_topic = workbook.getPrimarySheet().getRootTopic()
+        root_topic.setTitle("Root")
+        a = root_topic.addSubTopicbyTitle("Apple pie")
+        b = a.addSubTopicbyTitle("Apple")
+        c = root_topic.addSubTopicbyTitle("Banana apple")
+        result = TopicSearchEngine("Apple").all(root_topic)
+        self.assertEqual(result.getTopics(), [a, b])
+        self.assertEqual(result.visited, 4)
+        result = TopicSearchEngine("apple").first(root_topic)
+        self.assertEqual(result.getTopics(), [c])
+        self.assertEqual(result.visited, 4)
+        self.assertEqual(TopicSearchEngine("Apple", exact=True).first(root_topic).getFirst(), b)
+        # Exact lookups do not match values which only end with the pattern
+        big = root_topic.addSubTopicbyTitle("Big Apple", 0)
+        self.assertIs(topic_search_by_title(root_topic, "Apple"), b)
+        self.assertIsNone(topic_search_by_title(root_topic, "pie"))
+        big.setURLHyperlink("https://evil.com/?https://x.com")
+        self.assertIsNone(topic_search_by_hyperlink(root_topic, "https://x.com"))
+        c.setURLHyperlink("https://x.com")
+        self.assertIs(topic_search_by_hyperlink(root_topic, "https://x.com"), c)
+        big.removeTopic()
+        self.assertEqual(TopicSearchEngine("Apple", depth=1).all(root_topic).getTopics(), [a])
+        top = TopicSearchEngine(["(?i)apple", "(?i)banana"], regex=True).top(root_topic, 2)
+        self.assertEqual(top.getTopics(), [c, a])
+        self.assertIs(topic_search(root_topic, "^App", re_match=True), a)
+        # re_match searches anywhere in the title(re.search), and plain text still matches
+        self.assertIs(topic_search(root_topic, "an+a", re_match=True), c)
+        x = root_topic.addSubTopicbyTitle("x+y")
+        self.assertIs(topic_search(root_topic, "x+y", re_match=True), x)
+        self.assertIsNone(topic_search(root_topic, "an+a"))
+
+    def testTopicQuery(self):
+        workbook = XmindCopilot.load(os.path.join(TMP_DIR, "TestTopicQuery.xmind"))
+        root_topic = workbook.getPrimarySheet().getRootTopic()
+        root_topic.setTitle("Root")
+        a = root_topic.addSubTopicbyTitle("PID tuning")
+        a.addMarker("priority-1")
+        a.addLabel("todo")
+        b = a.addSubTopicbyTitle("PID gains")
+        b.addMarker("priority-2")
+        b.setPlainNotes("Kp, Ki and Kd")
+        b.addComment("check with team")
+        c = root_topic.addSubTopicbyTitle("Kalman filter")
+        c.addLabel("done")
+        d = c.addSubTopicbyTitle("pid in lower case")
+        d.addComment("check later")
+
+        def search(query):
+            return compile_query(query).search(workbook).getTopics()
+        self.assertEqual(search("PID"), [a, b])
+        self.assertEqual(search('title~/^pid/i AND depth>1'), [b, d])
+        self.assertEqual(search('marker:priority-1 AND label:"todo"'), [a])
+        self.assertEqual(search("marker:priority"), [a, b])
+        self.assertEqual(search("note:Ki OR label:done"), [b, c])
+        self.assertEqual(search("NOT (depth<2 OR marker:priority) label:done"), [])
+        self.assertEqual(search('title="PID gains" depth<4'), [b])
+        # Answered by the comment index and the id index
+        result = compile_query("comment:check AND depth>=2").search(workbook)
+        self.assertEqual(result.getTopics(), [b, d])
+        self.assertEqual(result.visited, 2)
+        self.assertEqual([t.getTitle() for t in result.matches[1].path], ["Root", "Kalman filter", d.getTitle()])
+        self.assertEqual(search("id:%s OR id:%s" % (d.getID(), a.getID())), [a, d])
+        self.assertEqual(compile_query("id:%s" % b.getID()).search(a).matches[0].depth, 1)
+        for query in ("", "title:", "(PID", "depth~1", "size:1", "title~/(/", "PID OR"):
+            self.assertRaises(QuerySyntaxError, compile_query, query)
+        # Workbook created in memory has no comments
+        from XmindCopilot.core.workbook import WorkbookDocument
+        workbook = WorkbookDocument()
+        workbook.getPrimarySheet().getRootTopic().setTitle("foo")
+        self.assertEqual([t.getTitle() for t in compile_query("comment:foo OR title:foo").search(workbook).getTopics()],
+                         ["foo"])
+
+    def testSearchIndex(self):
+        xmind_path = os.path.join(TMP_DIR, "TestSearchIndex.xmind")
+        shutil.copy(TEST_TEMPLATE_XMIND, xmind_path)
+        paths = [TEST_TEMPLATE_XMIND, xmind_path, os.path.join(TMP_DIR, "TestSearchIndexMissing.xmind")]
+        db_path = os.path.join(TMP_DIR, "TestSearchIndex.db")
+        if os.path.isfile(db_path):
+            os.remove(db_path)
+        with SearchIndex(db_path) as index:
+            self.assertEqual(index.update(paths), 2)
+            self.assertEqual(index.update(paths), 0)
+            self.assertEqual(list(index.getErrors(paths)), paths[2:])
+            for searchstr in ("标记", "常用标记", "^[A-Z]", "e"):
+                self.assertEqual(index.search(searchstr, paths), BatchSearch(searchstr, paths, False))
+
+            workbook = XmindCopilot.load(xmind_path)
+            workbook.getPrimarySheet().getRootTopic().addSubTopicbyTitle("Indexed topic")
+            XmindCopilot.save(workbook)
+            self.assertEqual(index.update(paths), 1)
+            self.assertEqual(list(index.search("Indexed topic", paths)), [xmind_path])
+        # Index on disk is reused
+        self.assertEqual(BatchSearch("Indexed topic", paths, False, index=db_path),
+                         BatchSearch("Indexed topic", paths, False))
+
+    def testParallelSearch(self):
+        missing_path = os.path.join(TMP_DIR, "TestParallelSearchMissing.xmind")
+        paths = [TEST_TEMPLATE_XMIND, missing_path, TEST_TEMPLATE_XMIND]
+        results = list(XmindCopilot.map_corpus(paths, os.path.getsize, workers=2))
+        self.assertEqual(sorted(r.path for r in results), sorted(paths))
+        errors = [r for r in results if r.error is not None]
+        self.assertEqual([r.path for r in errors], [missing_path])
+        self.assertIsInstance(errors[0].error, OSError)
+
+        paths = [TEST_TEMPLATE_XMIND, missing_path]
+        for searchstr in ("标记", "^[A-Z]"):
+            self.assertEqual(BatchSearch(searchstr, paths[:1], False, workers=2),
+                             BatchSearch(searchstr, paths[:1], False))
+            # Failed files are reported instead of raised
+            self.assertEqual(BatchSearch(searchstr, paths, False, workers=2),
+                             BatchSearch(searchstr, paths[:1], False))
+        with SearchIndex(":memory:") as index:
+            self.assertEqual(index.update(paths, workers=2), 1)
+            self.assertEqual(list(index.getErrors()), [missing_path])
+
+    def testPrefilter(self):
+        matcher = create_matcher(["A&B", "x"])
+        self.assertTrue(matcher.search(b"<title>A&amp;B</title>"))
+        self.assertFalse(matcher.search(b"<title>A&B</title><title>y</title>"))
+        self.assertTrue(create_matcher(['"A"']).search(b"<title>&quot;A&quot;</title>"))
+        self.assertTrue(create_matcher(["A"]).search(b"<title>&#65;</title>"))
+        self.assertTrue(create_matcher(["A&B"]).search(b"<title>&#x41;&#38;&#X00042;</title>"))
+        self.assertTrue(create_matcher(["标记"]).search(b"<title>&#26631;\xe8\xae\xb0</title>"))
+        # Character references elsewhere do not let every needle pass
+        self.assertFalse(create_matcher(["A", "x&"]).search(b"<title>B&#10;C</title>"))
+        self.assertIsNone(create_matcher(["^A"]))
+        self.assertIsNotNone(create_matcher(["^A"], regex=False))
+
+        not_xmind_path = os.path.join(TMP_DIR, "TestPrefilter.txt")
+        not_zip_path = os.path.join(TMP_DIR, "TestPrefilter.xmind")
+        for path in (not_xmind_path, not_zip_path):
+            with open(path, "w") as f:
+                f.write("标记")
+        paths = [TEST_TEMPLATE_XMIND, not_xmind_path, not_zip_path]
+        for searchstr in ("标记", "No such topic", "^[A-Z]"):
+            result = BatchSearch(searchstr, paths, False)
+            self.assertEqual(result, BatchSearch(searchstr, paths, False, prefilter=False))
+            self.assertEqual(list(result.errors), paths[1:])
+
 
 class TestXmindShrink(unittest.TestCase):
     def testXmindShrink(self):
@@ -104,6 +525,136 @@ class TestXmindFmtConvert(unittest.TestCase):
         XmindCopilot.save(workbook)
         self.assertTrue(True)
 
+    def testMarkdownBlocks(self):
+        text = "\n".join([
+            "intro",
+            "# A",
+            "- a",
+            "  - a.1",
+            "```python",
+            "# not a heading",
+            "---",
+            "```",
+            "### A.1",
+            "$$",
+            "x^2",
+            "$$",
+            "## A.2",
+            "| a | b |",
+            "|---|---|",
+            "text",
+            "# B",
+        ])
+        blocks = list(MarkDown2Xmind().iterBlocks(text))
+        self.assertEqual([(b.kind, b.level, b.line) for b in blocks],
+                         [("text", 0, 0), ("heading", 1, 1), ("list", 0, 2), ("list", 1, 3), ("code", 0, 4),
+                          ("heading", 3, 8), ("math", 0, 9), ("heading", 2, 12), ("table", 0, 13),
+                          ("text", 0, 15), ("heading", 1, 16)])
+        self.assertEqual(blocks[4].text, "```python\n# not a heading\n---\n```")
+        self.assertEqual(blocks[8].text, "| a | b |\n|---|---|")
+
+        workbook = XmindCopilot.load(os.path.join(TMP_DIR, "TestMarkdownBlocks.xmind"))
+        root_topic = workbook.getPrimarySheet().getRootTopic()
+        MarkDown2Xmind(root_topic).convert2xmind(text)
+        tree = [(depth, t.getTitle()) for t, depth, _ in root_topic.walk()][1:]
+        self.assertEqual(tree, [(1, "intro"), (1, "A"), (2, "a"), (3, "a.1"), (2, blocks[4].text),
+                                (2, "A.1"), (3, "$$\nx^2\n$$"), (2, "A.2"), (3, blocks[8].text), (3, "text"),
+                                (1, "B")])
+
+        # Sections are nested the same as MDSection
+        markdowntext = open(TEST_TEMPLATE_MD, 'r', encoding='utf-8').read()
+        md2xmind = MarkDown2Xmind()
+        expected = []
+        for item in MDSection("", md2xmind.preProcess(markdowntext)).toXmindText():
+            tablevel = len(item) - len(item.lstrip("\t"))
+            # MDSection keeps the line break before blocks
+            expected.extend(line for line in item.replace("\n", "\n"+"\t"*tablevel).split("\n") if line.strip())
+        self.assertEqual(md2xmind.convert2xmindtext(markdowntext).split("\n"), expected)
+
+    def testMarkdownElementSplit(self):
+        section = MDSection()
+        # Lines also found inside a later block are not swallowed by it
+        self.assertEqual(section.elementSplit("a\n```\nabc\n```\n| a |\n- a\n  - b"),
+                         ["a", "```\nabc\n```", "| a |", "a", "\tb"])
+        self.assertEqual(section.elementSplit("$$\n|x|\n$$\n|x|\n$$x$$"), ["$$\n|x|\n$$", "|x|", "$$x$$"])
+        self.assertEqual(section.elementSplit("a\n---\nb\n```\n---\n```"), ["a", "---", "b", "```\n---\n```"])
+        # Code-heavy note
+        count = 5000
+        text = "\n".join("text %d\n```\ncode\n```\n| %d |\n|---|" % (i, i) for i in range(count))
+        elements = section.elementSplit(text)
+        self.assertEqual(len(elements), count * 3)
+        self.assertEqual(elements[-3:], ["text %d" % (count - 1), "```\ncode\n```", "| %d |\n|---|" % (count - 1)])
+
+    def testMarkdownStream(self):
+        markdowntext = open(TEST_TEMPLATE_MD, 'r', encoding='utf-8').read()
+        workbook = XmindCopilot.load(os.path.join(TMP_DIR, "TestMarkdownStream.xmind"))
+        expected, streamed = workbook.getPrimarySheet().getRootTopic(), workbook.createSheet().getRootTopic()
+        MarkDown2Xmind(expected).convert2xmind(markdowntext)
+        with open(TEST_TEMPLATE_MD, 'rb') as f:
+            MarkDown2Xmind(streamed).convert2xmind_stream(f)
+        self.assertEqual([(d, t.getTitle()) for t, d, _ in streamed.walk()],
+                         [(d, t.getTitle()) for t, d, _ in expected.walk()])
+        node = streamed.getSubTopics()[0].getImplementation()
+        self.assertIs(workbook.getTopicById(node.getAttribute("id")).getImplementation(), node)
+
+        # Cyclic gc is only paused while each top level topic is built, not in the consumer loop
+        from XmindCopilot.core.builder import SubtreeBuilder
+        items = [(-1, "A"), (0, "A.1"), (-1, "B"), (2, "B.1")]
+        nodes = []
+        for node in SubtreeBuilder(workbook.getOwnerDocument()).iterBuild(items):
+            self.assertTrue(gc.isenabled())
+            nodes.append(node)
+        self.assertEqual(len(nodes), 2)
+        self.assertTrue(gc.isenabled())
+        # Cyclic gc keeps running between the top level topics while the stream is consumed
+        collections = []
+        collected = []
+
+        def callback(phase, info):
+            if phase == "start":
+                collections.append(info["generation"])
+
+        def lines():
+            for i in range(2000):
+                yield "# H%d\n" % i
+                yield "- item %d\n" % i
+                yield "  - sub %d\n" % i
+            collected.append(len(collections))
+
+        root = workbook.createSheet().getRootTopic()
+        gc.callbacks.append(callback)
+        try:
+            MarkDown2Xmind(root).convert2xmind_stream(lines())
+        finally:
+            gc.callbacks.remove(callback)
+        self.assertGreater(collected[0], 0)
+        self.assertTrue(gc.isenabled())
+        headings = root.getSubTopics()
+        self.assertEqual(len(headings), 2000)
+        self.assertEqual([(d, t.getTitle()) for t, d, _ in headings[-1].walk()],
+                         [(0, "H1999"), (1, "item 1999"), (2, "sub 1999")])
+        # Items holding several lines are split into lines
+        blocks = iter_md_blocks(["# H0\r\n- item 0\n  - sub 0\n", "x"])
+        self.assertEqual([(b.kind, b.level, b.text, b.line) for b in blocks],
+                         [("heading", 1, "H0", 0), ("list", 0, "item 0", 1), ("list", 1, "sub 0", 2), ("text", 0, "x", 3)])
+
+    def testMarkdownDir2Xmind(self):
+        md_dir = os.path.join(TMP_DIR, "TestMarkdownDir")
+        os.makedirs(os.path.join(md_dir, "sub"), exist_ok=True)
+        shutil.copy(TEST_TEMPLATE_MD, os.path.join(md_dir, "a.md"))
+        shutil.copy(TEST_TEMPLATE_MDList, os.path.join(md_dir, "sub", "b.md"))
+        paths = [os.path.join(md_dir, "a.md"), os.path.join(md_dir, "missing.md"), os.path.join(md_dir, "sub", "b.md")]
+        workbook = XmindCopilot.load(os.path.join(TMP_DIR, "TestMarkdownDir.xmind"))
+        errors = convert_markdown_files(workbook, paths, workers=2, root=md_dir)
+        self.assertEqual(list(errors), [paths[1]])
+        sheets = workbook.getSheets()[1:]
+        self.assertEqual([sheet.getTitle() for sheet in sheets], ["a.md", os.path.join("sub", "b.md")])
+        for sheet, path in zip(sheets, paths[::2]):
+            expected = workbook.createSheet().getRootTopic()
+            MarkDown2Xmind(expected).convert2xmind(open(path, 'r', encoding='utf-8').read())
+            self.assertEqual([t.getTitle() for t, _, _ in sheet.getRootTopic().walk()][1:],
+                             [t.getTitle() for t, _, _ in expected.walk()][1:])
+
     def testLatexRenderer(self):
         text = r'$\sum_{i=0}^\infty x_i$'
         latex2img(text, size=48, color=(0.1, 0.8, 0.8),
@@ -113,6 +664,77 @@ class TestXmindFmtConvert(unittest.TestCase):
         im = latex2img(text, size=48, color=(0.9, 0.1, 0.1))
         # im.show()
 
+    def testLatexRenderCache(self):
+        cache_dir = os.path.join(TMP_DIR, "TestRenderCache")
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        previous = get_render_cache()
+        set_render_cache(RenderCache(cache_dir))
+        try:
+            path = latex2img_plt(r"\frac{a}{b}")
+            # Callers get their own copy, cached files may be evicted at any time
+            self.assertNotEqual(os.path.dirname(path), cache_dir)
+            cached, = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)]
+            with open(cached, "wb") as f:
+                f.write(b"cached")
+            # Hits are not rendered again
+            with open(latex2img_plt(r"\frac{a}{b}"), "rb") as f:
+                self.assertEqual(f.read(), b"cached")
+            out = os.path.join(TMP_DIR, "TestRenderCache.png")
+            self.assertEqual(latex2img_plt(r"\frac{a}{b}", out), out)
+            with open(out, "rb") as f:
+                self.assertEqual(f.read(), b"cached")
+            self.assertNotEqual(latex2img_plt(r"\frac{a}{b}", fontsize=30), path)
+            self.assertEqual(latex2img(r"$x^2$").size, latex2img(r"$x^2$").size)
+            self.assertEqual(len(os.listdir(cache_dir)), 3)
+        finally:
+            set_render_cache(previous)
+
+        # Least recently used files are evicted
+        cache = RenderCache(cache_dir, max_size=250)
+        cache.clear()
+        paths = [cache.addData(cache.key(i), b"x" * 100) for i in range(2)]
+        os.utime(paths[0], (1, 1))
+        os.utime(paths[1], (2, 2))
+        self.assertEqual(cache.get(cache.key(0)), paths[0])
+        cache.addData(cache.key(2), b"x" * 100)
+        self.assertIsNone(cache.get(cache.key(1)))
+        self.assertEqual(cache.getSize(), 200)
+
+    def testLatexBatchRender(self):
+        cache_dir = os.path.join(TMP_DIR, "TestLatexBatchRender")
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        previous = get_render_cache()
+        set_render_cache(RenderCache(cache_dir))
+        try:
+            workbook = XmindCopilot.load(os.path.join(TMP_DIR, "TestLatexBatchRender.xmind"))
+            root = workbook.getPrimarySheet().getRootTopic()
+            for title in ["$$x^2$$", "plain", r"$$\frac{a$$"]:
+                root.addSubTopicbyTitle(title)
+            root.getSubTopics()[0].addSubTopicbyTitle("$$x^2$$")
+            errors = root.convertTitle2Equation(height=50, recursive=True, workers=2)
+            # Failures are reported per formula, and their topics keep the titles
+            self.assertEqual(list(errors), [r"\frac{a"])
+            self.assertEqual([t.getTitle() for t, _, _ in root.walk()][1:], ["", "", "plain", r"$$\frac{a$$"])
+            equation, sub = root.getSubTopics()[0], root.getSubTopics()[0].getSubTopics()[0]
+            self.assertEqual(equation.getImageAttr()[2], "50")
+            self.assertEqual(equation.getImage().getImageData(), sub.getImage().getImageData())
+            # Duplicates are rendered once, same as latex2img_plt
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            with open(latex2img_plt("x^2"), "rb") as f:
+                self.assertEqual(f.read(), equation.getImage().getImageData())
+            # Each image outlives eviction by later formulas of the batch
+            set_render_cache(RenderCache(cache_dir, max_size=1))
+            paths, errors = render_equations(["x^2", "y", "x^2", "z"], workers=1)
+            self.assertEqual(list(paths), ["x^2", "y", "z"])
+            self.assertTrue(all(os.path.isfile(path) for path in paths.values()))
+            self.assertFalse(errors)
+            set_render_cache(None)
+            paths, errors = render_equations(["x^2", "y", "x^2"], workers=1)
+            self.assertEqual(list(paths), ["x^2", "y"])
+            self.assertFalse(errors)
+        finally:
+            set_render_cache(previous)
+
     def testLatexRendererWeb(self):
         # Example usage
         # latex_expression = r"a^2+b^2=c^2"
@@ -204,5 +826,6 @@ def batch_shrink():
     '''
     xmind_shrink(folder_path, PNG_Quality, JPEG_Quality, replace=True, use_pngquant=use_pngquant)
 
+
 if __name__ == '__main__':
     unittest.main()